@@ -0,0 +1,168 @@
+"""Shared HTTP sessions and access tokens for the articles API.
+
+Every customer endpoint gets one keep-alive `requests.Session`, so chunk
+uploads reuse pooled connections instead of paying a TCP and TLS handshake
+per request. Access tokens are cached per endpoint and user until shortly
+before they expire.
+"""
+
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Used when the token response does not say how long the token lives
+DEFAULT_TOKEN_TTL = 600
+# Refresh tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 60
+POOL_MAXSIZE = 16
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_BACKOFF = 60
+# Never wait longer than this, even if Retry-After asks for it
+MAX_RETRY_AFTER = 300
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_tokens = {}
+_token_locks = {}
+_tokens_lock = threading.Lock()
+# Endpoints that answered a gzip-encoded body with 415
+_gzip_rejected = set()
+
+
+def get_session(endpoint):
+    """Return the pooled session for an endpoint, creating it on first use."""
+    with _sessions_lock:
+        session = _sessions.get(endpoint)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[endpoint] = session
+        return session
+
+
+def backoff_delay(attempt, base, cap=MAX_BACKOFF):
+    """Exponential backoff with full jitter for the given retry attempt."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def retry_after(response):
+    """Return the delay requested by a Retry-After header, in seconds, or None."""
+    value = response.headers.get("Retry-After") if response.headers else None
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0), MAX_RETRY_AFTER)
+
+
+def post_with_retry(session, url, retries=3, backoff=1.0, retry_timeouts=True, **kwargs):
+    """POST, retrying on 429/5xx responses, timeouts and connection errors.
+
+    Waits follow Retry-After when the server sends it and exponential
+    backoff with jitter otherwise. The last response is returned even if it
+    is still an error; the last exception is re-raised once retries run out.
+    With `retry_timeouts` False a timeout is raised at once, for callers
+    that react to it themselves (e.g. by sending a smaller body).
+    """
+    attempt = 0
+    while True:
+        try:
+            resp = session.post(url, **kwargs)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            if attempt >= retries or (not retry_timeouts and isinstance(e, requests.Timeout)):
+                raise
+            delay = backoff_delay(attempt, backoff)
+            logging.warning(f"POST {url} failed ({e}); retrying in {delay:.1f}s")
+        else:
+            if resp.status_code not in RETRY_STATUSES or attempt >= retries:
+                return resp
+            delay = retry_after(resp)
+            if delay is None:
+                delay = backoff_delay(attempt, backoff)
+            logging.warning(f"POST {url} returned {resp.status_code}; retrying in {delay:.1f}s")
+        time.sleep(delay)
+        attempt += 1
+
+
+def _token_lock(key):
+    with _tokens_lock:
+        if key not in _token_locks:
+            _token_locks[key] = threading.Lock()
+        return _token_locks[key]
+
+
+def get_token(customer, rejected=None):
+    """Return an access token for the customer's endpoint, or None on failure.
+
+    A cached token is reused until it is close to expiry. Pass the token a
+    request was rejected with as `rejected` to replace it; concurrent
+    callers that hit the same 401 then share a single refresh.
+    """
+    endpoint = customer["output_endpoint"]
+    key = (endpoint, customer["output_user"])
+    # One token request per endpoint/user at a time; the others wait and reuse it
+    with _token_lock(key):
+        cached = _tokens.get(key)
+        if cached and cached[0] != rejected and cached[1] - TOKEN_REFRESH_MARGIN > time.monotonic():
+            return cached[0]
+
+        acc_token_req = post_with_retry(
+            get_session(endpoint),
+            endpoint + "/common/api/v2/token",
+            timeout=30,
+            json={
+                "username": customer["output_user"],
+                "password": customer["output_pass"],
+            },
+        )
+        if acc_token_req.status_code != 200:
+            logging.error(
+                f"Failed to get access token for {customer['name']}: {acc_token_req.status_code}"
+            )
+            _tokens.pop(key, None)
+            return None
+
+        message = acc_token_req.json().get("responseMessage") or {}
+        token = message.get("access_token")
+        if not token:
+            logging.error(f"Token response for {customer['name']} has no access_token")
+            return None
+        ttl = message.get("expires_in") or DEFAULT_TOKEN_TTL
+        _tokens[key] = (token, time.monotonic() + float(ttl))
+        logging.debug(f"Access token obtained for {customer['name']}")
+        return token
+
+
+def accepts_gzip(endpoint):
+    return endpoint not in _gzip_rejected
+
+
+def reject_gzip(endpoint):
+    logging.warning(f"{endpoint} does not accept gzip request bodies; sending them uncompressed")
+    _gzip_rejected.add(endpoint)
+
+
+def reset():
+    """Drop all cached sessions and tokens (used on config reload and in tests)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+    with _tokens_lock:
+        _tokens.clear()
+        _token_locks.clear()
+    _gzip_rejected.clear()
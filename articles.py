@@ -0,0 +1,241 @@
+"""Compact in-memory article records.
+
+An article is the JSON object pushed to the API: `articleId`,
+`articleName`, `nfcUrl`, `eans` and a `data` object of string fields.
+Holding each one as a dict with a nested 38-key dict costs well over a
+kilobyte of overhead per article, which adds up to gigabytes for large
+catalogues. `Article` keeps its top-level fields in slots, and
+`ArticleData` keeps the data fields in a list indexed by one field schema
+shared by every article in the process.
+
+Both behave like dicts, so plugins keep reading and writing fields by name
+(`article["data"]["SALE_PRICE"]`, `article.get("articleId")`,
+`data.pop("WEIGHT_UNIT", None)`), and top-level fields are also attributes
+(`article.data`). They compare equal to dicts with the same content and are
+turned into plain dicts only when they are serialized (`to_dict`,
+`to_plain`). Data fields come out in schema order: the mapped data fields
+first, then any field a plugin adds, in the order first seen.
+"""
+
+import threading
+from collections.abc import Mapping, MutableMapping
+
+
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<missing>"
+
+    def __reduce__(self):
+        # Copies and unpickled records keep using the module's singleton
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+class FieldSchema:
+    """Assigns every data field name a fixed position, shared by all records."""
+
+    def __init__(self, keys=()):
+        self.keys = []
+        self._index = {}
+        self._lock = threading.Lock()
+        for key in keys:
+            self.index(key)
+
+    def get(self, key):
+        return self._index.get(key)
+
+    def index(self, key):
+        """Return the position of `key`, adding it to the schema if needed."""
+        i = self._index.get(key)
+        if i is None:
+            with self._lock:
+                i = self._index.get(key)
+                if i is None:
+                    i = len(self.keys)
+                    self.keys.append(key)
+                    self._index[key] = i
+        return i
+
+
+# mapping.py registers the standard data fields first, in DATA_FIELDS order
+SCHEMA = FieldSchema()
+_positions = SCHEMA._index
+
+
+class ArticleData(MutableMapping):
+    """An article's `data` fields, stored by schema position."""
+
+    __slots__ = ("_values",)
+
+    def __init__(self, items=None):
+        self._values = []
+        if items:
+            self.update(items)
+
+    @classmethod
+    def from_values(cls, values):
+        """Wrap a list laid out by `SCHEMA`, with MISSING for absent fields."""
+        data = cls.__new__(cls)
+        data._values = values
+        return data
+
+    def __getitem__(self, key):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        # Plugins call this for every field of every article: keep it short
+        try:
+            value = self._values[_positions[key]]
+        except (KeyError, IndexError):
+            return default
+        return default if value is MISSING else value
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __setitem__(self, key, value):
+        i = _positions.get(key)
+        if i is None:
+            i = SCHEMA.index(key)
+        try:
+            self._values[i] = value
+        except IndexError:
+            values = self._values
+            values.extend([MISSING] * (i + 1 - len(values)))
+            values[i] = value
+
+    def __delitem__(self, key):
+        i = SCHEMA.get(key)
+        values = self._values
+        if i is None or i >= len(values) or values[i] is MISSING:
+            raise KeyError(key)
+        values[i] = MISSING
+
+    def __iter__(self):
+        for key, value in zip(SCHEMA.keys, self._values):
+            if value is not MISSING:
+                yield key
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not MISSING)
+
+    def setdefault(self, key, default=None):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            self[key] = value = default
+        return value
+
+    def to_dict(self):
+        return {key: value for key, value in zip(SCHEMA.keys, self._values) if value is not MISSING}
+
+    def __repr__(self):
+        return f"ArticleData({self.to_dict()!r})"
+
+
+ARTICLE_FIELDS = ("articleId", "articleName", "nfcUrl", "eans", "data")
+_ARTICLE_FIELDS = frozenset(ARTICLE_FIELDS)
+
+
+class Article(MutableMapping):
+    """One article, with its top-level fields in slots.
+
+    Keys other than the standard ones are kept in a small dict, created
+    only for articles that have them.
+    """
+
+    __slots__ = ARTICLE_FIELDS + ("_extra",)
+
+    def __init__(self, items=None):
+        self.articleId = self.articleName = self.nfcUrl = self.eans = self.data = MISSING
+        self._extra = None
+        if items:
+            self.update(items)
+
+    def __getitem__(self, key):
+        if key in _ARTICLE_FIELDS:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in _ARTICLE_FIELDS:
+            value = getattr(self, key)
+            return default if value is MISSING else value
+        return self._extra.get(key, default) if self._extra else default
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __setitem__(self, key, value):
+        if key in _ARTICLE_FIELDS:
+            if key == "data" and not isinstance(value, ArticleData):
+                value = ArticleData(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _ARTICLE_FIELDS and getattr(self, key) is not MISSING:
+            setattr(self, key, MISSING)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key in ARTICLE_FIELDS:
+            if getattr(self, key) is not MISSING:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def setdefault(self, key, default=None):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            self[key] = default
+            value = self[key]
+        return value
+
+    def to_dict(self):
+        result = {}
+        for key in ARTICLE_FIELDS:
+            value = getattr(self, key)
+            if value is not MISSING:
+                result[key] = value.to_dict() if key == "data" else value
+        if self._extra:
+            result.update({key: to_plain(value) for key, value in self._extra.items()})
+        return result
+
+    def __repr__(self):
+        return f"Article({self.to_dict()!r})"
+
+
+def to_plain(value):
+    """Return `value` with Article/ArticleData records turned into dicts."""
+    if isinstance(value, (Article, ArticleData)):
+        return value.to_dict()
+    if isinstance(value, Mapping) and not isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+def json_default(value):
+    """`default` hook for json/orjson: serialize records as plain dicts."""
+    if isinstance(value, (Article, ArticleData)):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,83 @@
+"""An in-process stand-in for the articles API.
+
+Serves the token and article upsert endpoints on a local port, so
+`push_to_api` can be timed end to end (encoding, chunking, compression
+and HTTP) without network latency or a real server in the numbers.
+"""
+
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_PATH = "/common/api/v2/token"
+ARTICLES_PATH = "/common/api/v2/common/articles"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        path = self.path.split("?", 1)[0]
+        if path == TOKEN_PATH:
+            self._reply(200, {"responseMessage": {"access_token": "bench", "expires_in": 3600}})
+        elif path == ARTICLES_PATH:
+            self.server.record(body, self.headers.get("Content-Encoding") == "gzip")
+            self._reply(200, {"responseCode": "200", "responseMessage": "OK"})
+        else:
+            self._reply(404, {"responseMessage": "not found"})
+
+
+class FakeArticlesApi(ThreadingHTTPServer):
+    """Accepts uploads and counts requests, bytes and (optionally) articles.
+
+    Use as a context manager; `url` is the endpoint to configure as the
+    customer's OUTPUT_ENDPOINT. Counting articles decodes every body, so it
+    is off by default to keep the server's own cost out of the timings.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, count_articles=False):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.count_articles = count_articles
+        self.requests = 0
+        self.bytes = 0
+        self.articles = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def record(self, body, gzipped):
+        articles = 0
+        if self.count_articles:
+            articles = len(json.loads(gzip.decompress(body) if gzipped else body))
+        with self._lock:
+            self.requests += 1
+            self.bytes += len(body)
+            self.articles += articles
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
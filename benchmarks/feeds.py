@@ -0,0 +1,235 @@
+"""Synthetic feeds shaped like the ones customers send.
+
+Every generator is seeded, so two runs of the same size see the same
+data. CSV and SQL feeds map all article, EAN and data fields; prices,
+dates and empty cells are mixed in roughly the proportions seen in real
+retail feeds, so plugins take both their sale and non-sale paths.
+"""
+
+import csv
+import datetime
+import io
+import random
+from decimal import Decimal
+
+from mapping import CSV_EAN_KEYS, DATA_FIELDS
+
+ARTICLE_KEYS = ("article_id", "article_name", "nfc_url")
+# Config keys in CSV column order: article fields, EANs, then data fields
+CSV_COLUMNS = ARTICLE_KEYS + CSV_EAN_KEYS + tuple(key for key, _ in DATA_FIELDS)
+
+DEPARTMENTS = ("Grocery", "Dairy", "Produce", "Bakery", "Frozen", "Household", "Pet", "Health")
+BRANDS = ("Acme", "Northwind", "Contoso", "Fabrikam", "Globex", "Initech", "Umbrella")
+COLORS = ("", "", "Red", "Blue", "Green", "Black", "White")
+WORDS = (
+    "organic",
+    "fresh",
+    "classic",
+    "family",
+    "value",
+    "premium",
+    "light",
+    "original",
+    "whole",
+    "natural",
+    "crunchy",
+    "smooth",
+    "large",
+    "mini",
+    "spicy",
+    "sweet",
+)
+CATEGORIES = ("Flower", "Pre-Rolls", "Vapes", "Edibles", "Concentrates", "Topicals")
+STRAINS = ("Indica", "Sativa", "Hybrid", "CBD")
+
+
+def _name(rng, words=3):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def _date(day):
+    return day.strftime("%m/%d/%Y")
+
+
+def _price(rng, low=0.5, high=80.0):
+    return Decimal(str(round(rng.uniform(low, high), 2)))
+
+
+def csv_customer(name="bench", header_row="YES", **overrides):
+    """A customer mapping every CSV column, numbered as in `generate_csv_rows`."""
+    customer = {key: str(i) for i, key in enumerate(CSV_COLUMNS, start=1)}
+    customer.update(
+        {
+            "name": name,
+            # Store code is always a fixed value, not a column
+            "store_code": "S001",
+            "input_type": "local",
+            "header_row": header_row,
+            "template_field": "MISC_03",
+            "creds": {},
+        }
+    )
+    customer.update(overrides)
+    return customer
+
+
+def _product_row(rng, i, today):
+    list_price = _price(rng)
+    on_sale = rng.random() < 0.3
+    sale_price = (list_price * Decimal("0.8")).quantize(Decimal("0.001")) if on_sale else ""
+    start = today - datetime.timedelta(days=rng.randint(0, 20))
+    end = today + datetime.timedelta(days=rng.randint(-5, 30))
+    upc = f"{rng.randrange(10**11, 10**12):012d}"
+    values = {
+        "article_id": str(100000 + i),
+        "article_name": _name(rng),
+        "nfc_url": f"https://shop.example.com/p/{100000 + i}",
+        "ean1": upc,
+        "ean2": f"0{upc}" if rng.random() < 0.5 else "",
+        "ean3": "",
+        "ean4": "",
+        "ean5": "",
+        "store_code": f"S{rng.randint(1, 40):03d}",
+        "item_id": str(100000 + i),
+        "item_name": _name(rng),
+        "item_description": _name(rng, rng.randint(6, 20)),
+        "barcode": f"00{upc}",
+        "sku": f"SKU-{i:07d}",
+        "list_price": str(list_price),
+        "sale_price": str(sale_price),
+        "clearance_price": str(_price(rng)) if rng.random() < 0.05 else "",
+        "unit_price": f"${_price(rng, 0.1, 20)}/lb",
+        "pack_quantity": str(rng.choice((1, 1, 1, 6, 12, 24))),
+        "weight": str(rng.randint(1, 5000)),
+        "weight_unit": rng.choice(("g", "oz", "lb", "ml")),
+        "department": rng.choice(DEPARTMENTS),
+        "aisle_location": f"A{rng.randint(1, 30)}-{rng.randint(1, 12)}",
+        "country_of_origin": rng.choice(("US", "CA", "MX", "FR", "IT", "")),
+        "brand": rng.choice(BRANDS),
+        "model": f"M{rng.randint(100, 999)}" if rng.random() < 0.2 else "",
+        "color": rng.choice(COLORS),
+        "inventory": str(rng.randint(0, 500)),
+        "start_date": _date(start) if on_sale else "",
+        "end_date": _date(end) if on_sale else "",
+        "language": "EN",
+        "category_01": rng.choice(DEPARTMENTS),
+        "category_02": "",
+        "category_03": "",
+        "misc_01": f"${_price(rng, 5, 40)}/mo for 36 months" if rng.random() < 0.1 else "",
+        "misc_02": "",
+        "misc_03": "",
+        "display_page_1": "REGULAR",
+        "display_page_2": "SALE" if on_sale else "",
+        "display_page_3": "",
+        "display_page_4": "",
+        "display_page_5": "",
+        "display_page_6": "",
+        "display_page_7": "",
+        "nfc_data": "shop.example.com",
+    }
+    return [values[key] for key in CSV_COLUMNS]
+
+
+def generate_csv_rows(rows, seed=0, today=None):
+    """Yield `rows` product rows as lists of cells, in `CSV_COLUMNS` order."""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    for i in range(rows):
+        yield _product_row(rng, i, today)
+
+
+def generate_csv(rows, seed=0, header=True):
+    """Return a CSV feed of `rows` products as text."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow([key.upper() for key in CSV_COLUMNS])
+    writer.writerows(generate_csv_rows(rows, seed))
+    return out.getvalue()
+
+
+def sql_customer(name="bench_sql", **overrides):
+    return csv_customer(name, header_row="NO", input_type="sql", **overrides)
+
+
+def generate_sql_rows(rows, seed=0):
+    """Return dict rows as a DictCursor would, with typed values and NULLs."""
+    result = []
+    for row in generate_csv_rows(rows, seed):
+        record = {}
+        for key, value in zip(CSV_COLUMNS, row):
+            if value == "":
+                value = None
+            elif key in ("list_price", "sale_price", "clearance_price"):
+                value = Decimal(value)
+            elif key in ("inventory", "pack_quantity", "weight"):
+                value = int(value)
+            record[key] = value
+        result.append(record)
+    return result
+
+
+def dutchie_customer(name="bench_cks", **overrides):
+    customer = {
+        "name": name,
+        "input_type": "dutchie_pos",
+        "creds": {"location_key": "bench"},
+        "header_row": "NO",
+        "template_field": "MISC_03",
+        "store_code": "S001",
+        "item_id": "productId",
+        "item_name": "productName",
+        "item_description": "description",
+        "barcode": "upc",
+        "sku": "sku",
+        "list_price": "price",
+        "sale_price": "recPrice",
+        "weight": "netWeight",
+        "weight_unit": "netWeightUnit",
+        "brand": "brandName",
+        "category_01": "category",
+        "inventory": "quantityAvailable",
+    }
+    customer.update(overrides)
+    return customer
+
+
+def generate_dutchie_products(rows, seed=0):
+    """Return products shaped like the Dutchie POS /products response."""
+    rng = random.Random(seed)
+    products = []
+    for i in range(rows):
+        price = float(_price(rng, 5, 120))
+        products.append(
+            {
+                "productId": 500000 + i,
+                "sku": f"DT-{i:07d}",
+                "productName": _name(rng),
+                "description": _name(rng, rng.randint(8, 30)),
+                "category": rng.choice(CATEGORIES),
+                "strainType": rng.choice(STRAINS),
+                "strain": _name(rng, 2),
+                "brandName": rng.choice(BRANDS),
+                "upc": f"{rng.randrange(10**11, 10**12):012d}",
+                "price": price,
+                "recPrice": round(price * 0.9, 2) if rng.random() < 0.3 else None,
+                "netWeight": rng.choice((0.5, 1, 3.5, 7, 14, 28)),
+                "netWeightUnit": "g",
+                "thcContent": round(rng.uniform(0, 35), 1),
+                "thcContentUnit": "%",
+                "cbdContent": round(rng.uniform(0, 5), 1) if rng.random() < 0.4 else None,
+                "cbdContentUnit": "%",
+                "imageUrl": f"https://images.example.com/{500000 + i}.jpg",
+                "isActive": rng.random() < 0.9,
+                "quantityAvailable": rng.randint(0, 200),
+            }
+        )
+    return products
+
+
+def generate_dutchie_inventory(products, seed=0):
+    """Return /inventory items for the given products."""
+    rng = random.Random(seed)
+    return [
+        {"productId": p["productId"], "quantityAvailable": rng.randint(0, 200)} for p in products
+    ]
@@ -0,0 +1,298 @@
+"""Throughput and memory benchmarks for the ingest pipeline stages.
+
+Run from the repository root:
+
+    python -m benchmarks.run --rows 10000 100000 --output before.json
+    python -m benchmarks.run --rows 10000 100000 --compare before.json
+
+Each benchmark times one stage on a synthetic feed (see feeds.py) and
+reports the best of `--repeat` runs as rows per second, plus the peak
+memory the stage allocated, measured with tracemalloc in a separate run.
+Feed generation and other setup happen outside the timed region. Stage
+output on stdout is discarded and logging is limited to warnings, so the
+terminal does not slow the numbers down more than a service log would.
+"""
+
+import argparse
+import contextlib
+import copy
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import api_client
+import chunking
+import columnar
+import daemon
+from benchmarks import feeds
+from benchmarks.fake_api import FakeArticlesApi
+
+DEFAULT_ROWS = (10000,)
+DEFAULT_REPEAT = 3
+MIB = 1024 * 1024
+
+BENCHMARKS = {}
+
+
+def benchmark(name, available=lambda: True):
+    """Register `setup(rows, stack)`, which returns a `make()` callable.
+
+    `make()` prepares fresh inputs and returns the zero-argument function
+    that is timed; `stack` is an ExitStack for servers and patches that
+    should live as long as the benchmark.
+    """
+
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, available)
+        return setup
+
+    return decorator
+
+
+@benchmark("parse_csv")
+def _parse_csv(rows, stack):
+    customer = feeds.csv_customer()
+    text = feeds.generate_csv(rows)
+    return lambda: lambda: daemon.parse_csv_data(text, customer)
+
+
+@benchmark("parse_csv_columnar", available=columnar.available)
+def _parse_csv_columnar(rows, stack):
+    customer = feeds.csv_customer()
+    text = feeds.generate_csv(rows)
+    return lambda: lambda: list(columnar.frame_to_articles(columnar.read_csv_frame(text, customer)))
+
+
+@benchmark("sql_articles")
+def _sql_articles(rows, stack):
+    customer = feeds.sql_customer()
+    records = feeds.generate_sql_rows(rows)
+    return lambda: lambda: list(daemon.iter_sql_articles(records, customer))
+
+
+@benchmark("dutchie_to_articles")
+def _dutchie_to_articles(rows, stack):
+    customer = feeds.dutchie_customer()
+    products = feeds.generate_dutchie_products(rows)
+    return lambda: lambda: daemon.dutchie_to_articles(products, customer)
+
+
+def _csv_articles(rows, customer):
+    return daemon.parse_csv_data(feeds.generate_csv(rows), customer)
+
+
+@benchmark("plugin_norwich")
+def _plugin_norwich(rows, stack):
+    from plugins.norwich import NorwichPlugin
+
+    customer = feeds.csv_customer("norwich")
+    articles = _csv_articles(rows, customer)
+    plugin = NorwichPlugin()
+
+    def make():
+        fresh = copy.deepcopy(articles)
+        return lambda: plugin.transform_articles(customer, fresh)
+
+    return make
+
+
+@benchmark("plugin_vessel")
+def _plugin_vessel(rows, stack):
+    from plugins.vessel import VesselPlugin
+
+    customer = feeds.csv_customer("vessel")
+    articles = _csv_articles(rows, customer)
+    plugin = VesselPlugin()
+
+    def make():
+        fresh = copy.deepcopy(articles)
+        return lambda: plugin.transform_articles(customer, fresh)
+
+    return make
+
+
+@benchmark("plugin_cks")
+def _plugin_cks(rows, stack):
+    from plugins import cks
+
+    customer = feeds.dutchie_customer()
+    products = feeds.generate_dutchie_products(rows)
+    articles = daemon.dutchie_to_articles(products, customer)
+    inventory = cks.build_inventory_map(feeds.generate_dutchie_inventory(products))
+    # Serve the inventory from memory instead of Dutchie
+    stack.enter_context(patch.object(cks, "get_inventory_map", return_value=inventory))
+    plugin = cks.CksPlugin()
+
+    def make():
+        fresh = copy.deepcopy(articles)
+        return lambda: plugin.transform_articles(customer, fresh, products=products)
+
+    return make
+
+
+def _push_benchmark(use_gzip):
+    def setup(rows, stack):
+        api = stack.enter_context(FakeArticlesApi())
+        customer = feeds.csv_customer(
+            output_endpoint=api.url,
+            output_user="bench",
+            output_pass="bench",
+            store_name="S001",
+            company_name="BENCH",
+            gzip=use_gzip,
+        )
+        articles = _csv_articles(rows, customer)
+
+        def make():
+            # Start every run from the same chunk size and a fresh session
+            api_client.reset()
+            chunking.reset()
+            return lambda: daemon.push_to_api(customer, articles)
+
+        return make
+
+    return setup
+
+
+benchmark("push_to_api")(_push_benchmark(False))
+benchmark("push_to_api_gzip")(_push_benchmark(True))
+
+
+def _git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def measure(make, repeat):
+    """Return (best seconds, peak bytes) for the functions `make()` returns."""
+    best = None
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            fn = make()
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        fn = make()
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(rows_list=DEFAULT_ROWS, names=None, repeat=DEFAULT_REPEAT, report=print):
+    """Run the selected benchmarks at each size and return the results."""
+    results = []
+    for name, (setup, available) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        if not available():
+            report(f"{name}: skipped (dependency not installed)")
+            continue
+        for rows in rows_list:
+            with contextlib.ExitStack() as stack:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    make = setup(rows, stack)
+                seconds, peak = measure(make, repeat)
+            result = {
+                "name": name,
+                "rows": rows,
+                "seconds": round(seconds, 6),
+                "rows_per_sec": round(rows / seconds, 1) if seconds else None,
+                "peak_bytes": peak,
+            }
+            results.append(result)
+            report(format_result(result))
+    return results
+
+
+def format_result(result):
+    rate = result["rows_per_sec"]
+    return (
+        f"{result['name']:<22} {result['rows']:>9} rows  {result['seconds']:>9.3f}s"
+        f"  {rate if rate is not None else float('nan'):>12,.0f} rows/s"
+        f"  {result['peak_bytes'] / MIB:>9.1f} MiB peak"
+    )
+
+
+def compare(baseline, results):
+    """Return report lines comparing results with a baseline run, per benchmark and size."""
+    previous = {(r["name"], r["rows"]): r for r in baseline["results"]}
+    lines = []
+    for result in results:
+        before = previous.get((result["name"], result["rows"]))
+        if not before:
+            lines.append(f"{result['name']:<22} {result['rows']:>9} rows  (no baseline)")
+            continue
+        speed = _change(before["rows_per_sec"], result["rows_per_sec"])
+        memory = _change(before["peak_bytes"], result["peak_bytes"])
+        lines.append(
+            f"{result['name']:<22} {result['rows']:>9} rows  "
+            f"throughput {speed}  peak memory {memory}"
+        )
+    return lines
+
+
+def _change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ingest pipeline stages")
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=list(DEFAULT_ROWS), help="Feed sizes to run"
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed runs per size")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare with results from an earlier --output file")
+    parser.add_argument("--log-level", default="WARNING", help="Log level while benchmarking")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING))
+    logging.getLogger().setLevel(getattr(logging, args.log_level.upper(), logging.WARNING))
+
+    results = run_suite(args.rows, args.only, max(1, args.repeat))
+    run = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Compared with {args.compare} (revision {baseline['meta'].get('revision')}):")
+        for line in compare(baseline, results):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
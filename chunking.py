@@ -0,0 +1,95 @@
+"""Byte-aware, adaptive chunking of article uploads.
+
+Chunks are filled up to a target serialized size as well as an article
+count cap, so feeds with long descriptions do not produce multi-megabyte
+bodies while sparse feeds are not split needlessly. The target adapts per
+endpoint from observed response times, 413 responses and timeouts, and is
+remembered across cycles.
+"""
+
+import logging
+import threading
+
+from encoding import get_encoder
+
+DEFAULT_TARGET_BYTES = 1024 * 1024
+MIN_TARGET_BYTES = 64 * 1024
+MAX_TARGET_BYTES = 8 * 1024 * 1024
+# Responses slower than this shrink the target, much faster ones grow it
+DEFAULT_TARGET_LATENCY = 5.0
+
+
+class ChunkSizer:
+    """Tracks the byte target for one endpoint's chunks."""
+
+    def __init__(
+        self,
+        target_bytes=DEFAULT_TARGET_BYTES,
+        target_latency=DEFAULT_TARGET_LATENCY,
+        min_bytes=MIN_TARGET_BYTES,
+        max_bytes=MAX_TARGET_BYTES,
+    ):
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_bytes = min(max(target_bytes, min_bytes), max_bytes)
+        self.target_latency = target_latency
+        self._lock = threading.Lock()
+
+    def observe(self, nbytes, seconds=None, status=None, timed_out=False):
+        """Adjust the target after a chunk of `nbytes` was sent."""
+        with self._lock:
+            old = self.target_bytes
+            if timed_out or status == 413:
+                # Too big for the server: back off hard below what was sent
+                self.target_bytes = max(self.min_bytes, min(old, nbytes) // 2)
+            elif status is not None and 200 <= status < 300 and seconds is not None:
+                if seconds > self.target_latency * 1.5:
+                    self.target_bytes = max(self.min_bytes, int(old * 0.75))
+                elif seconds < self.target_latency / 2 and nbytes >= old * 0.8:
+                    # Only grow when chunks actually reach the target
+                    self.target_bytes = min(self.max_bytes, int(old * 1.25))
+            if self.target_bytes != old:
+                logging.debug("Chunk target changed from %d to %d bytes", old, self.target_bytes)
+
+
+_sizers = {}
+_sizers_lock = threading.Lock()
+
+
+def get_sizer(endpoint, target_bytes=DEFAULT_TARGET_BYTES, target_latency=DEFAULT_TARGET_LATENCY):
+    """Return the endpoint's sizer; settings only apply when it is created."""
+    with _sizers_lock:
+        if endpoint not in _sizers:
+            _sizers[endpoint] = ChunkSizer(target_bytes, target_latency)
+        return _sizers[endpoint]
+
+
+def reset():
+    with _sizers_lock:
+        _sizers.clear()
+
+
+def iter_sized_chunks(articles, sizer, max_articles=1000, encode=None):
+    """Yield (parts, nbytes) for a stream of articles.
+
+    `parts` holds a chunk's articles, each already JSON-encoded, and
+    `nbytes` is the size of the array body they make. A chunk has at most
+    `max_articles` articles and, unless a single article is larger, at most
+    the sizer's target bytes.
+    """
+    encode = encode or get_encoder()
+    # A body of n parts is "[" + parts joined by n - 1 commas + "]", i.e. the
+    # sum of (len(part) + 1) plus one
+    parts = []
+    nbytes = 1
+    for article in articles:
+        part = encode(article)
+        size = len(part) + 1
+        if parts and (nbytes + size > sizer.target_bytes or len(parts) >= max_articles):
+            yield parts, nbytes
+            parts = []
+            nbytes = 1
+        parts.append(part)
+        nbytes += size
+    if parts:
+        yield parts, nbytes
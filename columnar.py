@@ -0,0 +1,189 @@
+"""Columnar (pandas) execution of the parse and transform stages.
+
+In columnar mode a CSV feed is read into a DataFrame with one column per
+mapped field, plugins that define `transform_frame(customer, frame)` run
+vectorized over whole columns, and the frame is only turned into article
+records when the articles are pushed.
+
+Frame columns are named after the article keys: `articleId`,
+`articleName`, `nfcUrl`, the EAN keys (`ean1`...) and the upper-case data
+keys (`SALE_PRICE`...). Any other column a plugin adds is a data field.
+Missing values (None/NaN) are left out of the article, so a plugin can set
+a field on some rows only.
+
+pandas is optional; `available()` is False when it is not installed.
+"""
+
+import csv
+import io
+import logging
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from articles import MISSING, SCHEMA, Article, ArticleData
+from mapping import CSV_EAN_KEYS, compile_csv_mapping
+
+try:
+    import pandas as pd
+except ImportError:  # optional dependency
+    pd = None
+
+ARTICLE_KEYS = ("articleId", "articleName", "nfcUrl")
+# Rows converted to articles at a time
+ROWS_PER_BATCH = 10000
+
+# Plain decimals that can be formatted without a Decimal per row
+_TWO_PLACES = r"^(-?(?:0|[1-9]\d*))(?:\.(\d{0,2}))?$"
+# Small enough that the scaled value fits in an int64
+_PLAIN_DECIMAL = r"^(\d{1,12})(?:\.(\d{0,6}))?$"
+
+
+def available():
+    return pd is not None
+
+
+def read_csv_frame(csv_data, customer):
+    """Parse CSV text into a frame holding the customer's mapped fields.
+
+    Rows are split by the same csv reader as row mode, so short rows, blank
+    lines and columns past the end of the file read as missing (None), not
+    as empty strings.
+    """
+    plan = compile_csv_mapping(customer)
+    width = max(plan.width, 1)
+    reader = csv.reader(io.StringIO(csv_data))
+    if customer["header_row"] == "YES":
+        next(reader, None)
+    # Only the mapped columns are kept
+    raw = pd.DataFrame([row[:width] for row in reader], dtype=object)
+    for column in range(raw.shape[1], width):
+        # Mapped past the end of every row
+        raw[column] = None
+
+    columns = {}
+    for key, source, const in plan.article_fields + plan.ean_fields + plan.data_fields:
+        columns[key] = const if source is None else raw[source].str.rstrip()
+    frame = pd.DataFrame(columns, index=raw.index)
+    if plan.strip_barcode:
+        barcode = frame["BARCODE"]
+        frame["BARCODE"] = barcode.str.lstrip("0").where(barcode != "", None)
+    return frame
+
+
+def frame_to_articles(frame):
+    """Yield `Article` records for the rows of a frame, a batch at a time."""
+    columns = list(frame.columns)
+    article_fields = [(i, key) for i, key in enumerate(columns) if key in ARTICLE_KEYS]
+    ean_fields = [i for i, key in enumerate(columns) if key in CSV_EAN_KEYS]
+    data_fields = [
+        (i, SCHEMA.index(key))
+        for i, key in enumerate(columns)
+        if key not in ARTICLE_KEYS and key not in CSV_EAN_KEYS
+    ]
+    data_width = max((slot for _, slot in data_fields), default=-1) + 1
+    for start in range(0, len(frame), ROWS_PER_BATCH):
+        batch = frame.iloc[start : start + ROWS_PER_BATCH].astype(object)
+        batch = batch.where(batch.notna(), None)
+        for row in batch.itertuples(index=False, name=None):
+            article = Article()
+            for i, key in article_fields:
+                if row[i] is not None:
+                    setattr(article, key, row[i])
+            eans = [row[i] for i in ean_fields if row[i]]
+            if eans:
+                article.eans = eans
+            values = [MISSING] * data_width
+            for i, slot in data_fields:
+                if row[i] is not None:
+                    values[slot] = row[i]
+            article.data = ArticleData.from_values(values)
+            yield article
+
+
+def truthy(series):
+    """Mask of values that are present and not empty strings."""
+    return series.notna() & (series != "")
+
+
+def quantize_2dp(series):
+    """Format decimal strings to two places, rounding half up.
+
+    Matches `str(Decimal(value.strip()).quantize(Decimal("0.00"), ROUND_HALF_UP))`.
+    Returns (formatted, invalid): missing and empty values are kept as they
+    are, and `invalid` marks values that are not numbers (also kept).
+    """
+    present = truthy(series)
+    text = series.where(present).astype(object).where(present, None)
+    text = text.str.strip()
+    parts = text.str.extract(_TWO_PLACES)
+    fast = parts[0].notna()
+    result = series.astype(object).copy()
+    result[fast] = parts[0][fast] + "." + parts[1][fast].fillna("").str.ljust(2, "0")
+
+    invalid = pd.Series(False, index=series.index)
+    for idx in series.index[present & ~fast]:
+        try:
+            value = Decimal(text[idx]).quantize(Decimal("0.00"), rounding=ROUND_HALF_UP)
+            result[idx] = str(value)
+        except (InvalidOperation, ValueError, TypeError):
+            invalid[idx] = True
+    return result, invalid
+
+
+def decimal_difference(minuend, subtrahend):
+    """Return str(Decimal(a) - Decimal(b)) per row, None where not computed.
+
+    Rows where either value is missing or empty are skipped. Returns
+    (differences, invalid); `invalid` marks rows whose values are not numbers.
+    """
+    present = truthy(minuend) & truthy(subtrahend)
+    a = minuend.astype(object).where(present, None).str.extract(_PLAIN_DECIMAL)
+    b = subtrahend.astype(object).where(present, None).str.extract(_PLAIN_DECIMAL)
+    fast = a[0].notna() & b[0].notna()
+    a_frac = a[1].fillna("")
+    b_frac = b[1].fillna("")
+    # Decimal keeps the larger number of fraction digits of the operands
+    scale = pd.concat([a_frac.str.len(), b_frac.str.len()], axis=1).max(axis=1)
+    result = pd.Series(None, index=minuend.index, dtype=object)
+    for digits in scale[fast].unique():
+        digits = int(digits)
+        rows = fast & (scale == digits)
+        left = (a[0][rows] + a_frac[rows].str.ljust(digits, "0")).astype("int64")
+        right = (b[0][rows] + b_frac[rows].str.ljust(digits, "0")).astype("int64")
+        diff = left - right
+        magnitude = diff.abs()
+        text = (magnitude // 10**digits).astype(str)
+        if digits:
+            text = text + "." + (magnitude % 10**digits).astype(str).str.zfill(digits)
+        result[rows] = text.where(diff >= 0, "-" + text)
+
+    invalid = pd.Series(False, index=minuend.index)
+    for idx in minuend.index[present & ~fast]:
+        try:
+            result[idx] = str(Decimal(str(minuend[idx])) - Decimal(str(subtrahend[idx])))
+        except (InvalidOperation, ValueError):
+            invalid[idx] = True
+    return result.where(result.notna(), None), invalid
+
+
+def in_date_window(start, end, day, fmt="%m/%d/%Y"):
+    """Mask of rows where start <= day <= end, with dates parsed as `fmt`.
+
+    Returns (inside, invalid); `invalid` marks rows where both dates are
+    given but at least one does not parse.
+    """
+    given = truthy(start) & truthy(end)
+    start_dates = pd.to_datetime(start.where(given), format=fmt, errors="coerce")
+    end_dates = pd.to_datetime(end.where(given), format=fmt, errors="coerce")
+    day = pd.Timestamp(day)
+    inside = given & (start_dates <= day) & (day <= end_dates)
+    invalid = given & (start_dates.isna() | end_dates.isna())
+    return inside, invalid
+
+
+def warn_rows(message, frame, mask):
+    """Log one warning for the rows in `mask` instead of one per row."""
+    count = int(mask.sum())
+    if not count:
+        return
+    ids = frame.loc[mask, "articleId"].head(5).tolist() if "articleId" in frame else []
+    logging.warning(f"{message} for {count} articles (e.g. {ids})")
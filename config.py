@@ -11,9 +11,7 @@ class Config:
                 if customer_name in customer_names:
                     customer_names = [customer_name]
                 else:
-                    print(
-                        f"Customer '{customer_name}' not found in CUSTOMERS list"
-                    )
+                    print(f"Customer '{customer_name}' not found in CUSTOMERS list")
                     customer_names = []
             for name in customer_names:
                 print(f"Configuring customer: {name}")
@@ -22,17 +20,13 @@ class Config:
                     "company_name": os.getenv(f"{name.upper()}_COMPANY_NAME"),
                     "store_name": os.getenv(f"{name.upper()}_STORE_NAME"),
                     "input_type": os.getenv(f"{name.upper()}_INPUT_TYPE"),
-                    "output_endpoint": os.getenv(
-                        f"{name.upper()}_OUTPUT_ENDPOINT"
-                    ),
+                    "output_endpoint": os.getenv(f"{name.upper()}_OUTPUT_ENDPOINT"),
                     "output_user": os.getenv(f"{name.upper()}_OUTPUT_USER"),
                     "output_pass": os.getenv(f"{name.upper()}_OUTPUT_PASS"),
                     "creds": {},
                     "header_row": os.getenv(f"{name.upper()}_HEADER_ROW", ""),
                     "article_id": os.getenv(f"{name.upper()}_ARTICLE_ID", ""),
-                    "article_name": os.getenv(
-                        f"{name.upper()}_ARTICLE_NAME", ""
-                    ),
+                    "article_name": os.getenv(f"{name.upper()}_ARTICLE_NAME", ""),
                     "nfc_url": os.getenv(f"{name.upper()}_NFC_URL", ""),
                     "ean1": os.getenv(f"{name.upper()}_EAN_1", ""),
                     "ean2": os.getenv(f"{name.upper()}_EAN_2", ""),
@@ -42,31 +36,19 @@ class Config:
                     "store_code": os.getenv(f"{name.upper()}_STORE_CODE", ""),
                     "item_id": os.getenv(f"{name.upper()}_ITEM_ID", ""),
                     "item_name": os.getenv(f"{name.upper()}_ITEM_NAME", ""),
-                    "item_description": os.getenv(
-                        f"{name.upper()}_ITEM_DESCRIPTION", ""
-                    ),
+                    "item_description": os.getenv(f"{name.upper()}_ITEM_DESCRIPTION", ""),
                     "barcode": os.getenv(f"{name.upper()}_BARCODE", ""),
                     "sku": os.getenv(f"{name.upper()}_SKU", ""),
                     "list_price": os.getenv(f"{name.upper()}_LIST_PRICE", ""),
                     "sale_price": os.getenv(f"{name.upper()}_SALE_PRICE", ""),
-                    "clearance_price": os.getenv(
-                        f"{name.upper()}_CLEARANCE_PRICE", ""
-                    ),
+                    "clearance_price": os.getenv(f"{name.upper()}_CLEARANCE_PRICE", ""),
                     "unit_price": os.getenv(f"{name.upper()}_UNIT_PRICE", ""),
-                    "pack_quantity": os.getenv(
-                        f"{name.upper()}_PACK_QUANTITY", ""
-                    ),
+                    "pack_quantity": os.getenv(f"{name.upper()}_PACK_QUANTITY", ""),
                     "weight": os.getenv(f"{name.upper()}_WEIGHT", ""),
-                    "weight_unit": os.getenv(
-                        f"{name.upper()}_WEIGHT_UNIT", ""
-                    ),
+                    "weight_unit": os.getenv(f"{name.upper()}_WEIGHT_UNIT", ""),
                     "department": os.getenv(f"{name.upper()}_DEPARTMENT", ""),
-                    "aisle_location": os.getenv(
-                        f"{name.upper()}_AISLE_LOCATION", ""
-                    ),
-                    "country_of_origin": os.getenv(
-                        f"{name.upper()}_COUNTRY_OF_ORIGIN", ""
-                    ),
+                    "aisle_location": os.getenv(f"{name.upper()}_AISLE_LOCATION", ""),
+                    "country_of_origin": os.getenv(f"{name.upper()}_COUNTRY_OF_ORIGIN", ""),
                     "brand": os.getenv(f"{name.upper()}_BRAND", ""),
                     "model": os.getenv(f"{name.upper()}_MODEL", ""),
                     "color": os.getenv(f"{name.upper()}_COLOR", ""),
@@ -74,46 +56,58 @@ class Config:
                     "start_date": os.getenv(f"{name.upper()}_START_DATE", ""),
                     "end_date": os.getenv(f"{name.upper()}_END_DATE", ""),
                     "language": os.getenv(f"{name.upper()}_LANGUAGE", ""),
-                    "category_01": os.getenv(
-                        f"{name.upper()}_CATEGORY_01", ""
-                    ),
-                    "category_02": os.getenv(
-                        f"{name.upper()}_CATEGORY_02", ""
-                    ),
-                    "category_03": os.getenv(
-                        f"{name.upper()}_CATEGORY_03", ""
-                    ),
+                    "category_01": os.getenv(f"{name.upper()}_CATEGORY_01", ""),
+                    "category_02": os.getenv(f"{name.upper()}_CATEGORY_02", ""),
+                    "category_03": os.getenv(f"{name.upper()}_CATEGORY_03", ""),
                     "misc_01": os.getenv(f"{name.upper()}_MISC_01", ""),
                     "misc_02": os.getenv(f"{name.upper()}_MISC_02", ""),
                     "misc_03": os.getenv(f"{name.upper()}_MISC_03", ""),
-                    "display_page_1": os.getenv(
-                        f"{name.upper()}_DISPLAY_PAGE_1", ""
-                    ),
-                    "display_page_2": os.getenv(
-                        f"{name.upper()}_DISPLAY_PAGE_2", ""
-                    ),
-                    "display_page_3": os.getenv(
-                        f"{name.upper()}_DISPLAY_PAGE_3", ""
-                    ),
-                    "display_page_4": os.getenv(
-                        f"{name.upper()}_DISPLAY_PAGE_4", ""
-                    ),
-                    "display_page_5": os.getenv(
-                        f"{name.upper()}_DISPLAY_PAGE_5", ""
-                    ),
-                    "display_page_6": os.getenv(
-                        f"{name.upper()}_DISPLAY_PAGE_6", ""
-                    ),
-                    "display_page_7": os.getenv(
-                        f"{name.upper()}_DISPLAY_PAGE_7", ""
-                    ),
+                    "display_page_1": os.getenv(f"{name.upper()}_DISPLAY_PAGE_1", ""),
+                    "display_page_2": os.getenv(f"{name.upper()}_DISPLAY_PAGE_2", ""),
+                    "display_page_3": os.getenv(f"{name.upper()}_DISPLAY_PAGE_3", ""),
+                    "display_page_4": os.getenv(f"{name.upper()}_DISPLAY_PAGE_4", ""),
+                    "display_page_5": os.getenv(f"{name.upper()}_DISPLAY_PAGE_5", ""),
+                    "display_page_6": os.getenv(f"{name.upper()}_DISPLAY_PAGE_6", ""),
+                    "display_page_7": os.getenv(f"{name.upper()}_DISPLAY_PAGE_7", ""),
                     "nfc_data": os.getenv(f"{name.upper()}_NFC_DATA", ""),
-                    "template_field": os.getenv(
-                        f"{name.upper()}_TEMPLATE_FIELD", "MISC_03"
-                    ),
-                    "input_parser": os.getenv(
-                        f"{name.upper()}_INPUT_PARSER", "csv"
-                    ),
+                    "template_field": os.getenv(f"{name.upper()}_TEMPLATE_FIELD", "MISC_03"),
+                    "input_parser": os.getenv(f"{name.upper()}_INPUT_PARSER", "csv"),
+                    "xml_record_tag": os.getenv(f"{name.upper()}_XML_RECORD_TAG"),
+                    "streaming": os.getenv(f"{name.upper()}_STREAMING", "NO").strip().upper()
+                    in ("1", "YES", "TRUE", "ON"),
+                    "columnar": os.getenv(f"{name.upper()}_COLUMNAR", "NO").strip().upper()
+                    in ("1", "YES", "TRUE", "ON"),
+                    "delta_sync": os.getenv(f"{name.upper()}_DELTA_SYNC", "NO").strip().upper()
+                    in ("1", "YES", "TRUE", "ON"),
+                    "skip_unchanged": os.getenv(f"{name.upper()}_SKIP_UNCHANGED", "YES")
+                    .strip()
+                    .upper()
+                    in ("1", "YES", "TRUE", "ON"),
+                    "push_concurrency": int(os.getenv(f"{name.upper()}_PUSH_CONCURRENCY", "4")),
+                    "chunk_max_articles": int(
+                        os.getenv(f"{name.upper()}_CHUNK_MAX_ARTICLES", "1000")
+                    ),
+                    "chunk_target_bytes": int(os.getenv(f"{name.upper()}_CHUNK_TARGET_KB", "1024"))
+                    * 1024,
+                    "gzip": os.getenv(f"{name.upper()}_GZIP", "NO").strip().upper()
+                    in ("1", "YES", "TRUE", "ON"),
+                    "json_encoder": os.getenv(
+                        f"{name.upper()}_JSON_ENCODER",
+                        os.getenv("JSON_ENCODER", "auto"),
+                    ),
+                    "push_retries": int(os.getenv(f"{name.upper()}_PUSH_RETRIES", "3")),
+                    "push_backoff": float(os.getenv(f"{name.upper()}_PUSH_BACKOFF", "1.0")),
+                    "full_resync_hours": float(
+                        os.getenv(f"{name.upper()}_FULL_RESYNC_HOURS", "24")
+                    ),
+                    "inventory_ttl": float(os.getenv(f"{name.upper()}_INVENTORY_TTL", "30")),
+                    "inventory_stale_ttl": float(
+                        os.getenv(f"{name.upper()}_INVENTORY_STALE_TTL", "0")
+                    ),
+                    "interval": float(os.getenv(f"{name.upper()}_INTERVAL", "60")),
+                    "cron": os.getenv(f"{name.upper()}_CRON") or None,
+                    "jitter": float(os.getenv(f"{name.upper()}_JITTER", "0")),
+                    "overlap": os.getenv(f"{name.upper()}_OVERLAP", "skip").strip().lower(),
                 }
                 input_type = cust_config["input_type"]
                 if input_type in ["ftp", "ftps"]:
@@ -139,10 +133,20 @@ class Config:
                         "db": os.getenv(f"{name.upper()}_SQL_DB"),
                         "query": os.getenv(f"{name.upper()}_SQL_QUERY"),
                     }
+                    cust_config["sql_watermark_column"] = os.getenv(
+                        f"{name.upper()}_SQL_WATERMARK_COLUMN"
+                    )
+                    cust_config["sql_watermark_start"] = os.getenv(
+                        f"{name.upper()}_SQL_WATERMARK_START", "1970-01-01 00:00:00"
+                    )
+                    cust_config["sql_probe_query"] = os.getenv(f"{name.upper()}_SQL_PROBE_QUERY")
                 elif input_type == "local":
                     cust_config["creds"] = {
                         "path": os.getenv(f"{name.upper()}_LOCAL_PATH"),
                     }
+                    cust_config["watch"] = os.getenv(
+                        f"{name.upper()}_WATCH", "NO"
+                    ).strip().upper() in ("1", "YES", "TRUE", "ON")
                 elif input_type == "dutchie_pos":
                     cust_config["creds"] = {
                         "location_key": os.getenv(f"{name.upper()}_DUTCHIE_LOCATION_KEY"),
@@ -152,3 +156,19 @@ class Config:
         self.debug = os.getenv("DEBUG", "NO").strip().upper() in ("1", "YES", "TRUE", "ON")
         self.log_level = "DEBUG" if self.debug else os.getenv("LOG_LEVEL", "INFO")
         self.log_file = os.getenv("LOG_FILE", "/var/log/ubi_ingest/ubi_ingest.log")
+        self.state_db = os.getenv("STATE_DB", os.path.join("tmp", "state.db"))
+        self.max_workers = int(os.getenv("MAX_WORKERS", "4"))
+        self.max_per_host = int(os.getenv("MAX_PER_HOST", "2"))
+        self.connection_pool = os.getenv("CONNECTION_POOL", "YES").strip().upper() in (
+            "1",
+            "YES",
+            "TRUE",
+            "ON",
+        )
+        self.connection_max_idle = int(os.getenv("CONNECTION_MAX_IDLE", "300"))
+        self.watch_debounce = float(os.getenv("WATCH_DEBOUNCE", "2"))
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        self.metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.metrics_json = os.getenv("METRICS_JSON") or None
+        self.verbosity = int(os.getenv("VERBOSITY", "1"))
+        self.log_row_sample = int(os.getenv("LOG_ROW_SAMPLE", "1000"))
@@ -0,0 +1,139 @@
+"""Source connections kept alive between cycles.
+
+FTP, SFTP and MySQL connections are keyed by host and credentials, so
+customers sharing a source reuse the same authenticated sessions instead of
+logging in (or doing an SSH key exchange) every cycle. A connection is used
+by one fetch at a time, health-checked before reuse and closed after sitting
+idle for too long.
+
+Pooling is off until `configure(enabled=True)` is called (the daemon does
+this at startup); otherwise every lease opens a fresh connection and closes
+it afterwards.
+"""
+
+import contextlib
+import logging
+import threading
+import time
+
+DEFAULT_MAX_IDLE = 300
+MAX_IDLE_PER_KEY = 2
+
+
+class Lease:
+    """A pooled connection handed to one user. Replace `conn` after a reconnect."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+def _safe_close(close, conn):
+    try:
+        close(conn)
+    except Exception as e:
+        logging.debug(f"Error closing pooled connection: {e}")
+
+
+class ConnectionPool:
+    def __init__(self, enabled=False, max_idle=DEFAULT_MAX_IDLE):
+        self.enabled = enabled
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _take_idle(self, key, is_alive, close):
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                conn, _, last_used = idle.pop()
+            if time.monotonic() - last_used > self.max_idle:
+                _safe_close(close, conn)
+                continue
+            try:
+                if is_alive is None or is_alive(conn):
+                    return conn
+            except Exception as e:
+                logging.debug(f"Pooled {key[0]} connection to {key[1]} failed health check: {e}")
+            _safe_close(close, conn)
+
+    def _release(self, key, conn, close):
+        if not self.enabled:
+            _safe_close(close, conn)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            idle.append((conn, close, time.monotonic()))
+            surplus = idle[:-MAX_IDLE_PER_KEY]
+            del idle[:-MAX_IDLE_PER_KEY]
+        for old, old_close, _ in surplus:
+            _safe_close(old_close, old)
+
+    @contextlib.contextmanager
+    def lease(self, key, connect, close, is_alive=None, broken_on=(OSError, EOFError)):
+        """Yield a Lease on an idle connection for `key`, or a new one.
+
+        The connection goes back to the pool when the block exits, unless
+        it raised one of `broken_on`, in which case it is closed. Keys should
+        start with the source kind and host; they are not logged in full.
+        """
+        conn = self._take_idle(key, is_alive, close) if self.enabled else None
+        if conn is None:
+            conn = connect()
+        else:
+            logging.debug(f"Reusing pooled {key[0]} connection to {key[1]}")
+        lease = Lease(conn)
+        try:
+            yield lease
+        except broken_on:
+            _safe_close(close, lease.conn)
+            raise
+        except BaseException:
+            self._release(key, lease.conn, close)
+            raise
+        else:
+            self._release(key, lease.conn, close)
+
+    def evict_idle(self):
+        """Close connections that have been idle longer than `max_idle`."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = [entry for entry in idle if now - entry[2] <= self.max_idle]
+                expired.extend(entry for entry in idle if now - entry[2] > self.max_idle)
+                idle[:] = keep
+        for conn, close, _ in expired:
+            _safe_close(close, conn)
+        if expired:
+            logging.debug(f"Closed {len(expired)} idle source connections")
+
+    def close_all(self):
+        with self._lock:
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            self._idle.clear()
+        for conn, close, _ in entries:
+            _safe_close(close, conn)
+
+
+pool = ConnectionPool()
+
+
+def configure(enabled, max_idle=DEFAULT_MAX_IDLE):
+    pool.enabled = enabled
+    pool.max_idle = max_idle
+    if not enabled:
+        pool.close_all()
+
+
+def lease(key, connect, close, is_alive=None, broken_on=(OSError, EOFError)):
+    return pool.lease(key, connect, close, is_alive=is_alive, broken_on=broken_on)
+
+
+def evict_idle():
+    pool.evict_idle()
+
+
+def close_all():
+    pool.close_all()
@@ -1,109 +1,324 @@
+import calendar
 import csv
 import io
+import json
 import time
 import logging
-import schedule
 import requests
 import ftplib
 import paramiko
 import pymysql
 import subprocess
 import os
+import posixpath
 import shutil
 import importlib
+import itertools
+import collections
+import contextlib
+import threading
 import sys
 import pkgutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from mapping import compile_csv_mapping, compile_dutchie_mapping, compile_sql_mapping
+import state
+import api_client
+import chunking
+import columnar
+import connections
+import encoding
+import logs
+import metrics
+import scheduler
+import watcher
 
 # Add parent directory to sys.path so ubi_ingest can be imported as a module
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def fetch_ftp(customer_name, host, user, passw, path="/"):
-    ftp = ftplib.FTP(host)
-    ftp.login(user, passw)
-    # List files in path
-    files = ftp.nlst(path)
-    if not files:
-        ftp.quit()
-        return "", None
-    # Get modification times
-    latest_file = None
-    latest_time = 0
-    for file in files:
+
+class SourceUnchanged(Exception):
+    """Raised when a customer's newest source was already processed."""
+
+
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+DOWNLOAD_ATTEMPTS = 3
+# Errors after which a download is resumed on a fresh connection
+FTP_TRANSIENT_ERRORS = (OSError, EOFError, ftplib.error_temp, ftplib.error_reply)
+SFTP_TRANSIENT_ERRORS = (OSError, EOFError, paramiko.SSHException)
+
+
+def _start_part_file(local_path):
+    """Return the .part path a download is written to, removing stale data."""
+    part_path = local_path + ".part"
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    return part_path
+
+
+def _part_offset(part_path):
+    return os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+
+def download_ftp(ftp, connect, remote, local_path):
+    """Stream an FTP file to disk in blocks, resuming with REST after drops.
+
+    `connect` opens a new logged-in connection. Returns the connection in
+    use when the download finished. Failed connections are closed here, so
+    a reconnected one does not outlive a final failure.
+    """
+    part_path = _start_part_file(local_path)
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        offset = _part_offset(part_path)
+        try:
+            with open(part_path, "ab") as f:
+                ftp.retrbinary(
+                    f"RETR {remote}", f.write, blocksize=DOWNLOAD_BLOCK_SIZE, rest=offset or None
+                )
+            break
+        except FTP_TRANSIENT_ERRORS as e:
+            try:
+                ftp.close()
+            except Exception:
+                pass
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+            logging.warning(f"FTP download of {remote} dropped at {offset} bytes ({e}); resuming")
+            ftp = connect()
+    os.replace(part_path, local_path)
+    return ftp
+
+
+def download_sftp(ssh, sftp, connect, remote, local_path, size=None):
+    """Stream an SFTP file to disk with pipelined prefetch, resuming by seek.
+
+    `connect` returns a new (ssh, sftp) pair. Returns the pair in use when
+    the download finished. Failed connections are closed here, so a
+    reconnected one (and its transport thread) does not outlive a final
+    failure.
+    """
+    part_path = _start_part_file(local_path)
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        offset = _part_offset(part_path)
+        try:
+            with sftp.open(remote, "rb") as rf, open(part_path, "ab") as out:
+                if offset:
+                    rf.seek(offset)
+                # Keep many read requests in flight instead of one per round trip
+                rf.prefetch(size)
+                for block in iter(lambda: rf.read(DOWNLOAD_BLOCK_SIZE), b""):
+                    out.write(block)
+            break
+        except SFTP_TRANSIENT_ERRORS as e:
+            ssh.close()
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+            logging.warning(f"SFTP download of {remote} dropped at {offset} bytes ({e}); resuming")
+            ssh, sftp = connect()
+    os.replace(part_path, local_path)
+    return ssh, sftp
+
+
+def _read_downloaded(file_path):
+    with open(file_path, "r", encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def _ftp_time(value):
+    """Parse an MDTM/MLSD timestamp (UTC, optional fraction) to epoch seconds."""
+    return calendar.timegm(time.strptime(value[:14], "%Y%m%d%H%M%S"))
+
+
+def _ftp_list_mlsd(ftp, path):
+    """List files as (remote path, mtime, size) with a single MLSD command.
+
+    Returns None when the server does not support MLSD.
+    """
+    try:
+        entries = list(ftp.mlsd(path, facts=["type", "modify", "size"]))
+    except ftplib.error_perm:
+        return None
+    files = []
+    for name, facts in entries:
+        # Skip directories and the cdir/pdir entries
+        if facts.get("type", "file").lower() != "file" or "modify" not in facts:
+            continue
+        try:
+            mtime = _ftp_time(facts["modify"])
+        except ValueError:
+            continue
+        size = int(facts["size"]) if facts.get("size", "").isdigit() else None
+        files.append((posixpath.join(path, name), mtime, size))
+    return files
+
+
+def _ftp_list_nlst(ftp, path):
+    """List files with NLST plus one MDTM per file, for servers without MLSD."""
+    files = []
+    for file in ftp.nlst(path):
         try:
             resp = ftp.voidcmd(f"MDTM {file}")
-            # resp is like '213 20231027120000'
-            date_str = resp.split()[1]
-            # Parse to timestamp
-            import time
-
-            file_time = time.mktime(time.strptime(date_str, "%Y%m%d%H%M%S"))
-            if file_time > latest_time:
-                latest_time = file_time
-                latest_file = file
-        except:
+            # resp is like '213 20231027120000'; directories fail MDTM
+            files.append((file, _ftp_time(resp.split()[1]), None))
+        except (ftplib.all_errors, IndexError, ValueError):
             continue
-    if not latest_file:
+    return files
+
+
+# Errors that leave a SQL connection unusable
+SQL_CONNECTION_ERRORS = (OSError, pymysql.err.OperationalError, pymysql.err.InterfaceError)
+# Seconds between SSH keepalive packets on pooled SFTP connections
+SSH_KEEPALIVE_INTERVAL = 30
+# Rows are read from the server while chunks upload, so allow the server to
+# wait on us longer than MySQL's 60 second default
+SQL_NET_WRITE_TIMEOUT = 600
+
+
+def _ftp_close(ftp):
+    try:
         ftp.quit()
-        return "", None
-    data = io.BytesIO()
-    ftp.retrbinary(f"RETR {latest_file}", data.write)
-    ftp.quit()
-    data.seek(0)
-    data_str = data.read().decode("utf-8")
-    # Save to tmp
-    os.makedirs(os.path.join("tmp", customer_name), exist_ok=True)
-    file_path = os.path.join("tmp", customer_name, latest_file)
-    with open(file_path, "w") as f:
-        f.write(data_str)
-    return data_str, file_path
-
-
-def fetch_sftp(customer_name, host, user, passw, key_path=None, path="/"):
+    except ftplib.all_errors:
+        ftp.close()
+
+
+def _ftp_alive(ftp):
+    ftp.voidcmd("NOOP")
+    return True
+
+
+def _sftp_close(conn):
+    conn[0].close()
+
+
+def _sftp_alive(conn):
+    ssh, sftp = conn
+    transport = ssh.get_transport()
+    if transport is None or not transport.is_active():
+        return False
+    sftp.normalize(".")
+    return True
+
+
+def _sql_alive(conn):
+    conn.ping(reconnect=False)
+    return True
+
+
+def fetch_ftp(customer_name, host, user, passw, path="/", stream=False, is_unchanged=None):
+    def connect():
+        ftp = ftplib.FTP(host)
+        ftp.login(user, passw)
+        return ftp
+
+    with connections.lease(
+        ("ftp", host, user, passw),
+        connect,
+        _ftp_close,
+        is_alive=_ftp_alive,
+        broken_on=FTP_TRANSIENT_ERRORS,
+    ) as lease:
+        ftp = lease.conn
+        # List files in path, preferring a single MLSD round trip
+        files = _ftp_list_mlsd(ftp, path)
+        if files is None:
+            files = _ftp_list_nlst(ftp, path)
+        if not files:
+            return "", None
+        latest_file, latest_time, size = max(files, key=lambda f: f[1])
+        if is_unchanged:
+            if size is None:
+                try:
+                    size = ftp.size(latest_file)
+                except ftplib.all_errors:
+                    size = None
+            if is_unchanged(latest_file, latest_time, size):
+                raise SourceUnchanged(latest_file)
+        # Download straight to tmp/<customer>
+        os.makedirs(os.path.join("tmp", customer_name), exist_ok=True)
+        file_path = os.path.join("tmp", customer_name, posixpath.basename(latest_file))
+        lease.conn = download_ftp(ftp, connect, latest_file, file_path)
+    if stream:
+        # The caller parses from the file
+        return None, file_path
+    return _read_downloaded(file_path), file_path
+
+
+def fetch_sftp(
+    customer_name, host, user, passw, key_path=None, path="/", stream=False, is_unchanged=None
+):
     import typing
 
-    ssh = paramiko.SSHClient()
-    ssh.load_host_keys(
-        os.path.expanduser("~/.ssh/known_hosts")
-    )  # Load known hosts
-    ssh.set_missing_host_key_policy(
-        paramiko.RejectPolicy()
-    )  # Reject unknown keys
-    if key_path:
-        ssh.connect(host, username=user, key_filename=key_path)
-    else:
-        ssh.connect(host, username=user, password=passw)
-    sftp = ssh.open_sftp()
-    # List files in path
-    files = sftp.listdir_attr(path)
-    if not files:
-        ssh.close()
-        return "", None
-    # Find latest by st_mtime
-    valid_files = [f for f in files if f.st_mtime is not None]
-    if not valid_files:
-        ssh.close()
-        return "", None
-    latest_file = sorted(
-        valid_files, key=lambda f: typing.cast(int, f.st_mtime)
-    )[-1]
-    with sftp.open(os.path.join(path, latest_file.filename), "r") as f:
-        data = f.read().decode("utf-8")
-    ssh.close()
-    # Save to tmp
-    os.makedirs(os.path.join("tmp", customer_name), exist_ok=True)
-    file_path = os.path.join("tmp", customer_name, latest_file.filename)
-    with open(file_path, "w") as f:
-        f.write(data)
-    return data, file_path
+    def connect():
+        ssh = paramiko.SSHClient()
+        ssh.load_host_keys(os.path.expanduser("~/.ssh/known_hosts"))  # Load known hosts
+        ssh.set_missing_host_key_policy(paramiko.RejectPolicy())  # Reject unknown keys
+        if key_path:
+            ssh.connect(host, username=user, key_filename=key_path)
+        else:
+            ssh.connect(host, username=user, password=passw)
+        transport = ssh.get_transport()
+        if transport is not None:
+            # Keep pooled sessions from being dropped by idle firewalls
+            transport.set_keepalive(SSH_KEEPALIVE_INTERVAL)
+        return ssh, ssh.open_sftp()
+
+    with connections.lease(
+        ("sftp", host, user, passw, key_path),
+        connect,
+        _sftp_close,
+        is_alive=_sftp_alive,
+        broken_on=SFTP_TRANSIENT_ERRORS,
+    ) as lease:
+        ssh, sftp = lease.conn
+        # List files in path
+        files = sftp.listdir_attr(path)
+        if not files:
+            return "", None
+        # Find latest by st_mtime
+        valid_files = [f for f in files if f.st_mtime is not None]
+        if not valid_files:
+            return "", None
+        latest_file = sorted(valid_files, key=lambda f: typing.cast(int, f.st_mtime))[-1]
+        if is_unchanged and is_unchanged(
+            latest_file.filename, latest_file.st_mtime, latest_file.st_size
+        ):
+            raise SourceUnchanged(latest_file.filename)
+        # Download straight to tmp/<customer>
+        os.makedirs(os.path.join("tmp", customer_name), exist_ok=True)
+        file_path = os.path.join("tmp", customer_name, latest_file.filename)
+        lease.conn = download_sftp(
+            ssh,
+            sftp,
+            connect,
+            os.path.join(path, latest_file.filename),
+            file_path,
+            size=latest_file.st_size,
+        )
+    if stream:
+        # The caller parses from the file
+        return None, file_path
+    return _read_downloaded(file_path), file_path
+
+
+def _sql_lease(host, user, passw, db):
+    return connections.lease(
+        ("sql", host, user, passw, db),
+        lambda: pymysql.connect(host=host, user=user, password=passw, database=db),
+        lambda conn: conn.close(),
+        is_alive=_sql_alive,
+        broken_on=SQL_CONNECTION_ERRORS,
+    )
 
 
 def fetch_sql(host, user, passw, db, query):
-    conn = pymysql.connect(host=host, user=user, password=passw, database=db)
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    conn.close()
+    with _sql_lease(host, user, passw, db) as lease:
+        conn = lease.conn
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        cursor.close()
+        # End the read transaction so a reused connection sees fresh data
+        conn.rollback()
     # Convert to CSV string
     if rows:
         output = io.StringIO()
@@ -114,106 +329,132 @@ def fetch_sql(host, user, passw, db, query):
     return "", None
 
 
-def fetch_local(path):
-    if os.path.isdir(path):
-        files = [
-            f
-            for f in os.listdir(path)
-            if os.path.isfile(os.path.join(path, f))
-        ]
-        if not files:
-            return "", None
-        latest = max(
-            files, key=lambda f: os.path.getmtime(os.path.join(path, f))
-        )
-        file_path = os.path.join(path, latest)
-    else:
-        file_path = path
+def fetch_sql_rows(host, user, passw, db, query, params=None):
+    """Yield the query's rows as dicts, streamed from the server.
+
+    An unbuffered cursor is used, so rows are read as they are consumed
+    instead of the whole result set being loaded first. `params` are bound
+    by the driver (`%(name)s` placeholders).
+    """
+    with _sql_lease(host, user, passw, db) as lease:
+        conn = lease.conn
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        try:
+            cursor.execute("SET SESSION net_write_timeout = %s", (SQL_NET_WRITE_TIMEOUT,))
+            cursor.execute(query, params)
+            yield from cursor
+        finally:
+            # Closing an unbuffered cursor drains any unread rows
+            cursor.close()
+            # End the read transaction so a reused connection sees fresh data
+            conn.rollback()
+
+
+def probe_sql(host, user, passw, db, query):
+    """Run a cheap probe query and return its first row as a comparable string."""
+    with _sql_lease(host, user, passw, db) as lease:
+        conn = lease.conn
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query)
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.rollback()
+    return repr(row)
+
+
+def latest_local_file(path):
+    """Return the newest file in a directory (or `path` itself), None if empty."""
+    if not os.path.isdir(path):
+        return path
+    latest = None
+    latest_mtime = None
+    # scandir returns the file type with each entry, so only files are stat'ed
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            if latest_mtime is None or mtime > latest_mtime:
+                latest, latest_mtime = entry.path, mtime
+    return latest
+
+
+def fetch_local(path, stream=False, is_unchanged=None):
+    file_path = latest_local_file(path)
+    if file_path is None:
+        return "", None
+    if is_unchanged:
+        st = os.stat(file_path)
+        if is_unchanged(os.path.basename(file_path), st.st_mtime, st.st_size):
+            raise SourceUnchanged(file_path)
+    if stream:
+        return None, file_path
     with open(file_path, "r") as f:
         return f.read(), file_path
 
 
-def fetch_dutchie(customer_name, location_key):
-    url = "https://api.pos.dutchie.com/products"
+DUTCHIE_PRODUCTS_URL = "https://api.pos.dutchie.com/products"
+# Last fetched catalogue, kept in tmp/<customer> for plugins when a
+# conditional request finds it unchanged
+DUTCHIE_PRODUCTS_CACHE = "dutchie_products.json"
+# Size of the pieces streamed HTTP responses are read in
+HTTP_READ_SIZE = 64 * 1024
+
+
+def fetch_dutchie(customer_name, location_key, conditional=None):
+    """Fetch the location's active products from Dutchie POS.
+
+    The response is decoded as it streams in and inactive products are
+    dropped as they arrive. With `conditional` (an HttpSourceTracker) the
+    request carries the last pushed response's validators, and
+    SourceUnchanged is raised when the server answers 304 Not Modified.
+    """
     logging.info(f"Fetching products from Dutchie POS for {customer_name}")
-    resp = requests.get(
-        url,
+    start = time.perf_counter()
+    headers = {"Accept": "application/json", "Accept-Encoding": "gzip"}
+    if conditional:
+        headers.update(conditional.request_headers())
+    with requests.get(
+        DUTCHIE_PRODUCTS_URL,
         auth=(location_key, ""),
-        headers={"Accept": "application/json"},
+        headers=headers,
         timeout=120,
+        stream=True,
+    ) as resp:
+        if resp.status_code == 304:
+            raise SourceUnchanged("Dutchie products not modified")
+        resp.raise_for_status()
+        if conditional:
+            conditional.observe(resp)
+        total = 0
+        nbytes = 0
+        active = []
+
+        def counted(chunks):
+            nonlocal nbytes
+            for chunk in chunks:
+                nbytes += len(chunk)
+                yield chunk
+
+        for product in encoding.iter_json_array(counted(resp.iter_content(HTTP_READ_SIZE))):
+            total += 1
+            if product.get("isActive"):
+                active.append(product)
+    metrics.FETCH_BYTES.inc(nbytes, customer=customer_name, source="dutchie_pos")
+    metrics.FETCH_SECONDS.observe(
+        time.perf_counter() - start, customer=customer_name, source="dutchie_pos"
     )
-    resp.raise_for_status()
-    products = resp.json()
-    logging.info(f"Fetched {len(products)} total products from Dutchie POS")
-    active = [p for p in products if p.get("isActive")]
+    logging.info(f"Fetched {total} total products from Dutchie POS")
     logging.info(f"Filtered to {len(active)} active products")
     return active, None
 
 
 def dutchie_to_articles(products, customer):
-    articles = []
-    for p in products:
-        aid = p.get(customer.get("article_id", "")) if customer.get("article_id") else p.get("productId")
-        aname = p.get(customer.get("article_name", "")) if customer.get("article_name") else p.get("productName")
-        article = {
-            "articleId": str(aid) if aid else "",
-            "articleName": str(aname) if aname else "",
-        }
-        if nfc := customer.get("nfc_url"):
-            article["nfcUrl"] = nfc
-        eans = [e for e in [customer.get("ean1"), customer.get("ean2"), customer.get("ean3")] if e]
-        if eans:
-            article["eans"] = [eans]
-
-        def get_field(mapping):
-            if not mapping:
-                return None
-            return p.get(mapping)
-
-        data = {}
-        for key, val in {
-            "STORE_CODE": customer.get("store_code"),
-            "ITEM_ID": get_field(customer.get("item_id")),
-            "ITEM_NAME": get_field(customer.get("item_name")),
-            "ITEM_DESCRIPTION": get_field(customer.get("item_description")),
-            "BARCODE": (lambda v: v.lstrip("0") if v else None)(get_field(customer.get("barcode"))),
-            "SKU": get_field(customer.get("sku")),
-            "LIST_PRICE": get_field(customer.get("list_price")),
-            "SALE_PRICE": get_field(customer.get("sale_price")),
-            "CLEARANCE_PRICE": get_field(customer.get("clearance_price")),
-            "UNIT_PRICE": get_field(customer.get("unit_price")),
-            "PACK_QUANTITY": get_field(customer.get("pack_quantity")),
-            "WEIGHT": get_field(customer.get("weight")),
-            "WEIGHT_UNIT": get_field(customer.get("weight_unit")),
-            "DEPARTMENT": get_field(customer.get("department")),
-            "AISLE_LOCATION": get_field(customer.get("aisle_location")),
-            "COUNTRY_OF_ORIGIN": get_field(customer.get("country_of_origin")),
-            "BRAND": get_field(customer.get("brand")),
-            "MODEL": get_field(customer.get("model")),
-            "COLOR": get_field(customer.get("color")),
-            "INVENTORY": get_field(customer.get("inventory")),
-            "START_DATE": get_field(customer.get("start_date")),
-            "END_DATE": get_field(customer.get("end_date")),
-            "LANGUAGE": get_field(customer.get("language")),
-            "CATEGORY_01": get_field(customer.get("category_01")),
-            "CATEGORY_02": get_field(customer.get("category_02")),
-            "CATEGORY_03": get_field(customer.get("category_03")),
-            "MISC_01": get_field(customer.get("misc_01")),
-            "MISC_02": get_field(customer.get("misc_02")),
-            "MISC_03": get_field(customer.get("misc_03")),
-            "DISPLAY_PAGE_1": get_field(customer.get("display_page_1")),
-            "DISPLAY_PAGE_2": get_field(customer.get("display_page_2")),
-            "DISPLAY_PAGE_3": get_field(customer.get("display_page_3")),
-            "DISPLAY_PAGE_4": get_field(customer.get("display_page_4")),
-            "DISPLAY_PAGE_5": get_field(customer.get("display_page_5")),
-            "DISPLAY_PAGE_6": get_field(customer.get("display_page_6")),
-            "DISPLAY_PAGE_7": get_field(customer.get("display_page_7")),
-            "NFC_DATA": get_field(customer.get("nfc_data")),
-        }.items():
-            if val is not None:
-                data[key] = val
-        article["data"] = data
-        articles.append(article)
+    plan = compile_dutchie_mapping(customer)
+    articles = [plan.materialize(p) for p in products]
+    metrics.ROWS_PARSED.inc(len(articles), customer=customer.get("name", ""))
     logging.info(f"Converted {len(articles)} products to articles")
     return articles
 
@@ -222,112 +463,93 @@ def determine_template(customer_name, article_data):
     return None
 
 
-def parse_csv_data(csv_data, customer):
-    print("parsing csv data")
-    logging.debug("Parsing CSV data")
-    reader = csv.reader(io.StringIO(csv_data))
-    print(f"header row: {customer['header_row']}")
+def iter_csv_articles(reader, customer):
+    """Yield one article per row of a csv.reader, without materializing the feed."""
     if customer["header_row"] == "YES":
-        print("Skipping header row")
+        logs.echo("Skipping header row", 2)
         logging.debug("Skipping header row")
         next(reader, None)
-    rows = list(reader)
-    rows = [[cell.rstrip() for cell in row] for row in rows]
-    articles = []
-    for row in rows:
-        print(f"Processing row: {row}")
-        logging.debug(f"Processing row: {row}")
-
-        def get_value(mapping):
-            # print(f"getting value of mapping {mapping}")
-            # print(f"type of mapping: {type(mapping)}")
-            if not mapping:
-                return None
-            if not mapping.isnumeric():
-                return mapping
-            # col_str = mapping.split()[1]
-            col_idx = int(mapping) - 1
-            # print(f"col_str = {mapping}")
-            # print(f"col_idx = {col_idx}")
-            if col_idx < len(row):
-                # print(f"returning value {row[col_idx]}")
-                return row[col_idx]
-            return None
-
-        article = {}
-        if (aid := get_value(customer["article_id"])) is not None:
-            article["articleId"] = aid
-        if (aname := get_value(customer["article_name"])) is not None:
-            article["articleName"] = aname
-        if (nfc := get_value(customer["nfc_url"])) is not None:
-            article["nfcUrl"] = nfc
-        ean_values = []
-        for key in ["ean1", "ean2", "ean3", "ean4", "ean5"]:
-            value = get_value(customer.get(key, ""))
-            if value is not None and value != "":
-                ean_values.append(value)
-        if ean_values:
-            article["eans"] = ean_values
-        data = {}
-        for key, value in {
-            "STORE_CODE": customer["store_code"],
-            "ITEM_ID": get_value(customer["item_id"]),
-            "ITEM_NAME": get_value(customer["item_name"]),
-            "ITEM_DESCRIPTION": get_value(customer["item_description"]),
-            "BARCODE": (lambda v: v.lstrip("0") if v else None)(get_value(customer["barcode"])),
-            "SKU": get_value(customer["sku"]),
-            "LIST_PRICE": get_value(customer["list_price"]),
-            "SALE_PRICE": get_value(customer["sale_price"]),
-            "CLEARANCE_PRICE": get_value(customer["clearance_price"]),
-            "UNIT_PRICE": get_value(customer["unit_price"]),
-            "PACK_QUANTITY": get_value(customer["pack_quantity"]),
-            "WEIGHT": get_value(customer["weight"]),
-            "WEIGHT_UNIT": get_value(customer["weight_unit"]),
-            "DEPARTMENT": get_value(customer["department"]),
-            "AISLE_LOCATION": get_value(customer["aisle_location"]),
-            "COUNTRY_OF_ORIGIN": get_value(customer["country_of_origin"]),
-            "BRAND": get_value(customer["brand"]),
-            "MODEL": get_value(customer["model"]),
-            "COLOR": get_value(customer["color"]),
-            "INVENTORY": get_value(customer["inventory"]),
-            "START_DATE": get_value(customer["start_date"]),
-            "END_DATE": get_value(customer["end_date"]),
-            "LANGUAGE": get_value(customer["language"]),
-            "CATEGORY_01": get_value(customer["category_01"]),
-            "CATEGORY_02": get_value(customer["category_02"]),
-            "CATEGORY_03": get_value(customer["category_03"]),
-            "MISC_01": get_value(customer["misc_01"]),
-            "MISC_02": get_value(customer["misc_02"]),
-            "MISC_03": get_value(customer["misc_03"]),
-            "DISPLAY_PAGE_1": get_value(customer["display_page_1"]),
-            "DISPLAY_PAGE_2": get_value(customer["display_page_2"]),
-            "DISPLAY_PAGE_3": get_value(customer["display_page_3"]),
-            "DISPLAY_PAGE_4": get_value(customer["display_page_4"]),
-            "DISPLAY_PAGE_5": get_value(customer["display_page_5"]),
-            "DISPLAY_PAGE_6": get_value(customer["display_page_6"]),
-            "DISPLAY_PAGE_7": get_value(customer["display_page_7"]),
-            "NFC_DATA": get_value(customer["nfc_data"]),
-        }.items():
-            if value is not None:
-                data[key] = value
-        article["data"] = data
-        # Set template field based on logic
-        template_field = customer.get("template_field", "MISC_03")
-        template_value = determine_template(
-            customer.get("name", ""), article["data"]
-        )
-        if template_value:
-            article["data"][template_field] = template_value
-        articles.append(article)
-        #print(f"Added article: {article}")  # DEBUG
-        #break
-
-    print(f"number of articles: {len(articles)}")
-    logging.info(f"Parsed {len(articles)} articles")
-    # print(json.dumps(articles))
+    plan = compile_csv_mapping(customer)
+    template_field = customer.get("template_field", "MISC_03")
+    customer_name = customer.get("name", "")
+    count = 0
+    try:
+        for row in reader:
+            row = [cell.rstrip() for cell in row]
+            if logs.should_trace(count):
+                logging.debug("Processing row %d for %s: %s", count + 1, customer_name, row)
+            article = plan.materialize(row)
+            # Set template field based on logic
+            template_value = determine_template(customer_name, article["data"])
+            if template_value:
+                article["data"][template_field] = template_value
+            count += 1
+            yield article
+    finally:
+        metrics.ROWS_PARSED.inc(count, customer=customer_name)
+
+
+def iter_sql_articles(rows, customer):
+    """Yield one article per SQL result row, reading columns by name."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    plan = compile_sql_mapping(customer, list(first))
+    template_field = customer.get("template_field", "MISC_03")
+    customer_name = customer.get("name", "")
+    count = 0
+    try:
+        for row in itertools.chain([first], rows):
+            if logs.should_trace(count):
+                logging.debug("Processing row %d for %s: %s", count + 1, customer_name, row)
+            article = plan.materialize(row)
+            template_value = determine_template(customer_name, article["data"])
+            if template_value:
+                article["data"][template_field] = template_value
+            count += 1
+            yield article
+    finally:
+        metrics.ROWS_PARSED.inc(count, customer=customer_name)
+
+
+def parse_csv_data(csv_data, customer):
+    logs.echo("parsing csv data", 2)
+    logging.debug("Parsing CSV data")
+    reader = csv.reader(io.StringIO(csv_data))
+    articles = list(iter_csv_articles(reader, customer))
+
+    logs.echo(f"number of articles: {len(articles)}", 2)
+    logging.info("Parsed %d articles", len(articles))
     return articles
 
 
+def iter_chunks(items, size):
+    """Yield lists of up to `size` items from any iterable."""
+    it = iter(items)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def _import_package_modules(package, kind):
+    """Import every module in a local package directory so it can register itself."""
+    package_dir = os.path.join(os.path.dirname(__file__), package)
+    if not os.path.isdir(package_dir):
+        logging.debug(f"No {package} directory found")
+        return
+    for finder, name, ispkg in pkgutil.iter_modules([package_dir]):
+        try:
+            importlib.import_module(f"{package}.{name}")
+            logging.info(f"Loaded {kind} module: {name}")
+        except Exception:
+            try:
+                pkg = os.path.basename(os.path.dirname(__file__))
+                importlib.import_module(f"{pkg}.{package}.{name}")
+                logging.info(f"Loaded {kind} module: {name}")
+            except Exception as e:
+                logging.error(f"Failed to load {kind} {name}: {e}")
+
+
 def discover_plugins():
     """Discover and import all modules in the local plugins/ directory.
 
@@ -335,253 +557,1021 @@ def discover_plugins():
     themselves with `plugins.base.register()` (see plugins/base.py).
     """
     logging.debug("Discovering plugins...")
-    plugins_dir = os.path.join(os.path.dirname(__file__), "plugins")
-    if not os.path.isdir(plugins_dir):
-        logging.debug("No plugins directory found")
-        return
-    for finder, name, ispkg in pkgutil.iter_modules([plugins_dir]):
+    _import_package_modules("plugins", "plugin")
+
+
+def discover_parsers():
+    """Discover and import all modules in the local parsers/ directory.
+
+    Input parsers register themselves with `parsers.base.register()` (see
+    parsers/base.py) and are looked up by the customer's INPUT_PARSER.
+    """
+    logging.debug("Discovering input parsers...")
+    _import_package_modules("parsers", "parser")
+
+
+def get_input_parser(name):
+    """Return the in-process parser registered for `name`, or None."""
+    try:
+        base = importlib.import_module("parsers.base")
+    except Exception:
+        pkg = os.path.basename(os.path.dirname(__file__))
+        base = importlib.import_module(f"{pkg}.parsers.base")
+    return base.get_parser(name)
+
+
+_plugin_base = None
+
+
+def _plugin_registry():
+    # Imported on first use so the daemon does not need a hard dependency
+    # on the plugins package at import time
+    global _plugin_base
+    if _plugin_base is None:
         try:
-            importlib.import_module(f"plugins.{name}")
-            logging.info(f"Loaded plugin module: {name}")
+            _plugin_base = importlib.import_module("plugins.base")
         except Exception:
-            try:
-                pkg = os.path.basename(os.path.dirname(__file__))
-                importlib.import_module(f"{pkg}.plugins.{name}")
-                logging.info(f"Loaded plugin module: {name}")
-            except Exception as e:
-                logging.error(f"Failed to load plugin {name}: {e}")
+            pkg = os.path.basename(os.path.dirname(__file__))
+            _plugin_base = importlib.import_module(f"{pkg}.plugins.base")
+    return _plugin_base
 
 
 def get_plugins_for_customer(customer):
     """Return list of plugin instances that apply to this customer.
 
-    This dynamically imports the base plugin registry and queries it so the
-    daemon does not need a hard dependency at import time.
+    The chain is resolved once per customer and reused every cycle; call
+    `reset_plugin_chains` when the configuration is reloaded.
     """
-    logging.info(f"Getting plugins for customer {customer['name']}")
+    logging.debug(f"Getting plugins for customer {customer['name']}")
+    return _plugin_registry().get_plugins_for_customer(customer)
+
+
+def reset_plugin_chains():
+    _plugin_registry().reset_chains()
+
+
+def prefetch_plugins(customer):
+    """Let the customer's plugins start background work before the fetch."""
     try:
-        base = importlib.import_module("plugins.base")
-    except Exception:
-        pkg = os.path.basename(os.path.dirname(__file__))
-        base = importlib.import_module(f"{pkg}.plugins.base")
-    return base.get_plugins_for_customer(customer)
+        plugins = get_plugins_for_customer(customer)
+    except Exception as e:
+        logging.debug(f"Plugin error for {customer['name']}: {e}")
+        return
+    for plugin in plugins:
+        prefetch = getattr(plugin, "prefetch", None)
+        if prefetch is None:
+            continue
+        try:
+            prefetch(customer)
+        except Exception as e:
+            logging.error(f"Plugin {plugin} prefetch failed for {customer['name']}: {e}")
+
+
+def response_body(resp):
+    """Return a response's JSON body, or its text if it is not JSON."""
+    try:
+        return resp.json()
+    except ValueError:
+        return resp.text
 
 
 def push_to_api(customer, data):
+    """Upsert articles to the customer's endpoint.
+
+    Returns True when every chunk was accepted, False otherwise.
+    """
     # Unpack the data and push to API
     endpoint = customer["output_endpoint"]
 
-    # Get access token
-    acc_token_req = requests.post(
-        endpoint + "/common/api/v2/token",
-        timeout=30,
-        json={
-            "username": customer["output_user"],
-            "password": customer["output_pass"],
-        },
+    # Nothing to send: skip the token round trip entirely
+    articles = iter(data)
+    first = next(articles, None)
+    if first is None:
+        logging.info(f"No articles to push for {customer['name']}")
+        return True
+    data = itertools.chain([first], articles)
+
+    # Get access token (cached per endpoint until close to expiry)
+    acc_token = api_client.get_token(customer)
+    if not acc_token:
+        logs.echo(f"Failed to get access token for {customer['name']}")
+        return False
+
+    # Upsert articles over the endpoint's pooled keep-alive session
+    session = api_client.get_session(endpoint)
+    url = endpoint + "/common/api/v2/common/articles"
+    params = {
+        "store": customer["store_name"],
+        "company": customer["company_name"],
+    }
+    retries = customer.get("push_retries", 3)
+    backoff = customer.get("push_backoff", 1.0)
+
+    sizer = chunking.get_sizer(
+        endpoint, customer.get("chunk_target_bytes", chunking.DEFAULT_TARGET_BYTES)
     )
+    encode = encoding.get_encoder(customer.get("json_encoder", "auto"))
+    use_gzip = customer.get("gzip", False)
+    stats = {"encode": 0.0, "compress": 0.0, "raw_bytes": 0, "sent_bytes": 0}
+    stats_lock = threading.Lock()
 
-    print("Access token request JSON:", acc_token_req.json())
-    logging.debug(f"Access token request response: {acc_token_req.json()}")
+    def timed_encode(article):
+        # Runs on the producing thread only, so no lock is needed
+        start = time.perf_counter()
+        part = encode(article)
+        stats["encode"] += time.perf_counter() - start
+        return part
 
-    acc_token = acc_token_req.json().get("responseMessage").get("access_token")
-    print(f"Access token: {acc_token}")
-    logging.debug(f"Access token obtained for {customer['name']}")
-    if acc_token_req.status_code != 200:
-        print(
-            f"Failed to get access token for {customer['name']}: {acc_token_req.status_code}"
+    def post_chunk(body, token, gzipped, splittable):
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        return api_client.post_with_retry(
+            session,
+            url,
+            retries=retries,
+            backoff=backoff,
+            # A chunk that can be split is sent again in halves on timeout
+            retry_timeouts=not splittable,
+            headers=headers,
+            params=params,
+            timeout=300,
+            data=body,
         )
-        logging.error(
-            f"Failed to get access token for {customer['name']}: {acc_token_req.status_code}"
+
+    def split_and_push(parts, chunk_no):
+        half = len(parts) // 2
+        logging.info(f"Splitting chunk {chunk_no} for {customer['name']} into two halves")
+        first = push_chunk(parts[:half], chunk_no)
+        second = push_chunk(parts[half:], chunk_no)
+        return first and second
+
+    def push_chunk(parts, chunk_no):
+        body = encoding.join_array(parts)
+        nbytes = len(body)
+        gzipped = use_gzip and api_client.accepts_gzip(endpoint)
+        if gzipped:
+            start = time.perf_counter()
+            wire_body = encoding.gzip_body(body)
+            with stats_lock:
+                stats["compress"] += time.perf_counter() - start
+        else:
+            wire_body = body
+
+        token = api_client.get_token(customer)
+        if not token:
+            return False
+        try:
+            article_req = post_chunk(wire_body, token, gzipped, len(parts) > 1)
+            if article_req.status_code == 401:
+                # Token expired early or was revoked: refresh once and retry
+                logging.info(f"Access token rejected for {customer['name']}, refreshing")
+                token = api_client.get_token(customer, rejected=token)
+                if not token:
+                    return False
+                article_req = post_chunk(wire_body, token, gzipped, len(parts) > 1)
+            if gzipped and article_req.status_code == 415:
+                # The endpoint cannot decode gzip bodies: resend uncompressed
+                api_client.reject_gzip(endpoint)
+                gzipped = False
+                wire_body = body
+                article_req = post_chunk(wire_body, token, gzipped, len(parts) > 1)
+        except requests.Timeout as e:
+            sizer.observe(nbytes, timed_out=True)
+            if len(parts) > 1:
+                return split_and_push(parts, chunk_no)
+            logging.error(f"Failed to push chunk {chunk_no} for {customer['name']}: {e}")
+            return False
+        except Exception as e:
+            logging.error(f"Failed to push chunk {chunk_no} for {customer['name']}: {e}")
+            return False
+
+        # Time of the final attempt only: retry and Retry-After waits say
+        # nothing about the chunk size
+        seconds = article_req.elapsed.total_seconds()
+        sizer.observe(nbytes, seconds, article_req.status_code)
+        if article_req.status_code == 413 and len(parts) > 1:
+            return split_and_push(parts, chunk_no)
+
+        with stats_lock:
+            stats["raw_bytes"] += nbytes
+            stats["sent_bytes"] += len(wire_body)
+        metrics.HTTP_RESPONSES.inc(customer=customer["name"], status=article_req.status_code)
+        metrics.PUSH_SECONDS.observe(seconds, customer=customer["name"])
+        metrics.PUSH_BYTES.inc(len(wire_body), customer=customer["name"])
+        if 200 <= article_req.status_code < 300:
+            metrics.CHUNKS_PUSHED.inc(customer=customer["name"])
+            metrics.ARTICLES_PUSHED.inc(len(parts), customer=customer["name"])
+        logging.info(
+            "Pushed %d articles (%d bytes, chunk %d) to %s: %s",
+            len(parts),
+            len(wire_body),
+            chunk_no,
+            endpoint,
+            article_req.status_code,
         )
-        return
+        if logs.verbosity >= 2 or logging.getLogger().isEnabledFor(logging.DEBUG):
+            # Decode the response body once, and only when it is shown
+            response = response_body(article_req)
+            logs.echo(f"Pushed chunk {chunk_no} to {url}: {article_req.status_code} {response}", 2)
+            logging.debug("Response for chunk %d: %s", chunk_no, response)
+        return 200 <= article_req.status_code < 300
 
-    # Upsert articles
-    headers = {"Authorization": f"Bearer {acc_token}"}
-    # Break data into chunks of 1000 elements or less
-    chunk_size = 1000
-    for i in range(0, len(data), chunk_size):
-        chunk = data[i : i + chunk_size]
-        article_req = requests.post(
-            endpoint + "/common/api/v2/common/articles",
-            headers=headers,
-            params={
-                "store": customer["store_name"],
-                "company": customer["company_name"],
-            },
-            timeout=300,
-            json=chunk,
+    # Chunks hold at most `chunk_max_articles` articles and roughly the
+    # endpoint's adaptive byte target. `data` may be a generator, in which
+    # case chunks are pushed as they fill. Up to `push_concurrency` chunks
+    # are in flight at once; waiting on the oldest before submitting more
+    # keeps memory bounded.
+    max_articles = customer.get("chunk_max_articles", 1000)
+    concurrency = max(1, customer.get("push_concurrency", 1))
+    ok = True
+    in_flight = collections.deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="push") as pool:
+        chunks = chunking.iter_sized_chunks(data, sizer, max_articles, encode=timed_encode)
+        for chunk_no, (parts, _) in enumerate(chunks, start=1):
+            if len(in_flight) >= concurrency:
+                ok = in_flight.popleft().result() and ok
+            in_flight.append(pool.submit(push_chunk, parts, chunk_no))
+        for future in in_flight:
+            ok = future.result() and ok
+    logging.info(
+        f"Encoded articles for {customer['name']} in {stats['encode']:.2f}s"
+        f" (compression {stats['compress']:.2f}s): {stats['raw_bytes']} bytes of JSON,"
+        f" {stats['sent_bytes']} bytes sent"
+    )
+    return ok
+
+
+def fingerprint_articles(articles, pending, known=None):
+    """Yield articles whose fingerprint differs from `known`.
+
+    Fingerprints of yielded articles are appended to `pending` so they can
+    be saved once the push succeeds. With `known=None` every article is
+    yielded (full resync).
+    """
+    for article in articles:
+        article_id = article.get("articleId")
+        if not article_id:
+            # Without an id there is nothing to key the fingerprint on
+            yield article
+            continue
+        fingerprint = state.article_fingerprint(article)
+        if known is not None and known.get(article_id) == fingerprint:
+            continue
+        pending.append((article_id, fingerprint))
+        yield article
+
+
+def select_changed_articles(customer, articles, store, pending, chunk_size=1000):
+    """Yield only new or changed articles, looking fingerprints up per chunk."""
+    for chunk in iter_chunks(articles, chunk_size):
+        ids = [a["articleId"] for a in chunk if a.get("articleId")]
+        known = store.get_fingerprints(customer["name"], ids)
+        yield from fingerprint_articles(chunk, pending, known)
+
+
+def sync_articles(customer, articles):
+    """Push articles, sending only new or changed ones when delta sync is on."""
+    if not customer.get("delta_sync"):
+        return push_to_api(customer, articles)
+
+    store = state.get_store()
+    full_resync = store.full_resync_due(customer["name"], customer.get("full_resync_hours", 24))
+    pending = []
+    if full_resync:
+        logging.info(f"Running full resync for {customer['name']}")
+        to_push = fingerprint_articles(articles, pending)
+    else:
+        to_push = select_changed_articles(customer, articles, store, pending)
+
+    ok = push_to_api(customer, to_push)
+    if ok:
+        store.save_fingerprints(customer["name"], pending)
+        if full_resync:
+            store.mark_full_sync(customer["name"])
+        logging.info(f"Delta sync for {customer['name']}: {len(pending)} new or changed articles")
+    else:
+        logging.warning(f"Push failed for {customer['name']}; fingerprints not updated")
+    return ok
+
+
+def _plugin_stages(plugins):
+    """Group a plugin chain into fused per-article stages and list stages."""
+    stages = []
+    for plugin in plugins:
+        if hasattr(plugin, "transform_article"):
+            if stages and stages[-1][0] == "article":
+                stages[-1][1].append(plugin)
+            else:
+                stages.append(("article", [plugin]))
+        else:
+            stages.append(("list", [plugin]))
+    return stages
+
+
+def _prepare_plugin(plugin, customer, products):
+    prepare = getattr(plugin, "prepare", None)
+    if prepare is None:
+        return None
+    if products is None:
+        return prepare(customer)
+    return prepare(customer, products=products)
+
+
+def _plugin_name(plugin):
+    return plugin.__name__ if isinstance(plugin, type) else type(plugin).__name__
+
+
+def _observe_plugin_time(customer, spent):
+    for name, seconds in spent.items():
+        metrics.PLUGIN_SECONDS.observe(seconds, customer=customer["name"], plugin=name)
+
+
+def _fused_pass(customer, articles, plugins, products):
+    """Apply several per-article plugins to each article in a single pass."""
+    steps = []
+    spent = collections.Counter()
+    for plugin in plugins:
+        start = time.perf_counter()
+        try:
+            context = _prepare_plugin(plugin, customer, products)
+            steps.append((plugin, _plugin_name(plugin), plugin.transform_article, context))
+        except Exception as e:
+            logging.error(f"Plugin {plugin} failed for {customer['name']}: {e}")
+        spent[_plugin_name(plugin)] += time.perf_counter() - start
+    try:
+        for article in articles:
+            failed = []
+            for step in steps:
+                plugin, name, transform, context = step
+                start = time.perf_counter()
+                try:
+                    article = transform(customer, article, context)
+                except Exception as e:
+                    # A failing plugin is skipped for the rest of the feed
+                    logging.error(f"Plugin {plugin} failed for {customer['name']}: {e}")
+                    failed.append(step)
+                spent[name] += time.perf_counter() - start
+            if failed:
+                steps = [step for step in steps if step not in failed]
+            yield article
+    finally:
+        _observe_plugin_time(customer, spent)
+
+
+def _list_pass(customer, articles, plugin, products, chunk_size):
+    if chunk_size:
+        chunks = iter_chunks(articles, chunk_size)
+    else:
+        chunks = [articles if isinstance(articles, list) else list(articles)]
+    spent = collections.Counter()
+    try:
+        for chunk in chunks:
+            start = time.perf_counter()
+            try:
+                if products is None:
+                    chunk = plugin.transform_articles(customer, chunk)
+                else:
+                    chunk = plugin.transform_articles(customer, chunk, products=products)
+            except Exception as e:
+                logging.error(f"Plugin {plugin} failed for {customer['name']}: {e}")
+            spent[_plugin_name(plugin)] += time.perf_counter() - start
+            yield from chunk
+    finally:
+        _observe_plugin_time(customer, spent)
+
+
+def apply_plugins(customer, articles, plugins, products=None, chunk_size=None):
+    """Run a customer's plugin chain over its articles.
+
+    Consecutive plugins with a `transform_article` hook are fused into one
+    pass over the articles, so streamed feeds are transformed without being
+    held in memory. Plugins with only `transform_articles` get lists: the
+    whole feed, or chunks of `chunk_size` articles when streaming. Returns
+    an iterable of articles (the input itself when there are no plugins).
+    """
+    for kind, stage in _plugin_stages(plugins):
+        if kind == "article":
+            articles = _fused_pass(customer, articles, stage, products)
+        else:
+            articles = _list_pass(customer, articles, stage[0], products, chunk_size)
+    return articles
+
+
+def transform_columnar(customer, csv_data, plugins):
+    """Parse and transform a CSV feed as a pandas frame.
+
+    Leading plugins with a `transform_frame` hook run vectorized on the
+    frame; the rest of the chain runs on the articles built from it.
+    """
+    frame = columnar.read_csv_frame(csv_data, customer)
+    logging.info(f"Parsed {len(frame)} rows into a frame for {customer['name']}")
+    metrics.ROWS_PARSED.inc(len(frame), customer=customer["name"])
+    plugins = list(plugins)
+    while plugins and hasattr(plugins[0], "transform_frame"):
+        plugin = plugins.pop(0)
+        with metrics.PLUGIN_SECONDS.time(customer=customer["name"], plugin=_plugin_name(plugin)):
+            try:
+                frame = plugin.transform_frame(customer, frame)
+            except Exception as e:
+                logging.error(f"Plugin {plugin} failed for {customer['name']}: {e}")
+    return apply_plugins(customer, columnar.frame_to_articles(frame), plugins)
+
+
+class SqlWatermark:
+    """Tracks the highest value of a customer's watermark column in a result."""
+
+    def __init__(self, column):
+        self.column = column
+        self.value = None
+        self.rows = 0
+
+    def feed(self, rows):
+        for row in rows:
+            self.rows += 1
+            value = row.get(self.column)
+            if value is not None and (self.value is None or value > self.value):
+                self.value = value
+            yield row
+
+
+def timed_rows(customer, rows):
+    """Yield `rows`, recording the time spent reading them as fetch metrics.
+
+    Streamed query results are read while they are mapped and pushed, so
+    only the time spent waiting on the cursor counts as fetch time.
+    """
+    labels = {"customer": customer["name"], "source": customer["input_type"]}
+    rows = iter(rows)
+    seconds = 0.0
+    count = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - start
+            count += 1
+            yield row
+    finally:
+        metrics.FETCH_SECONDS.observe(seconds, **labels)
+        metrics.FETCH_ROWS.inc(count, **labels)
+
+
+def push_sql_rows(customer, tracker=None, force=False):
+    """Map a SQL customer's query result straight to articles and push them.
+
+    With streaming on, rows flow from the server cursor to the upload one
+    chunk at a time. Otherwise the articles are collected first so an
+    unchanged result can be skipped (via `tracker`) before anything is sent.
+
+    With a watermark column, the query receives the highest value pushed so
+    far as `%(watermark)s` and only changed rows are read. A probe query,
+    when configured, is run first and the cycle is skipped if its result
+    matches the last successful one. `force` ignores both.
+    """
+    creds = customer["creds"]
+    column = customer.get("sql_watermark_column")
+    probe_query = customer.get("sql_probe_query")
+    store = state.get_store() if column or probe_query else None
+    previous = None
+    if store and not force:
+        previous = store.get_sql_watermark(customer["name"])
+
+    probe = None
+    if probe_query:
+        probe = probe_sql(**{**creds, "query": probe_query})
+        if previous and previous["probe"] == probe:
+            raise SourceUnchanged(f"probe query returned {probe}")
+
+    watermark = start = None
+    if column:
+        start = customer.get("sql_watermark_start")
+        if previous and previous["watermark"] is not None:
+            start = previous["watermark"]
+        logging.info(f"Reading rows for {customer['name']} with {column} from {start}")
+        watermark = SqlWatermark(column)
+        rows = watermark.feed(
+            timed_rows(customer, fetch_sql_rows(**creds, params={"watermark": start}))
         )
+    else:
+        rows = timed_rows(customer, fetch_sql_rows(**creds))
 
-        print(
-            f"Pushed chunk {i//chunk_size + 1} to {endpoint}/common/api/v2/common/articles: {article_req.status_code}"
-            f"Chunk {chunk} response: {article_req.json()}"
+    try:
+        plugins = get_plugins_for_customer(customer)
+    except Exception as e:
+        logging.debug(f"Plugin error for {customer['name']}: {e}")
+        plugins = []
+    if customer.get("streaming"):
+        articles = apply_plugins(
+            customer, iter_sql_articles(rows, customer), plugins, chunk_size=1000
         )
-        logging.info(
-            f"Pushed {len(chunk)} articles (chunk {i//chunk_size + 1}) to {endpoint}: {article_req.status_code}"
+        pushed = sync_articles(customer, articles)
+    else:
+        digest = state.RowDigest()
+        articles = list(iter_sql_articles(digest.feed(rows), customer))
+        logging.info(f"Read {len(articles)} articles from SQL for {customer['name']}")
+        if tracker:
+            tracker.check_hash(digest.hexdigest())
+        pushed = sync_articles(customer, apply_plugins(customer, articles, plugins))
+
+    if pushed and store:
+        if watermark and watermark.rows and watermark.value is None:
+            logging.warning(
+                f"Watermark column {column} missing or empty in results for {customer['name']}"
+            )
+        if watermark and watermark.value is not None:
+            start = str(watermark.value)
+        store.save_sql_watermark(customer["name"], start, probe)
+    return pushed
+
+
+def push_streamed_file(customer, file_path):
+    """Parse a CSV file lazily and push its articles chunk by chunk.
+
+    Peak memory is bounded by one chunk of articles rather than the file.
+    """
+    try:
+        plugins = get_plugins_for_customer(customer)
+    except Exception as e:
+        logging.debug(f"Plugin error for {customer['name']}: {e}")
+        plugins = []
+    with open(file_path, newline="", encoding="utf-8") as f:
+        articles = iter_csv_articles(csv.reader(f), customer)
+        return sync_articles(customer, apply_plugins(customer, articles, plugins, chunk_size=1000))
+
+
+class SourceTracker:
+    """Compares a customer's source with the last one processed successfully.
+
+    The listing (file name, mtime, size) is checked before download and a
+    content hash after it, so unchanged sources are neither downloaded nor
+    parsed again.
+    """
+
+    def __init__(self, customer_name, store, force=False):
+        self.customer_name = customer_name
+        self.store = store
+        self.previous = None if force else store.get_source_watermark(customer_name)
+        self.name = self.mtime = self.size = self.content_hash = None
+
+    def is_unchanged(self, name, mtime, size):
+        self.name, self.mtime, self.size = name, mtime, size
+        prev = self.previous
+        if not prev or mtime is None:
+            return False
+        return (prev["name"], prev["mtime"], prev["size"]) == (name, mtime, size)
+
+    def check_content(self, data=None, path=None):
+        """Raise SourceUnchanged if the fetched content was already processed."""
+        self.check_hash(state.content_digest(data, path))
+
+    def check_hash(self, content_hash):
+        self.content_hash = content_hash
+        if self.previous and self.previous["content_hash"] == self.content_hash:
+            # Remember the new listing so the next cycle skips the download
+            self.save()
+            raise SourceUnchanged(self.name or "query result")
+
+    def save(self):
+        self.store.save_source_watermark(
+            self.customer_name, self.name, self.mtime, self.size, self.content_hash
         )
-        print(f"Response: {article_req.json()}")
-        logging.debug(f"Response: {article_req.json()}")
 
 
-def process_customer(customer):
-    print(f"Processing customer {customer['name']}")
+class HttpSourceTracker:
+    """ETag/Last-Modified validators of a customer's HTTP source.
+
+    Requests carry the validators of the last successfully pushed response,
+    so an unchanged source costs a 304. New validators are only stored
+    once the push succeeds.
+    """
+
+    def __init__(self, customer_name, store, force=False):
+        self.customer_name = customer_name
+        self.store = store
+        self.previous = None if force else store.get_http_validators(customer_name)
+        self.etag = self.last_modified = None
+
+    def request_headers(self):
+        headers = {}
+        if self.previous:
+            if self.previous["etag"]:
+                headers["If-None-Match"] = self.previous["etag"]
+            if self.previous["last_modified"]:
+                headers["If-Modified-Since"] = self.previous["last_modified"]
+        return headers
+
+    def observe(self, response):
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+
+    def save(self):
+        self.store.save_http_validators(self.customer_name, self.etag, self.last_modified)
+
+
+def process_dutchie(customer, force=False):
+    """Fetch, transform and push a Dutchie POS customer's products."""
+    try:
+        plugins = get_plugins_for_customer(customer)
+        logging.debug(f"Found {len(plugins)} plugins for {customer['name']}")
+    except Exception as e:
+        logging.debug("No plugins available or plugin system failed")
+        logging.debug(f"Plugin error for {customer['name']}: {e}")
+        plugins = []
+
+    cache_path = os.path.join("tmp", customer["name"], DUTCHIE_PRODUCTS_CACHE)
+    tracker = None
+    if customer.get("skip_unchanged"):
+        tracker = HttpSourceTracker(customer["name"], state.get_store(), force=force)
+        if plugins and not os.path.exists(cache_path):
+            # Plugins need the products even when the catalogue is unchanged
+            tracker.previous = None
+
+    try:
+        products, _ = fetch_dutchie(customer["name"], **customer["creds"], conditional=tracker)
+    except SourceUnchanged:
+        if not plugins:
+            raise
+        # Plugins may add data that changes on its own (e.g. inventory), so
+        # run them over the last catalogue instead of skipping the cycle
+        logging.info(f"Dutchie products unchanged for {customer['name']}; using cached catalogue")
+        with open(cache_path, encoding="utf-8") as f:
+            products = json.load(f)
+        tracker = None
+    else:
+        if tracker and plugins:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path + ".part", "w", encoding="utf-8") as f:
+                json.dump(products, f)
+            os.replace(cache_path + ".part", cache_path)
+
+    parsed_data = dutchie_to_articles(products, customer)
+    parsed_data = apply_plugins(customer, parsed_data, plugins, products=products)
+    pushed = sync_articles(customer, parsed_data)
+    if pushed and tracker:
+        tracker.save()
+    return "pushed" if pushed else "failed"
+
+
+def archive_source_file(customer, source_file):
+    """Move a processed source file into tmp/<customer>, keeping the 3 newest.
+
+    FTP and SFTP downloads are already written there and are left in place.
+    Failures are logged rather than raised: the data has been pushed by now.
+    """
+    try:
+        _archive_source_file(customer, source_file)
+    except OSError as e:
+        logging.warning(f"Could not archive {source_file} for {customer['name']}: {e}")
+
+
+def _archive_source_file(customer, source_file):
+    customer_dir = os.path.join("tmp", customer["name"])
+    os.makedirs(customer_dir, exist_ok=True)
+
+    # Move the file into the customer tmp directory.
+    # If a file with the same name already exists, remove it first to overwrite.
+    def safe_move_overwrite(src, dst_dir):
+        base = os.path.basename(src)
+        dst_path = os.path.join(dst_dir, base)
+        # If destination exists, remove it first to overwrite
+        if os.path.exists(dst_path):
+            try:
+                os.remove(dst_path)
+            except Exception:
+                # If remove fails, fall back to renaming the old file
+                name, ext = os.path.splitext(base)
+                ts = datetime.now().strftime("%Y%m%d%H%M%S")
+                backup_name = f"{name}_old_{ts}{ext}"
+                backup_path = os.path.join(dst_dir, backup_name)
+                os.rename(dst_path, backup_path)
+        shutil.move(src, dst_path)
+        return dst_path
+
+    if os.path.dirname(os.path.abspath(source_file)) != os.path.abspath(customer_dir):
+        safe_move_overwrite(source_file, customer_dir)
+
+    # Keep only 3 most recent files
+    files = sorted(
+        os.listdir(customer_dir),
+        key=lambda f: os.path.getmtime(os.path.join(customer_dir, f)),
+        reverse=True,
+    )
+    for f in files[3:]:
+        os.remove(os.path.join(customer_dir, f))
+
+
+def record_fetch(customer, start, data, source_file):
+    """Record a file or query fetch's size and duration."""
+    labels = {"customer": customer["name"], "source": customer["input_type"]}
+    metrics.FETCH_SECONDS.observe(time.perf_counter() - start, **labels)
+    if data:
+        metrics.FETCH_BYTES.inc(len(data), **labels)
+    elif source_file and os.path.isfile(source_file):
+        # Streamed downloads are on disk rather than in memory
+        metrics.FETCH_BYTES.inc(os.path.getsize(source_file), **labels)
+
+
+def process_customer(customer, force=False):
+    """Fetch, parse, transform and push one customer's data.
+
+    Returns a short status: "pushed", "unchanged", "no_data" or "failed".
+    """
+    logs.echo(f"Processing customer {customer['name']}")
     logging.info(f"Processing customer {customer['name']}")
     input_type = customer["input_type"]
     creds = customer["creds"]
 
+    # Streaming only applies to plain CSV files; custom parsers need the
+    # whole input in memory
+    fetch_kwargs = {}
+    if customer.get("streaming") and customer.get("input_parser", "csv") == "csv":
+        fetch_kwargs["stream"] = True
+
     try:
+        # Plugin requests (e.g. CKS inventory) overlap with the source fetch
+        prefetch_plugins(customer)
+
+        try:
+            plugins = get_plugins_for_customer(customer)
+            logging.debug(f"Found {len(plugins)} plugins for {customer['name']}")
+        except Exception as e:
+            # If plugin subsystem fails, continue with default behaviour
+            logging.debug("No plugins available or plugin system failed")
+            logging.debug(f"Plugin error for {customer['name']}: {e}")
+            plugins = []
+
+        # Plugins may derive data from more than the source (e.g. sale labels
+        # from today's date), so customers with plugins run every cycle
+        tracker = None
+        if (
+            customer.get("skip_unchanged")
+            and not plugins
+            and input_type in ("ftp", "sftp", "sql", "local")
+        ):
+            tracker = SourceTracker(customer["name"], state.get_store(), force=force)
+            if input_type != "sql":
+                fetch_kwargs["is_unchanged"] = tracker.is_unchanged
+
+        fetch_start = time.perf_counter()
         if input_type == "ftp":
-            customer_data, source_file = fetch_ftp(customer["name"], **creds)
+            customer_data, source_file = fetch_ftp(customer["name"], **creds, **fetch_kwargs)
         elif input_type == "sftp":
-            customer_data, source_file = fetch_sftp(customer["name"], **creds)
+            customer_data, source_file = fetch_sftp(customer["name"], **creds, **fetch_kwargs)
         elif input_type == "sql":
+            if customer.get("input_parser", "csv") == "csv":
+                # Rows are mapped by column name, without a CSV round trip
+                pushed = push_sql_rows(customer, tracker, force=force)
+                if pushed and tracker:
+                    tracker.save()
+                return "pushed" if pushed else "failed"
             customer_data, source_file = fetch_sql(**creds)
         elif input_type == "local":
-            customer_data, source_file = fetch_local(**creds)
+            customer_data, source_file = fetch_local(**creds, **fetch_kwargs)
         elif input_type == "dutchie_pos":
-            products, source_file = fetch_dutchie(customer["name"], **creds)
-            parsed_data = dutchie_to_articles(products, customer)
-            try:
-                plugins = get_plugins_for_customer(customer)
-                logging.debug(f"Found {len(plugins)} plugins for {customer['name']}")
-                for plugin in plugins:
-                    try:
-                        parsed_data = plugin.transform_articles(customer, parsed_data, products=products)
-                    except Exception as e:
-                        logging.error(f"Plugin {plugin} failed for {customer['name']}: {e}")
-            except Exception as e:
-                logging.debug("No plugins available or plugin system failed")
-                logging.debug(f"Plugin error for {customer['name']}: {e}")
-            push_to_api(customer, parsed_data)
-            return
+            return process_dutchie(customer, force=force)
         else:
-            print(f"Unknown input type: {input_type}")
+            logs.echo(f"Unknown input type: {input_type}")
             logging.error(f"Unknown input type: {input_type}")
-            return
+            return "failed"
+        record_fetch(customer, fetch_start, customer_data, source_file)
+
+        if not customer_data and not source_file:
+            # Empty directory, listing or result: keep the last watermark
+            logs.echo(f"No input data found for {customer['name']}")
+            logging.info(f"No input data found for {customer['name']}")
+            return "no_data"
+
+        if tracker:
+            tracker.check_content(customer_data, source_file)
+
+        if customer_data is None:
+            # Streaming mode: the source is on disk and is parsed lazily
+            pushed = push_streamed_file(customer, source_file)
+            if pushed and tracker:
+                tracker.save()
+            archive_source_file(customer, source_file)
+            return "pushed" if pushed else "failed"
 
         csv_data = customer_data
+        rows = None
         if customer.get("input_parser", "csv") != "csv":
-            print(
-                f"Parsing customer {customer['name']} data with parser {customer['input_parser']}"
+            logs.echo(
+                f"Parsing customer {customer['name']} data with parser {customer['input_parser']}",
+                2,
             )
             path = os.getenv(f"{customer['name'].upper()}_LOCAL_PATH")
             if not path:
-                print(f"No LOCAL_PATH found for {customer['name']}")
+                logs.echo(f"No LOCAL_PATH found for {customer['name']}")
                 logging.error(f"No LOCAL_PATH found for {customer['name']}")
-                return
-            # Find latest file in path
-            if os.path.isdir(path):
-                files = [
-                    f
-                    for f in os.listdir(path)
-                    if os.path.isfile(os.path.join(path, f))
-                ]
-                if not files:
-                    print(f"No files found in {path}")
-                    logging.error(f"No files found in {path}")
-                    return
-                latest = max(
-                    files,
-                    key=lambda f: os.path.getmtime(os.path.join(path, f)),
-                )
-                file_path = os.path.join(path, latest)
+                return "failed"
+            file_path = latest_local_file(path)
+            if file_path is None:
+                logs.echo(f"No files found in {path}")
+                logging.error(f"No files found in {path}")
+                return "failed"
+            source_file = file_path  # for non-csv, the file is the source
+            parser = get_input_parser(customer["input_parser"])
+            if parser is not None:
+                # Registered parsers run in-process and yield rows directly
+                rows = parser.parse(file_path, customer)
             else:
-                file_path = path
-            result = subprocess.run(
-                ["python", f'utils/{customer["input_parser"]}.py', file_path],
-                capture_output=True,
-                text=True,
-            )
-            if result.returncode == 0:
-                csv_data = result.stdout
-                source_file = file_path  # for non-csv, the file is the source
-            else:
-                print(f"Parser error: {result.stderr}")
-                logging.error(
-                    f"Parser error for {customer['name']}: {result.stderr}"
+                result = subprocess.run(
+                    ["python", f'utils/{customer["input_parser"]}.py', file_path],
+                    capture_output=True,
+                    text=True,
                 )
-                return
+                if result.returncode == 0:
+                    csv_data = result.stdout
+                else:
+                    logs.echo(f"Parser error: {result.stderr}")
+                    logging.error(f"Parser error for {customer['name']}: {result.stderr}")
+                    return "failed"
 
         # format data for API
-        parsed_data = parse_csv_data(csv_data, customer)
-
-        # Allow plugins to transform/modify articles for this customer
-        try:
-            plugins = get_plugins_for_customer(customer)
-            logging.debug(f"Found {len(plugins)} plugins for {customer['name']}")
-            for plugin in plugins:
-                try:
-                    parsed_data = plugin.transform_articles(customer, parsed_data)
-                except Exception as e:
-                    logging.error(f"Plugin {plugin} failed for {customer['name']}: {e}")
-        except Exception as e:
-            # If plugin subsystem fails, continue with default behaviour
-            logging.debug("No plugins available or plugin system failed")
-            logging.debug(f"Plugin error for {customer['name']}: {e}")
+        if rows is not None:
+            articles = iter_csv_articles(iter(rows), customer)
+            if customer.get("streaming"):
+                parsed_data = apply_plugins(customer, articles, plugins, chunk_size=1000)
+            else:
+                parsed_data = apply_plugins(customer, list(articles), plugins)
+        elif customer.get("columnar") and columnar.available():
+            parsed_data = transform_columnar(customer, csv_data, plugins)
+        else:
+            if customer.get("columnar"):
+                logging.warning(f"pandas is not installed; parsing {customer['name']} row by row")
+            parsed_data = apply_plugins(customer, parse_csv_data(csv_data, customer), plugins)
 
         # push data to customer server
-        push_to_api(customer, parsed_data)
+        pushed = sync_articles(customer, parsed_data)
+
+        if pushed and tracker:
+            tracker.save()
 
         # Move file to tmp
         if source_file:
-            customer_dir = os.path.join("tmp", customer["name"])
-            os.makedirs(customer_dir, exist_ok=True)
-
-            # Move the file into the customer tmp directory.
-            # If a file with the same name already exists, remove it first to overwrite.
-            def safe_move_overwrite(src, dst_dir):
-                base = os.path.basename(src)
-                dst_path = os.path.join(dst_dir, base)
-                # If destination exists, remove it first to overwrite
-                if os.path.exists(dst_path):
-                    try:
-                        os.remove(dst_path)
-                    except Exception:
-                        # If remove fails, fall back to renaming the old file
-                        name, ext = os.path.splitext(base)
-                        ts = datetime.now().strftime('%Y%m%d%H%M%S')
-                        backup_name = f"{name}_old_{ts}{ext}"
-                        backup_path = os.path.join(dst_dir, backup_name)
-                        os.rename(dst_path, backup_path)
-                shutil.move(src, dst_path)
-                return dst_path
-
-            moved = safe_move_overwrite(source_file, customer_dir)
-
-            # Keep only 3 most recent files
-            files = sorted(
-                os.listdir(customer_dir),
-                key=lambda f: os.path.getmtime(os.path.join(customer_dir, f)),
-                reverse=True,
-            )
-            for f in files[3:]:
-                os.remove(os.path.join(customer_dir, f))
+            archive_source_file(customer, source_file)
+        return "pushed" if pushed else "failed"
+
+    except SourceUnchanged as e:
+        logs.echo(f"Source unchanged for {customer['name']}: {e}")
+        logging.info(f"Source unchanged for {customer['name']}, skipping: {e}")
+        return "unchanged"
 
     except Exception as e:
-        print(f"Error processing {customer['name']}: {e}")
+        logs.echo(f"Error processing {customer['name']}: {e}")
         logging.error(f"Error processing {customer['name']}: {e}")
+        return "failed"
+
+
+def source_host(customer):
+    """Return the key used to limit concurrent connections to one source."""
+    if customer.get("input_type") == "dutchie_pos":
+        return "dutchie_pos"
+    return (customer.get("creds") or {}).get("host")
+
+
+class HostLimiter:
+    """Limits how many customers talk to the same source host at once."""
+
+    def __init__(self, max_per_host=2):
+        self.max_per_host = max_per_host
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def limit(self, host):
+        if not host:
+            return contextlib.nullcontext()
+        with self._lock:
+            if host not in self._limits:
+                self._limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._limits[host]
+
+
+def run_customer(customer, limiter, force=False):
+    """Process one customer within its host limit; returns (status, seconds)."""
+    logs.echo(f"Starting job with customer {customer['name']}")
+    logging.info(f"Starting job with customer {customer['name']}")
+    start = time.monotonic()
+    with limiter.limit(source_host(customer)):
+        try:
+            status = process_customer(customer, force=force)
+        except Exception as e:
+            logging.error(f"Unhandled error processing {customer['name']}: {e}")
+            status = "failed"
+    seconds = time.monotonic() - start
+    metrics.CYCLE_SECONDS.observe(seconds, customer=customer["name"], status=status)
+    metrics.CYCLES.inc(customer=customer["name"], status=status)
+    return status, seconds
 
 
-def run_daemon(config):
+def customer_schedule(customer):
+    """Build a customer's run schedule from its interval/cron settings."""
+    return scheduler.CustomerSchedule(
+        interval=customer.get("interval", scheduler.DEFAULT_INTERVAL),
+        cron=customer.get("cron"),
+        jitter=customer.get("jitter", 0),
+        overlap=customer.get("overlap", "skip"),
+    )
+
+
+def run_daemon(config, force=False):
+    """Process each customer on its own schedule until interrupted.
+
+    Customers run every `interval` seconds or on their `cron` expression
+    (see scheduler.py). Local customers with `watch` set are processed on
+    file events instead (see watcher.py), as long as watchdog is installed.
+
+    With `force`, every customer's first run happens right away, ignores
+    source watermarks and processes the customer even if its input has not
+    changed.
+    """
+    state.configure(config.state_db)
+    # Keep source connections open between cycles
+    connections.configure(config.connection_pool, max_idle=config.connection_max_idle)
+
     # discover plugins once at startup
     try:
         discover_plugins()
     except Exception:
         logging.debug("discover_plugins failed or no plugins present")
+    try:
+        discover_parsers()
+    except Exception:
+        logging.debug("discover_parsers failed or no parsers present")
+    # Resolve each customer's plugin chain once, up front
+    reset_plugin_chains()
+    for customer in config.customers:
+        try:
+            get_plugins_for_customer(customer)
+        except Exception as e:
+            logging.debug(f"Plugin error for {customer['name']}: {e}")
+
+    limiter = HostLimiter(config.max_per_host)
+
+    metrics_server = None
+    if config.metrics_port:
+        try:
+            metrics_server = metrics.start_http_server(config.metrics_port, config.metrics_host)
+        except OSError as e:
+            logging.error(f"Cannot serve metrics on port {config.metrics_port}: {e}")
+
+    def run(customer, force=False):
+        status, seconds = run_customer(customer, limiter, force=force)
+        logging.info(f"Customer {customer['name']} finished: {status} in {seconds:.1f}s")
+        connections.evict_idle()
+        if config.metrics_json:
+            try:
+                metrics.dump_json(config.metrics_json)
+            except OSError as e:
+                logging.error(f"Cannot write metrics to {config.metrics_json}: {e}")
 
-    def job():
-        for customer in config.customers:
-            print(f"Starting job with customer {customer['name']}")
-            logging.info(f"Starting job with customer {customer['name']}")
-            process_customer(customer)
+    customer_scheduler = scheduler.Scheduler(run, max_workers=config.max_workers)
 
-    # schedule.every(1).hours.do(job)  # Run every hour
-    schedule.every(1).minutes.do(job)  # Run every minute
+    # Watched local customers run on file events instead of on a schedule
+    local_watcher = None
+    watched = set()
+    watch_customers = [
+        c for c in config.customers if c.get("input_type") == "local" and c.get("watch")
+    ]
+    forced = set()
 
-    while True:
-        print(schedule.get_jobs())
-        logging.debug(f"Scheduled jobs: {schedule.get_jobs()}")
+    def run_watched(customer):
+        # Only the startup run of a watched customer is forced. The run goes
+        # through the scheduler's pool so it counts against MAX_WORKERS; the
+        # watcher thread waits for it to keep its one-run-at-a-time coalescing
+        force_run = customer["name"] in forced
+        forced.discard(customer["name"])
+        customer_scheduler.submit(customer, force=force_run).result()
 
-        schedule.run_pending()
-        time.sleep(60)
+    if watch_customers:
+        local_watcher = watcher.LocalWatcher(run_watched, debounce=config.watch_debounce)
+        watched = local_watcher.watch(watch_customers)
+        if force:
+            forced.update(watched)
+        # Pick up files that arrived while the daemon was not running
+        for name in watched:
+            local_watcher.notify(name)
+
+    for customer in config.customers:
+        if customer["name"] in watched:
+            continue
+        try:
+            customer_scheduler.add(customer, customer_schedule(customer), force=force)
+        except ValueError as e:
+            logs.echo(f"Invalid schedule for {customer['name']}: {e}")
+            logging.error(f"Invalid schedule for {customer['name']}, not scheduling it: {e}")
+
+    try:
+        customer_scheduler.run_forever()
+    finally:
+        # Stop file events first: they submit runs to the scheduler's pool
+        if local_watcher:
+            local_watcher.stop()
+        customer_scheduler.stop()
+        if metrics_server:
+            metrics_server.shutdown()
@@ -0,0 +1,135 @@
+"""JSON encoding and compression of article upload bodies.
+
+orjson is used when it is installed and can encode the value; otherwise
+the stdlib json module is used. Articles are encoded once, when chunks are
+built, and the encoded pieces are joined into the request body.
+
+Large JSON array responses can also be decoded incrementally, one element
+at a time, with `iter_json_array`.
+"""
+
+import codecs
+import gzip
+import json
+import logging
+
+from articles import json_default
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=json_default).encode(
+        "utf-8"
+    )
+
+
+def _orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj, default=json_default)
+    except TypeError:
+        # e.g. Decimal values or non-string keys set by a plugin
+        return _stdlib_dumps(obj)
+
+
+def get_encoder(backend="auto"):
+    """Return a function encoding a value to JSON bytes.
+
+    `backend` is "auto" (orjson if installed), "orjson" or "json".
+    """
+    if backend in ("auto", "orjson") and orjson is not None:
+        return _orjson_dumps
+    if backend == "orjson":
+        logging.warning("orjson is not installed; falling back to the json module")
+    return _stdlib_dumps
+
+
+def join_array(parts):
+    """Join individually encoded JSON values into a JSON array body."""
+    return b"[" + b",".join(parts) + b"]"
+
+
+def gzip_body(body, level=5):
+    return gzip.compress(body, compresslevel=level)
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_NUMBER_CONTINUATION = ".eE+-0123456789"
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a JSON array read from an iterable of byte chunks.
+
+    Only the element being decoded and the current chunk are held in
+    memory, so a large response can be filtered as it arrives. Raises
+    ValueError if the document is not a JSON array.
+    """
+    decode = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        for chunk in chunks:
+            if chunk:
+                buf = buf[pos:] + decode.decode(chunk)
+                pos = 0
+                return
+        buf = buf[pos:] + decode.decode(b"", final=True)
+        pos = 0
+        eof = True
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip_whitespace()
+    if not buf.startswith("[", pos):
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    while True:
+        skip_whitespace()
+        if pos >= len(buf):
+            raise ValueError("Unterminated JSON array")
+        if buf[pos] == "]":
+            return
+        if started:
+            if buf[pos] != ",":
+                raise ValueError(f"Expected ',' or ']' at offset {pos}")
+            pos += 1
+            skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A number at the end of the buffer may continue in the next chunk,
+            # and one cut inside its fraction or exponent stops at the cut
+            if not eof and (
+                end == len(buf) or (_is_number(value) and buf[end] in _NUMBER_CONTINUATION)
+            ):
+                fill()
+                continue
+            break
+        pos = end
+        started = True
+        yield value
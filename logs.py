@@ -0,0 +1,106 @@
+"""Log and console output that stays off the pipeline's hot path.
+
+`configure` routes every log record through a queue: the threads that
+parse and push only enqueue records, and a `QueueListener` thread does the
+formatting and the (possibly slow, synchronous) file or stdout writes.
+Records below the configured level are dropped before they are formatted,
+so debug calls with lazy `%s` arguments cost almost nothing when debug
+logging is off.
+
+Console progress messages go through `echo`, which prints only when the
+configured verbosity is high enough: 0 is quiet, 1 (the default) shows one
+line per customer run and 2 adds per-feed and per-chunk detail. Row-level
+tracing is sampled: `should_trace` selects every `row_sample`-th row.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+
+DEFAULT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DEFAULT_VERBOSITY = 1
+DEFAULT_ROW_SAMPLE = 1000
+CONSOLE_LOGGER = "ubi_ingest.console"
+
+verbosity = DEFAULT_VERBOSITY
+row_sample = DEFAULT_ROW_SAMPLE
+
+_console = logging.getLogger(CONSOLE_LOGGER)
+_listener = None
+
+
+def echo(message, level=1):
+    """Show a progress message on stdout if verbosity is at least `level`."""
+    if verbosity < level:
+        return
+    if _listener is None:
+        # Logging not configured (tests, library use): print directly
+        print(message)
+    else:
+        _console.info(message)
+
+
+def should_trace(index):
+    """True for the rows that get a row-level debug trace."""
+    return bool(row_sample) and index % row_sample == 0
+
+
+class _ConsoleFilter(logging.Filter):
+    def __init__(self, console):
+        super().__init__()
+        self.console = console
+
+    def filter(self, record):
+        return (record.name == CONSOLE_LOGGER) == self.console
+
+
+def configure(
+    level=logging.INFO,
+    filename=None,
+    fmt=DEFAULT_FORMAT,
+    verbosity_level=DEFAULT_VERBOSITY,
+    sample=DEFAULT_ROW_SAMPLE,
+):
+    """Send log records to `filename` (or stdout) through a background listener."""
+    global _listener, verbosity, row_sample
+    stop()
+    verbosity = verbosity_level
+    row_sample = sample
+
+    handler = logging.FileHandler(filename) if filename else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter(fmt))
+    handler.setLevel(level)
+    handler.addFilter(_ConsoleFilter(console=False))
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    console.addFilter(_ConsoleFilter(console=True))
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+    # Console messages are shown whatever the log level
+    _console.setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(
+        records, handler, console, respect_handler_level=True
+    )
+    _listener.start()
+    return _listener
+
+
+def stop():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop)
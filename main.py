@@ -1,6 +1,6 @@
 import argparse
 import logging
-import sys
+import logs
 from dotenv import load_dotenv
 from daemon import run_daemon
 from config import Config
@@ -8,21 +8,16 @@ from config import Config
 
 def main():
     parser = argparse.ArgumentParser(description="CSV Ingest Daemon")
-    parser.add_argument(
-        "--ftp", action="store_true", help="Process FTP customers"
-    )
-    parser.add_argument(
-        "--sftp", action="store_true", help="Process SFTP customers"
-    )
-    parser.add_argument(
-        "--sql", action="store_true", help="Process SQL customers"
-    )
-    parser.add_argument(
-        "--local", action="store_true", help="Process local path customers"
-    )
+    parser.add_argument("--ftp", action="store_true", help="Process FTP customers")
+    parser.add_argument("--sftp", action="store_true", help="Process SFTP customers")
+    parser.add_argument("--sql", action="store_true", help="Process SQL customers")
+    parser.add_argument("--local", action="store_true", help="Process local path customers")
     parser.add_argument("--config", type=str, help="Path to config file")
+    parser.add_argument("--customer", type=str, help="Specific customer name to process")
     parser.add_argument(
-        "--customer", type=str, help="Specific customer name to process"
+        "--force",
+        action="store_true",
+        help="Process every customer on the first cycle even if its source is unchanged",
     )
     args = parser.parse_args()
 
@@ -36,20 +31,18 @@ def main():
 
     config = Config(customer_name=args.customer)
 
-    # Set up logging
+    # Set up logging; records are written by a background listener thread
     print("Setting up logging")
-    if config.debug:
-        logging.basicConfig(
-            level=logging.DEBUG,
-            stream=sys.stdout,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-        )
-    else:
-        logging.basicConfig(
-            level=getattr(logging, config.log_level.upper(), logging.INFO),
-            filename=config.log_file,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-        )
+    logs.configure(
+        level=(
+            logging.DEBUG
+            if config.debug
+            else getattr(logging, config.log_level.upper(), logging.INFO)
+        ),
+        filename=None if config.debug else config.log_file,
+        verbosity_level=config.verbosity,
+        sample=config.log_row_sample,
+    )
     logging.info("Logging initialized")
 
     # Filter customers based on args
@@ -64,15 +57,11 @@ def main():
         enabled_types.append("local")
 
     if enabled_types:
-        config.customers = [
-            c for c in config.customers if c["input_type"] in enabled_types
-        ]
+        config.customers = [c for c in config.customers if c["input_type"] in enabled_types]
 
-    print(f"Starting daemon with customers:{config.customers}")
-    logging.info(
-        f"Starting daemon with customers: {[c['name'] for c in config.customers]}"
-    )
-    run_daemon(config)
+    logs.echo(f"Starting daemon with customers: {[c['name'] for c in config.customers]}")
+    logging.info(f"Starting daemon with customers: {[c['name'] for c in config.customers]}")
+    run_daemon(config, force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+"""Compiled field mappings used to turn source rows into articles.
+
+Customer field mappings in `Config` are plain strings: a 1-based column
+number, a fixed value, or empty when the field is not mapped. Interpreting
+those strings for every row used to dominate parse time on large feeds, so
+they are compiled once per feed into a `MappingPlan` and each row is then
+materialized against the plan. Rows are materialized as compact
+`articles.Article` records rather than nested dicts.
+"""
+
+from articles import MISSING, SCHEMA, Article, ArticleData
+
+# (customer config key, article data key) in the order fields are emitted
+DATA_FIELDS = (
+    ("store_code", "STORE_CODE"),
+    ("item_id", "ITEM_ID"),
+    ("item_name", "ITEM_NAME"),
+    ("item_description", "ITEM_DESCRIPTION"),
+    ("barcode", "BARCODE"),
+    ("sku", "SKU"),
+    ("list_price", "LIST_PRICE"),
+    ("sale_price", "SALE_PRICE"),
+    ("clearance_price", "CLEARANCE_PRICE"),
+    ("unit_price", "UNIT_PRICE"),
+    ("pack_quantity", "PACK_QUANTITY"),
+    ("weight", "WEIGHT"),
+    ("weight_unit", "WEIGHT_UNIT"),
+    ("department", "DEPARTMENT"),
+    ("aisle_location", "AISLE_LOCATION"),
+    ("country_of_origin", "COUNTRY_OF_ORIGIN"),
+    ("brand", "BRAND"),
+    ("model", "MODEL"),
+    ("color", "COLOR"),
+    ("inventory", "INVENTORY"),
+    ("start_date", "START_DATE"),
+    ("end_date", "END_DATE"),
+    ("language", "LANGUAGE"),
+    ("category_01", "CATEGORY_01"),
+    ("category_02", "CATEGORY_02"),
+    ("category_03", "CATEGORY_03"),
+    ("misc_01", "MISC_01"),
+    ("misc_02", "MISC_02"),
+    ("misc_03", "MISC_03"),
+    ("display_page_1", "DISPLAY_PAGE_1"),
+    ("display_page_2", "DISPLAY_PAGE_2"),
+    ("display_page_3", "DISPLAY_PAGE_3"),
+    ("display_page_4", "DISPLAY_PAGE_4"),
+    ("display_page_5", "DISPLAY_PAGE_5"),
+    ("display_page_6", "DISPLAY_PAGE_6"),
+    ("display_page_7", "DISPLAY_PAGE_7"),
+    ("nfc_data", "NFC_DATA"),
+)
+
+# Data fields are laid out, and serialized, in DATA_FIELDS order
+for _, _key in DATA_FIELDS:
+    SCHEMA.index(_key)
+del _key
+
+CSV_EAN_KEYS = ("ean1", "ean2", "ean3", "ean4", "ean5")
+DUTCHIE_EAN_KEYS = ("ean1", "ean2", "ean3")
+
+
+class MappingPlan:
+    """A customer's field mapping compiled for a single source type.
+
+    Every mapped field is stored as `(output_key, source, constant)`: when
+    `source` is None the constant is emitted as is, otherwise `source` is
+    the column index (CSV rows) or key (dict records) to read. Unmapped
+    fields are dropped at compile time so rows never look at them. When
+    `convert` is set, values read from dict records are passed through it.
+    """
+
+    def __init__(
+        self,
+        article_fields,
+        ean_fields,
+        data_fields,
+        width=0,
+        required_ids=False,
+        nest_eans=False,
+        convert=None,
+    ):
+        self.article_fields = article_fields
+        self.ean_fields = ean_fields
+        self.data_fields = data_fields
+        self.width = width
+        self.required_ids = required_ids
+        self.nest_eans = nest_eans
+        self.convert = convert
+        self.strip_barcode = any(key == "BARCODE" for key, _, _ in data_fields)
+        # Schema position of every data field, and the record length they need
+        self.data_slots = [(SCHEMA.index(key), source, const) for key, source, const in data_fields]
+        self.data_width = max((i for i, _, _ in self.data_slots), default=-1) + 1
+        self.barcode_slot = SCHEMA.index("BARCODE")
+        # EANs made only of constants are identical for every row
+        self.constant_eans = None
+        if all(source is None for _, source, _ in ean_fields):
+            self.constant_eans = [const for _, _, const in ean_fields if const]
+
+    def _getter(self, row):
+        if isinstance(row, dict):
+            if self.convert is not None:
+                convert = self.convert
+                return lambda key: convert(row.get(key))
+            return row.get
+        if len(row) < self.width:
+            row = list(row) + [None] * (self.width - len(row))
+        return row.__getitem__
+
+    def materialize(self, row):
+        """Build an `Article` for one row (a list of cells or a dict)."""
+        get = self._getter(row)
+
+        article = Article()
+        for key, source, const in self.article_fields:
+            value = const if source is None else get(source)
+            if self.required_ids:
+                setattr(article, key, str(value) if value else "")
+            elif value is not None:
+                setattr(article, key, value)
+
+        if self.constant_eans is not None:
+            eans = self.constant_eans
+        else:
+            eans = []
+            for _, source, const in self.ean_fields:
+                value = const if source is None else get(source)
+                if value:
+                    eans.append(value)
+        if eans:
+            article.eans = [list(eans)] if self.nest_eans else list(eans)
+
+        values = [MISSING] * self.data_width
+        for i, source, const in self.data_slots:
+            value = const if source is None else get(source)
+            if value is not None:
+                values[i] = value
+        if self.strip_barcode:
+            barcode = values[self.barcode_slot]
+            has_barcode = barcode is not MISSING and barcode
+            values[self.barcode_slot] = barcode.lstrip("0") if has_barcode else MISSING
+        article.data = ArticleData.from_values(values)
+        return article
+
+
+def _compile_column(out_key, mapping):
+    """Compile a CSV mapping string into a field spec, or None if unmapped."""
+    if not mapping:
+        return None
+    if not mapping.isnumeric():
+        return (out_key, None, mapping)
+    return (out_key, int(mapping) - 1, None)
+
+
+def compile_csv_mapping(customer):
+    """Compile a customer's mapping for positional (CSV) rows."""
+    article_fields = []
+    for out_key, config_key in (
+        ("articleId", "article_id"),
+        ("articleName", "article_name"),
+        ("nfcUrl", "nfc_url"),
+    ):
+        spec = _compile_column(out_key, customer[config_key])
+        if spec:
+            article_fields.append(spec)
+
+    ean_fields = []
+    for config_key in CSV_EAN_KEYS:
+        spec = _compile_column(config_key, customer.get(config_key, ""))
+        if spec:
+            ean_fields.append(spec)
+
+    data_fields = []
+    for config_key, out_key in DATA_FIELDS:
+        if config_key == "store_code":
+            # Store code is always a fixed value, never a column reference
+            if customer[config_key] is not None:
+                data_fields.append((out_key, None, customer[config_key]))
+            continue
+        spec = _compile_column(out_key, customer[config_key])
+        if spec:
+            data_fields.append(spec)
+
+    columns = [
+        source for _, source, _ in article_fields + ean_fields + data_fields if source is not None
+    ]
+    width = max(columns) + 1 if columns else 0
+    return MappingPlan(article_fields, ean_fields, data_fields, width=width)
+
+
+def sql_cell(value):
+    """Render a SQL value the way it read after a round trip through CSV."""
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        value = str(value)
+    return value.rstrip()
+
+
+def compile_sql_mapping(customer, columns):
+    """Compile a customer's mapping for SQL result rows read as dicts.
+
+    Column numbers refer to the query's select list, as they did when
+    results were exported to CSV, and are resolved to column names once.
+    Numbers past the end of the select list are dropped.
+    """
+    plan = compile_csv_mapping(customer)
+
+    def by_name(specs):
+        resolved = []
+        for out_key, source, const in specs:
+            if source is None:
+                resolved.append((out_key, None, const))
+            elif source < len(columns):
+                resolved.append((out_key, columns[source], None))
+        return resolved
+
+    return MappingPlan(
+        by_name(plan.article_fields),
+        by_name(plan.ean_fields),
+        by_name(plan.data_fields),
+        convert=sql_cell,
+    )
+
+
+def compile_dutchie_mapping(customer):
+    """Compile a customer's mapping for Dutchie product records."""
+    article_fields = [
+        ("articleId", customer.get("article_id") or "productId", None),
+        ("articleName", customer.get("article_name") or "productName", None),
+    ]
+    if nfc := customer.get("nfc_url"):
+        article_fields.append(("nfcUrl", None, nfc))
+
+    ean_fields = [(key, None, customer.get(key)) for key in DUTCHIE_EAN_KEYS if customer.get(key)]
+
+    data_fields = []
+    for config_key, out_key in DATA_FIELDS:
+        mapping = customer.get(config_key)
+        if config_key == "store_code":
+            if mapping is not None:
+                data_fields.append((out_key, None, mapping))
+        elif mapping:
+            data_fields.append((out_key, mapping, None))
+
+    return MappingPlan(
+        article_fields,
+        ean_fields,
+        data_fields,
+        required_ids=True,
+        nest_eans=True,
+    )
@@ -0,0 +1,290 @@
+"""Per-customer, per-stage metrics for the ingest pipeline.
+
+Counters and histograms are kept in memory, labelled by customer and by
+stage details (source type, plugin, HTTP status). They can be scraped in
+the Prometheus text format from a small local HTTP endpoint
+(`start_http_server`) and written to a JSON file (`dump_json`).
+
+The pipeline records:
+
+- fetch: bytes (or query rows) read and duration per source type
+- parse: rows turned into articles
+- transform: time spent in each plugin
+- push: chunks, articles and bytes pushed, chunk duration, HTTP statuses
+- cycle: duration and outcome of each customer run
+"""
+
+import bisect
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def _items(self):
+        with self._lock:
+            return [(key, self._copy(value)) for key, value in sorted(self._values.items())]
+
+    def _copy(self, value):
+        return value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        for key, value in self._items():
+            yield f"{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}"
+
+    def snapshot(self):
+        return [
+            {"labels": dict(zip(self.labelnames, key)), "value": value}
+            for key, value in self._items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def render(self):
+        for key, (counts, total, count) in self._items():
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(pairs + [("le", _format_value(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(pairs)} {count}"
+
+    def snapshot(self):
+        result = []
+        for key, (counts, total, count) in self._items():
+            buckets = {}
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                buckets[_format_value(bound)] = cumulative
+            result.append(
+                {
+                    "labels": dict(zip(self.labelnames, key)),
+                    "count": count,
+                    "sum": total,
+                    "buckets": buckets,
+                }
+            )
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        return {
+            name: {"type": metric.kind, "help": metric.documentation, "values": metric.snapshot()}
+            for name, metric in self._metrics.items()
+        }
+
+    def reset(self):
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+_dump_lock = threading.Lock()
+
+FETCH_BYTES = REGISTRY.counter(
+    "ubi_ingest_fetch_bytes_total", "Bytes read from customer sources.", ("customer", "source")
+)
+FETCH_SECONDS = REGISTRY.histogram(
+    "ubi_ingest_fetch_duration_seconds", "Time spent fetching a source.", ("customer", "source")
+)
+FETCH_ROWS = REGISTRY.counter(
+    "ubi_ingest_fetch_rows_total", "Rows read from query sources.", ("customer", "source")
+)
+ROWS_PARSED = REGISTRY.counter(
+    "ubi_ingest_rows_parsed_total", "Source rows turned into articles.", ("customer",)
+)
+PLUGIN_SECONDS = REGISTRY.histogram(
+    "ubi_ingest_plugin_duration_seconds",
+    "Time spent in a plugin per run.",
+    ("customer", "plugin"),
+)
+CHUNKS_PUSHED = REGISTRY.counter(
+    "ubi_ingest_chunks_pushed_total", "Article chunks accepted by the API.", ("customer",)
+)
+ARTICLES_PUSHED = REGISTRY.counter(
+    "ubi_ingest_articles_pushed_total", "Articles accepted by the API.", ("customer",)
+)
+PUSH_BYTES = REGISTRY.counter(
+    "ubi_ingest_push_bytes_total", "Request body bytes sent to the API.", ("customer",)
+)
+PUSH_SECONDS = REGISTRY.histogram(
+    "ubi_ingest_push_chunk_duration_seconds", "Time to push one chunk.", ("customer",)
+)
+HTTP_RESPONSES = REGISTRY.counter(
+    "ubi_ingest_http_responses_total",
+    "Article API responses by status code.",
+    ("customer", "status"),
+)
+CYCLE_SECONDS = REGISTRY.histogram(
+    "ubi_ingest_cycle_duration_seconds",
+    "Duration of a customer run by outcome.",
+    ("customer", "status"),
+)
+CYCLES = REGISTRY.counter(
+    "ubi_ingest_cycles_total", "Customer runs by outcome.", ("customer", "status")
+)
+
+
+def render():
+    return REGISTRY.render()
+
+
+def reset():
+    REGISTRY.reset()
+
+
+def dump_json(path):
+    """Write a snapshot of every metric to `path`, replacing it atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    payload = {"timestamp": time.time(), "metrics": REGISTRY.snapshot()}
+    # Runs finishing at the same time share the temporary file
+    with _dump_lock:
+        with open(path + ".part", "w") as f:
+            json.dump(payload, f, indent=2)
+        os.replace(path + ".part", path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics on a background thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    logging.info(f"Serving metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,34 @@
+import logging
+
+# INPUT_PARSER name -> parser class or instance
+_registry = {}
+
+
+class BaseParser:
+    """Base class for in-process input parsers.
+
+    Subclasses set `name` to the `INPUT_PARSER` value they handle and
+    implement `parse`, yielding one row (a list of cell strings, as
+    `csv.reader` would) per article. Column numbers in the customer's field
+    mappings refer to positions in these rows, and a header row is skipped
+    when `HEADER_ROW` is `YES`.
+    """
+
+    name = None
+
+    def parse(self, file_path, customer):
+        raise NotImplementedError
+
+
+def register(parser_class):
+    _registry[parser_class.name] = parser_class
+    name = getattr(parser_class, "__name__", type(parser_class).__name__)
+    logging.info(f"Registered input parser: {name} ({parser_class.name})")
+
+
+def get_parser(name):
+    """Return a parser instance for an INPUT_PARSER value, or None."""
+    parser = _registry.get(name)
+    if parser is None:
+        return None
+    return parser() if isinstance(parser, type) else parser
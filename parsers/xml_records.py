@@ -0,0 +1,45 @@
+import logging
+import xml.etree.ElementTree as ET
+
+from parsers.base import BaseParser, register
+
+
+class XmlRecordsParser(BaseParser):
+    """Reads one row per record element of an XML file.
+
+    Records are the elements named by the customer's `XML_RECORD_TAG`, or
+    the children of the root element when it is not set. A record's cells
+    are the texts of its child elements, in document order. The file is
+    read incrementally and finished records are discarded, so memory does
+    not grow with the file.
+    """
+
+    name = "xml"
+
+    def parse(self, file_path, customer):
+        record_tag = customer.get("xml_record_tag")
+        # Open elements, root first, and how many of them are records
+        parents = []
+        open_records = 0
+        count = 0
+        for event, elem in ET.iterparse(file_path, events=("start", "end")):
+            if event == "end":
+                parents.pop()
+            is_record = elem.tag == record_tag if record_tag else len(parents) == 1
+            if event == "start":
+                parents.append(elem)
+                open_records += is_record
+                continue
+            if is_record:
+                yield [(child.text or "").strip() for child in elem]
+                count += 1
+                open_records -= 1
+                elem.clear()
+            # Detach finished elements outside records (clearing alone leaves
+            # the empty element on its parent, so the tree keeps growing)
+            if parents and not open_records:
+                parents[-1].remove(elem)
+        logging.info(f"Read {count} XML records from {file_path}")
+
+
+register(XmlRecordsParser)
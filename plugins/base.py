@@ -1,12 +1,60 @@
 import logging
 
 _registry = []
+# customer name -> list of plugin instances that apply to it
+_chains = {}
+
+
+class BasePlugin:
+    """Base class for article plugins.
+
+    Subclasses override `applies_to` to select customers and
+    `transform_articles` to modify the parsed article list. `prefetch` is
+    called before the customer's source is fetched, so a plugin can start
+    slow requests of its own in the background.
+
+    Plugins that work one article at a time can instead define
+    `transform_article(customer, article, context)`, returning the article.
+    The daemon then runs consecutive such plugins in a single pass over
+    the articles, without materializing streamed feeds. `context` is what
+    `prepare` returned for the current run.
+
+    For customers in columnar mode, `transform_frame(customer, frame)` can
+    transform a whole pandas DataFrame at once (see columnar.py).
+    """
+
+    def applies_to(self, customer):
+        return False
+
+    def prefetch(self, customer):
+        pass
+
+    def prepare(self, customer, products=None):
+        return None
+
+    def transform_articles(self, customer, articles):
+        return articles
 
 
 def register(plugin_class):
     _registry.append(plugin_class)
-    logging.info(f"Registered plugin: {plugin_class.__name__}")
+    _chains.clear()
+    name = getattr(plugin_class, "__name__", type(plugin_class).__name__)
+    logging.info(f"Registered plugin: {name}")
 
 
 def get_plugins_for_customer(customer):
-    return [p() for p in _registry if p.applies_to(customer)]
+    """Return the plugins that apply to a customer, resolved once per customer."""
+    name = customer.get("name")
+    chain = _chains.get(name)
+    if chain is None:
+        # Plugins may be registered either as classes or as ready instances
+        plugins = [p() if isinstance(p, type) else p for p in _registry]
+        chain = [p for p in plugins if p.applies_to(customer)]
+        _chains[name] = chain
+    return chain
+
+
+def reset_chains():
+    """Forget resolved plugin chains, e.g. after the configuration is reloaded."""
+    _chains.clear()
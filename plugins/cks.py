@@ -1,21 +1,42 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from encoding import iter_json_array
 from plugins.base import register
 
+# Size of the pieces the inventory response is read in
+READ_SIZE = 64 * 1024
+# Seconds an inventory map is used without refetching it
+DEFAULT_INVENTORY_TTL = 30
+
+# location key -> (inventory map, monotonic time it was fetched)
+_inventory_cache = {}
+# location key -> Future of the fetch in flight
+_inventory_fetches = {}
+_inventory_lock = threading.RLock()
+_executor = None
+
 
 def fetch_dutchie_inventory(location_key):
+    """Yield inventory items as the response streams in."""
     url = "https://api.pos.dutchie.com/reporting/inventory"
     logging.info("Fetching inventory from Dutchie POS reporting API")
-    resp = requests.get(
+    with requests.get(
         url,
         auth=(location_key, ""),
-        headers={"Accept": "application/json"},
+        headers={"Accept": "application/json", "Accept-Encoding": "gzip"},
         timeout=120,
-    )
-    resp.raise_for_status()
-    items = resp.json()
-    logging.info(f"Fetched {len(items)} inventory items from Dutchie POS")
-    return items
+        stream=True,
+    ) as resp:
+        resp.raise_for_status()
+        count = 0
+        for item in iter_json_array(resp.iter_content(READ_SIZE)):
+            count += 1
+            yield item
+    logging.info(f"Fetched {count} inventory items from Dutchie POS")
 
 
 def build_inventory_map(inventory_items):
@@ -28,75 +49,155 @@ def build_inventory_map(inventory_items):
     return inventory
 
 
+def _load_inventory(location_key):
+    inventory_map = build_inventory_map(fetch_dutchie_inventory(location_key))
+    with _inventory_lock:
+        _inventory_cache[location_key] = (inventory_map, time.monotonic())
+    return inventory_map
+
+
+def _start_fetch(location_key):
+    """Return the in-flight inventory fetch for a location, starting one if needed."""
+    global _executor
+    with _inventory_lock:
+        future = _inventory_fetches.get(location_key)
+        if future is None:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cks-inventory")
+            future = _executor.submit(_load_inventory, location_key)
+            _inventory_fetches[location_key] = future
+
+            def forget(done):
+                with _inventory_lock:
+                    if _inventory_fetches.get(location_key) is done:
+                        del _inventory_fetches[location_key]
+
+            future.add_done_callback(forget)
+        return future
+
+
+def _cache_age(location_key):
+    cached = _inventory_cache.get(location_key)
+    if cached is None:
+        return None, None
+    return cached[0], time.monotonic() - cached[1]
+
+
+def prefetch_inventory(location_key, ttl=DEFAULT_INVENTORY_TTL):
+    """Start fetching a location's inventory unless the cached map is fresh."""
+    with _inventory_lock:
+        _, age = _cache_age(location_key)
+        if age is None or age >= ttl:
+            _start_fetch(location_key)
+
+
+def get_inventory_map(location_key, ttl=DEFAULT_INVENTORY_TTL, stale_ttl=0):
+    """Return a location's inventory map, fetching it only when needed.
+
+    A map younger than `ttl` seconds is returned as is. Up to `stale_ttl`
+    seconds past that, the cached map is still returned while a refresh
+    runs in the background. Otherwise this waits for a fetch, sharing one
+    already in flight (e.g. started by `prefetch_inventory`).
+    """
+    with _inventory_lock:
+        inventory_map, age = _cache_age(location_key)
+        if age is not None and age < ttl:
+            return inventory_map
+        future = _start_fetch(location_key)
+        if age is not None and age < ttl + stale_ttl:
+            logging.debug(f"CksPlugin: using inventory fetched {age:.0f}s ago while refreshing")
+            return inventory_map
+    return future.result()
+
+
+def reset_inventory_cache():
+    with _inventory_lock:
+        _inventory_cache.clear()
+        _inventory_fetches.clear()
+
+
 class CksPlugin:
     @staticmethod
     def applies_to(customer):
         return "cks" in customer["name"].lower()
 
-    def transform_articles(self, customer, articles, products=None):
+    def prefetch(self, customer):
+        location_key = customer["creds"]["location_key"]
+        prefetch_inventory(location_key, customer.get("inventory_ttl", DEFAULT_INVENTORY_TTL))
+
+    def prepare(self, customer, products=None):
         product_map = {p["productId"]: p for p in (products or [])}
 
         inventory_map = {}
         try:
-            location_key = customer["creds"]["location_key"]
-            inventory_items = fetch_dutchie_inventory(location_key)
-            inventory_map = build_inventory_map(inventory_items)
+            inventory_map = get_inventory_map(
+                customer["creds"]["location_key"],
+                customer.get("inventory_ttl", DEFAULT_INVENTORY_TTL),
+                customer.get("inventory_stale_ttl", 0),
+            )
         except Exception as e:
             logging.error(f"CksPlugin: failed to fetch inventory: {e}")
+        return product_map, inventory_map
 
+    def transform_articles(self, customer, articles, products=None):
+        context = self.prepare(customer, products=products)
         for article in articles:
-            raw = product_map.get(int(article["articleId"]))
-            if not raw:
-                continue
-
-            data = article["data"]
-
-            for field in ("LIST_PRICE", "SALE_PRICE", "CLEARANCE_PRICE"):
-                val = data.get(field)
-                if val is not None:
-                    try:
-                        data[field] = f"{float(val):.2f}"
-                    except (ValueError, TypeError):
-                        pass
-
-            weight = data.get("WEIGHT")
-            unit = data.get("WEIGHT_UNIT")
-            if weight and unit:
-                data["WEIGHT"] = f"{weight}{unit}"
-            data.pop("WEIGHT_UNIT", None)
-
-            category = raw.get("category")
-            if category:
-                data["CATEGORY"] = category
-
-            strain_type = raw.get("strainType")
-            if strain_type:
-                data["SUBCATEGORY"] = strain_type
-
-            thc = raw.get("thcContent")
-            thc_unit = raw.get("thcContentUnit")
-            if thc is not None and thc_unit:
-                data["THC"] = f"{thc}{thc_unit}"
-            elif thc is not None:
-                data["THC"] = thc
-
-            cbd = raw.get("cbdContent")
-            cbd_unit = raw.get("cbdContentUnit")
-            if cbd is not None and cbd_unit:
-                data["CBD"] = f"{cbd}{cbd_unit}"
-            elif cbd is not None:
-                data["CBD"] = cbd
-
-            strain = raw.get("strain")
-            if strain:
-                data["PRODUCT_NAME"] = strain
-
-            pid = str(raw.get("productId", ""))
-            if pid in inventory_map:
-                data["INVENTORY"] = inventory_map[pid]
-
+            self.transform_article(customer, article, context)
         logging.info(f"CksPlugin: transformed {len(articles)} articles")
         return articles
 
+    def transform_article(self, customer, article, context):
+        product_map, inventory_map = context
+        raw = product_map.get(int(article["articleId"]))
+        if not raw:
+            return article
+
+        data = article["data"]
+
+        for field in ("LIST_PRICE", "SALE_PRICE", "CLEARANCE_PRICE"):
+            val = data.get(field)
+            if val is not None:
+                try:
+                    data[field] = f"{float(val):.2f}"
+                except (ValueError, TypeError):
+                    pass
+
+        weight = data.get("WEIGHT")
+        unit = data.get("WEIGHT_UNIT")
+        if weight and unit:
+            data["WEIGHT"] = f"{weight}{unit}"
+        data.pop("WEIGHT_UNIT", None)
+
+        category = raw.get("category")
+        if category:
+            data["CATEGORY"] = category
+
+        strain_type = raw.get("strainType")
+        if strain_type:
+            data["SUBCATEGORY"] = strain_type
+
+        thc = raw.get("thcContent")
+        thc_unit = raw.get("thcContentUnit")
+        if thc is not None and thc_unit:
+            data["THC"] = f"{thc}{thc_unit}"
+        elif thc is not None:
+            data["THC"] = thc
+
+        cbd = raw.get("cbdContent")
+        cbd_unit = raw.get("cbdContentUnit")
+        if cbd is not None and cbd_unit:
+            data["CBD"] = f"{cbd}{cbd_unit}"
+        elif cbd is not None:
+            data["CBD"] = cbd
+
+        strain = raw.get("strain")
+        if strain:
+            data["PRODUCT_NAME"] = strain
+
+        pid = str(raw.get("productId", ""))
+        if pid in inventory_map:
+            data["INVENTORY"] = inventory_map[pid]
+        return article
+
 
 register(CksPlugin)
@@ -10,44 +10,76 @@ class NorwichPlugin(BasePlugin):
     This plugin demonstrates per-customer/custom-article logic by adjusting
     the article template and adding a marker field.
     """
+
     logging.debug("Initializing NorwichPlugin")
+
     def applies_to(self, customer):
         return customer.get("name") == "norwich"
 
+    def prepare(self, customer, products=None):
+        return {
+            "today": datetime.datetime.now().date(),
+            "template_field": customer.get("template_field", "MISC_03"),
+        }
+
     def transform_articles(self, customer, articles):
-        logging.debug(f"NorwichPlugin transforming articles for customer {customer.get('name')}")
+        logging.debug("NorwichPlugin transforming articles for customer %s", customer.get("name"))
+        context = self.prepare(customer)
         for a in articles:
-            # Example: set a custom field for tracking
-            a.setdefault("data", {})
-            #a["data"]["_plugin_applied"] = "Norwich_plugin"
-            # Ensure SALE_PRICE is stored with two decimal places when present
-            data = a.get("data", {})
-            sale_val = data.get("SALE_PRICE")
-            if sale_val not in (None, ""):
-                try:
-                    dec = Decimal(str(sale_val).strip())
-                    dec = dec.quantize(Decimal('0.00'), rounding=ROUND_HALF_UP)
-                    data["SALE_PRICE"] = str(dec)
-                except (InvalidOperation, ValueError, TypeError) as e:
-                    logging.warning(f"Failed to format SALE_PRICE for article {a.get('articleId')}: {e}")
-
-            # Example: modify template decision based on SALE_PRICE and date range
-            if data.get("SALE_PRICE"):
-                start_date_str = data.get("START_DATE")
-                end_date_str = data.get("END_DATE")
-
-                if start_date_str and end_date_str:
-                    try:
-                        # Parse dates in MM/DD/YYYY format
-                        start_date = datetime.datetime.strptime(start_date_str, "%m/%d/%Y").date()
-                        end_date = datetime.datetime.strptime(end_date_str, "%m/%d/%Y").date()
-                        today = datetime.datetime.now().date()
-
-                        if start_date <= today <= end_date:
-                            a["data"][customer.get("template_field", "MISC_03")] = "sale"
-                    except (ValueError, TypeError) as e:
-                        logging.warning(f"Failed to parse dates for article {a.get('articleId')}: {e}")
+            self.transform_article(customer, a, context)
         return articles
 
+    def transform_frame(self, customer, frame):
+        import columnar
+
+        if "SALE_PRICE" not in frame:
+            return frame
+        sale, invalid = columnar.quantize_2dp(frame["SALE_PRICE"])
+        columnar.warn_rows("Failed to format SALE_PRICE", frame, invalid)
+        frame["SALE_PRICE"] = sale
+
+        if "START_DATE" in frame and "END_DATE" in frame:
+            on_sale = columnar.truthy(sale)
+            inside, invalid = columnar.in_date_window(
+                frame["START_DATE"], frame["END_DATE"], datetime.datetime.now().date()
+            )
+            columnar.warn_rows("Failed to parse dates", frame, on_sale & invalid)
+            frame.loc[on_sale & inside, customer.get("template_field", "MISC_03")] = "sale"
+        return frame
+
+    def transform_article(self, customer, a, context):
+        # Example: set a custom field for tracking
+        a.setdefault("data", {})
+        # a["data"]["_plugin_applied"] = "Norwich_plugin"
+        # Ensure SALE_PRICE is stored with two decimal places when present
+        data = a.get("data", {})
+        sale_val = data.get("SALE_PRICE")
+        if sale_val not in (None, ""):
+            try:
+                dec = Decimal(str(sale_val).strip())
+                dec = dec.quantize(Decimal("0.00"), rounding=ROUND_HALF_UP)
+                data["SALE_PRICE"] = str(dec)
+            except (InvalidOperation, ValueError, TypeError) as e:
+                logging.warning(
+                    f"Failed to format SALE_PRICE for article {a.get('articleId')}: {e}"
+                )
+
+        # Example: modify template decision based on SALE_PRICE and date range
+        if data.get("SALE_PRICE"):
+            start_date_str = data.get("START_DATE")
+            end_date_str = data.get("END_DATE")
+
+            if start_date_str and end_date_str:
+                try:
+                    # Parse dates in MM/DD/YYYY format
+                    start_date = datetime.datetime.strptime(start_date_str, "%m/%d/%Y").date()
+                    end_date = datetime.datetime.strptime(end_date_str, "%m/%d/%Y").date()
+
+                    if start_date <= context["today"] <= end_date:
+                        a["data"][context["template_field"]] = "sale"
+                except (ValueError, TypeError) as e:
+                    logging.warning(f"Failed to parse dates for article {a.get('articleId')}: {e}")
+        return a
+
 
 register(NorwichPlugin())
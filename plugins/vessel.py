@@ -8,23 +8,50 @@ class VesselPlugin:
     def applies_to(customer):
         return customer.get("name", "").lower() == "vessel"
 
+    def prepare(self, customer, products=None):
+        return customer.get("template_field", "MISC_03")
+
     def transform_articles(self, customer, articles):
-        template_field = customer.get("template_field", "MISC_03")
+        template_field = self.prepare(customer)
         for article in articles:
-            data = article.get("data", {})
-            sale_price = data.get("SALE_PRICE")
-            list_price = data.get("LIST_PRICE")
-            if sale_price:
-                data[template_field] = "sale"
-                if list_price:
-                    try:
-                        savings = Decimal(str(list_price)) - Decimal(str(sale_price))
-                        data["MISC_02"] = f"SAVE ${savings}"
-                    except (DecimalException, ValueError):
-                        logging.warning(f"Could not compute savings for LIST_PRICE={list_price}, SALE_PRICE={sale_price}")
-            else:
-                data[template_field] = "default"
+            self.transform_article(customer, article, template_field)
         return articles
 
+    def transform_frame(self, customer, frame):
+        import columnar
+
+        template_field = customer.get("template_field", "MISC_03")
+        if "SALE_PRICE" not in frame:
+            frame[template_field] = "default"
+            return frame
+        on_sale = columnar.truthy(frame["SALE_PRICE"])
+        frame[template_field] = "default"
+        frame.loc[on_sale, template_field] = "sale"
+        if "LIST_PRICE" in frame:
+            savings, invalid = columnar.decimal_difference(frame["LIST_PRICE"], frame["SALE_PRICE"])
+            columnar.warn_rows("Could not compute savings", frame, invalid)
+            computed = savings.notna()
+            frame.loc[computed, "MISC_02"] = "SAVE $" + savings[computed]
+        return frame
+
+    def transform_article(self, customer, article, template_field):
+        data = article.get("data", {})
+        sale_price = data.get("SALE_PRICE")
+        list_price = data.get("LIST_PRICE")
+        if sale_price:
+            data[template_field] = "sale"
+            if list_price:
+                try:
+                    savings = Decimal(str(list_price)) - Decimal(str(sale_price))
+                    data["MISC_02"] = f"SAVE ${savings}"
+                except (DecimalException, ValueError):
+                    logging.warning(
+                        f"Could not compute savings for LIST_PRICE={list_price}, "
+                        f"SALE_PRICE={sale_price}"
+                    )
+        else:
+            data[template_field] = "default"
+        return article
+
 
 register(VesselPlugin)
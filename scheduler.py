@@ -0,0 +1,232 @@
+"""Per-customer run scheduling.
+
+Each customer runs on its own interval or cron expression, with optional
+random jitter. Run times for intervals are kept on a fixed grid on the
+monotonic clock (start + n * interval), so slow runs and wall clock changes
+do not make the cadence drift. Cron expressions are evaluated in local time.
+
+A customer never runs twice at once: when its next run is due while the
+previous one is still in flight, the run is skipped, or with the
+"coalesce" overlap policy a single run is queued for when it finishes.
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+DEFAULT_INTERVAL = 60
+# Longest the loop sleeps without rechecking, e.g. after a suspend
+MAX_SLEEP = 60
+OVERLAP_POLICIES = ("skip", "coalesce")
+
+
+class CronExpression:
+    """A five-field cron expression: minute hour day-of-month month day-of-week.
+
+    Fields accept `*`, numbers, ranges (`1-5`), steps (`*/15`, `8-18/2`) and
+    comma-separated lists. Day of week runs from 0 (Sunday) to 6; 7 is also
+    Sunday. As in cron, when both day fields are restricted a day matching
+    either one matches.
+    """
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes = self._parse(fields[0], 0, 59)
+        self.hours = self._parse(fields[1], 0, 23)
+        self.days = self._parse(fields[2], 1, 31)
+        self.months = self._parse(fields[3], 1, 12)
+        self.weekdays = {day % 7 for day in self._parse(fields[4], 0, 7)}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field, low, high):
+        values = set()
+        for part in field.split(","):
+            base, _, step = part.partition("/")
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start, end = (int(v) for v in base.split("-", 1))
+            else:
+                start = end = int(base)
+                if step:
+                    end = high
+            if not (low <= start <= end <= high):
+                raise ValueError(f"Cron field {field!r} out of range {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return sorted(values)
+
+    def _day_matches(self, day):
+        in_month = day.day in self.days
+        # Python weekdays start on Monday, cron's on Sunday
+        in_week = (day.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_month and in_week
+        return in_month or in_week
+
+    def next_after(self, after):
+        """Return the first matching minute strictly after `after`."""
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(366 * 5):
+            if day.month in self.months and self._day_matches(day):
+                for hour in self.hours:
+                    if day == start.date() and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        if day == start.date() and hour == start.hour and minute < start.minute:
+                            continue
+                        return datetime(day.year, day.month, day.day, hour, minute)
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+class CustomerSchedule:
+    """When one customer runs, on the monotonic clock."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, cron=None, jitter=0, overlap="skip"):
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Unknown overlap policy {overlap!r}")
+        if cron is None and interval <= 0:
+            raise ValueError("Interval must be positive")
+        self.interval = interval
+        self.cron = CronExpression(cron) if cron else None
+        self.jitter = jitter
+        self.overlap = overlap
+        self._slot = None
+
+    def first_due(self, now, wall_now=None, immediate=False):
+        """Monotonic time of the first run. Intervals start right away."""
+        if self.cron is None:
+            self._slot = now
+        else:
+            self._slot = self._cron_slot(now, wall_now)
+        if immediate:
+            return now
+        return self._slot + self._jitter()
+
+    def next_due(self, now, wall_now=None):
+        """Monotonic time of the run after the current slot.
+
+        Slots already in the past (a run or the host stalled) are dropped
+        rather than run back to back.
+        """
+        if self.cron is not None:
+            self._slot = self._cron_slot(now, wall_now)
+            return self._slot + self._jitter()
+        slot = self._slot + self.interval
+        if slot <= now:
+            missed = int((now - slot) // self.interval) + 1
+            slot += missed * self.interval
+            logging.debug(f"Dropped {missed} missed interval runs")
+        self._slot = slot
+        return slot + self._jitter()
+
+    def _cron_slot(self, now, wall_now=None):
+        wall_now = wall_now or datetime.now()
+        return now + (self.cron.next_after(wall_now) - wall_now).total_seconds()
+
+    def _jitter(self):
+        return random.uniform(0, self.jitter) if self.jitter else 0.0
+
+
+class Scheduler:
+    """Runs `run(customer, force)` for each customer on its own schedule.
+
+    Runs execute on a pool of `max_workers` threads, which `submit` shares
+    with runs started outside the schedule; `run_forever` blocks the
+    calling thread until `stop` is called.
+    """
+
+    def __init__(self, run, max_workers=4, clock=time.monotonic):
+        self.run = run
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="customer"
+        )
+        self._queue = []
+        self._order = itertools.count()
+        self._customers = {}
+        self._running = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def add(self, customer, schedule, force=False):
+        """Schedule a customer; with `force` its first run is immediate and forced."""
+        name = customer["name"]
+        due = schedule.first_due(self.clock(), immediate=force)
+        with self._lock:
+            self._customers[name] = (customer, schedule)
+            heapq.heappush(self._queue, (due, next(self._order), name, force))
+        self._wake.set()
+
+    def submit(self, customer, force=False):
+        """Run a customer now, outside any schedule, on the same worker pool.
+
+        Returns a Future for the run, so callers that trigger runs
+        themselves (e.g. on file events) stay within `max_workers`.
+        """
+        return self._executor.submit(self.run, customer, force)
+
+    def run_due(self, now=None):
+        """Start every run that is due; return seconds until the next one."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                _, _, name, force = heapq.heappop(self._queue)
+                customer, schedule = self._customers[name]
+                self._dispatch(name, customer, schedule, force)
+                due = schedule.next_due(now)
+                heapq.heappush(self._queue, (due, next(self._order), name, False))
+                logging.debug(f"Next run for {name} in {due - now:.1f}s")
+            if not self._queue:
+                return MAX_SLEEP
+            return min(max(self._queue[0][0] - now, 0), MAX_SLEEP)
+
+    def _dispatch(self, name, customer, schedule, force):
+        # Called with the lock held
+        if name in self._running:
+            if schedule.overlap == "coalesce":
+                logging.info(f"{name} is still running; its next run will follow it")
+                self._pending.add(name)
+            else:
+                logging.warning(f"{name} is still running; skipping this run")
+            return
+        self._running.add(name)
+        self._executor.submit(self._run_customer, name, customer, force)
+
+    def _run_customer(self, name, customer, force):
+        while True:
+            try:
+                self.run(customer, force)
+            except Exception as e:
+                logging.error(f"Unhandled error running {name}: {e}")
+            force = False
+            with self._lock:
+                if name not in self._pending:
+                    self._running.discard(name)
+                    return
+                self._pending.discard(name)
+
+    def run_forever(self):
+        while not self._stopped:
+            delay = self.run_due()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def stop(self, wait=True):
+        """Stop scheduling and, with `wait`, let runs in flight finish."""
+        self._stopped = True
+        self._wake.set()
+        self._executor.shutdown(wait=wait)
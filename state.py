@@ -0,0 +1,241 @@
+"""Persistent per-customer sync state kept in a local SQLite database.
+
+The daemon is otherwise stateless between cycles; this module remembers
+what was last pushed so unchanged work can be skipped.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from articles import Article, ArticleData
+
+DEFAULT_STATE_DB = os.path.join("tmp", "state.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS article_fingerprints (
+    customer TEXT NOT NULL,
+    article_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (customer, article_id)
+);
+CREATE TABLE IF NOT EXISTS full_syncs (
+    customer TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS source_watermarks (
+    customer TEXT PRIMARY KEY,
+    name TEXT,
+    mtime REAL,
+    size INTEGER,
+    content_hash TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS http_validators (
+    customer TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sql_watermarks (
+    customer TEXT PRIMARY KEY,
+    watermark TEXT,
+    probe TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+# SQLite limits the number of bound parameters per statement
+_MAX_PARAMS = 900
+
+
+def _fingerprint_default(value):
+    if isinstance(value, (Article, ArticleData)):
+        return value.to_dict()
+    return str(value)
+
+
+def article_fingerprint(article):
+    """Return a stable hash of an article's final JSON representation.
+
+    Article records hash the same as dicts with the same content.
+    """
+    payload = json.dumps(
+        article, sort_keys=True, separators=(",", ":"), default=_fingerprint_default
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def content_digest(data=None, path=None):
+    """Hash a fetched source, either an in-memory string or a file on disk."""
+    digest = hashlib.blake2b(digest_size=16)
+    if data is not None:
+        digest.update(data.encode("utf-8"))
+    else:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class RowDigest:
+    """Hash of query result rows, computed while the rows stream past."""
+
+    def __init__(self):
+        self._digest = hashlib.blake2b(digest_size=16)
+
+    def feed(self, rows):
+        """Yield `rows` unchanged, adding each one to the hash."""
+        for row in rows:
+            values = tuple(row.values()) if isinstance(row, dict) else tuple(row)
+            self._digest.update(repr(values).encode("utf-8"))
+            self._digest.update(b"\n")
+            yield row
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+class StateStore:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def get_fingerprints(self, customer, article_ids):
+        """Return {article_id: fingerprint} for the ids that have been pushed."""
+        found = {}
+        article_ids = list(article_ids)
+        with self._lock:
+            for i in range(0, len(article_ids), _MAX_PARAMS):
+                batch = article_ids[i : i + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    "SELECT article_id, fingerprint FROM article_fingerprints "
+                    f"WHERE customer = ? AND article_id IN ({placeholders})",
+                    [customer, *batch],
+                )
+                found.update(rows)
+        return found
+
+    def save_fingerprints(self, customer, fingerprints):
+        """Record (article_id, fingerprint) pairs after a successful push."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO article_fingerprints "
+                "(customer, article_id, fingerprint) VALUES (?, ?, ?)",
+                ((customer, aid, fp) for aid, fp in fingerprints),
+            )
+
+    def full_resync_due(self, customer, interval_hours):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at FROM full_syncs WHERE customer = ?", (customer,)
+            ).fetchone()
+        if row is None:
+            return True
+        return time.time() - row[0] >= interval_hours * 3600
+
+    def mark_full_sync(self, customer):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO full_syncs (customer, synced_at) VALUES (?, ?)",
+                (customer, time.time()),
+            )
+
+    def get_source_watermark(self, customer):
+        """Return the last processed source as a dict, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, mtime, size, content_hash FROM source_watermarks "
+                "WHERE customer = ?",
+                (customer,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("name", "mtime", "size", "content_hash"), row))
+
+    def save_source_watermark(self, customer, name, mtime, size, content_hash):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO source_watermarks "
+                "(customer, name, mtime, size, content_hash, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (customer, name, mtime, size, content_hash, time.time()),
+            )
+
+    def get_sql_watermark(self, customer):
+        """Return the last pushed SQL watermark and probe result as a dict, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark, probe FROM sql_watermarks WHERE customer = ?",
+                (customer,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("watermark", "probe"), row))
+
+    def save_sql_watermark(self, customer, watermark, probe):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sql_watermarks "
+                "(customer, watermark, probe, updated_at) VALUES (?, ?, ?, ?)",
+                (customer, watermark, probe, time.time()),
+            )
+
+    def get_http_validators(self, customer):
+        """Return the ETag and Last-Modified of the last pushed HTTP source, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM http_validators WHERE customer = ?",
+                (customer,),
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("etag", "last_modified"), row))
+
+    def save_http_validators(self, customer, etag, last_modified):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_validators "
+                "(customer, etag, last_modified, updated_at) VALUES (?, ?, ?, ?)",
+                (customer, etag, last_modified, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_path = None
+_store_lock = threading.Lock()
+
+
+def configure(path):
+    """Set the database path used by `get_store`. Opening is deferred."""
+    global _store, _store_path
+    with _store_lock:
+        if _store is not None and path != _store_path:
+            _store.close()
+            _store = None
+        _store_path = path
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = _store_path or DEFAULT_STATE_DB
+            logging.info(f"Opening sync state database {path}")
+            _store = StateStore(path)
+        return _store
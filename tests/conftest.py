@@ -0,0 +1,108 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import api_client
+import chunking
+import connections
+import metrics
+from mapping import DATA_FIELDS
+
+
+@pytest.fixture(autouse=True)
+def reset_api_client():
+    """Keep cached sessions, tokens, chunk sizes, pooled connections and metrics
+    from leaking between tests."""
+    api_client.reset()
+    chunking.reset()
+    connections.configure(False)
+    metrics.reset()
+    yield
+    api_client.reset()
+    chunking.reset()
+    connections.configure(False)
+    metrics.reset()
+
+
+def _make_customer(name="cust", **overrides):
+    customer = {key: "" for key, _ in DATA_FIELDS}
+    customer.update(
+        {
+            "name": name,
+            "header_row": "NO",
+            "article_id": "",
+            "article_name": "",
+            "nfc_url": "",
+        }
+    )
+    customer.update(overrides)
+    return customer
+
+
+@pytest.fixture
+def make_customer():
+    """Build a customer with every field unmapped; map fields through keyword arguments."""
+    return _make_customer
+
+
+def _api_customer(**overrides):
+    customer = {
+        "output_endpoint": "https://example.com",
+        "output_user": "user",
+        "output_pass": "pass",
+        "store_name": "store",
+        "company_name": "company",
+        "name": "cust",
+    }
+    customer.update(overrides)
+    return customer
+
+
+@pytest.fixture
+def api_customer():
+    """Build a customer pushing to https://example.com."""
+    return _api_customer
+
+
+class FakeArticlesSession:
+    """Stands in for the API session: tokens are granted, article posts go to `handler`.
+
+    `tokens` are handed out in order, the last one repeatedly. `handler(url,
+    **kwargs)` returns the article response; by default every chunk is
+    accepted with a 201. `post` records every call.
+    """
+
+    def __init__(self, post):
+        self.post = post
+        self.tokens = ["tok"]
+        self.handler = lambda url, **kwargs: self.response(201)
+
+    @staticmethod
+    def response(status_code, payload=None, headers=None, seconds=0.01):
+        return MagicMock(
+            status_code=status_code,
+            headers=headers or {},
+            json=MagicMock(return_value=payload if payload is not None else {}),
+            elapsed=timedelta(seconds=seconds),
+        )
+
+    def respond(self, url, **kwargs):
+        if url.endswith("/token"):
+            token = self.tokens.pop(0) if len(self.tokens) > 1 else self.tokens[0]
+            return self.response(
+                200, {"responseMessage": {"access_token": token, "expires_in": 3600}}
+            )
+        return self.handler(url, **kwargs)
+
+    def article_calls(self):
+        return [c for c in self.post.call_args_list if c[0][0].endswith("/common/articles")]
+
+
+@pytest.fixture
+def article_api():
+    """Patch `api_client.get_session` with a `FakeArticlesSession`."""
+    with patch("api_client.get_session") as get_session:
+        api = FakeArticlesSession(get_session.return_value.post)
+        api.post.side_effect = api.respond
+        yield api
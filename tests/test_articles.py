@@ -0,0 +1,68 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+from articles import Article, ArticleData
+from encoding import get_encoder
+from mapping import compile_csv_mapping
+from state import article_fingerprint
+
+
+@pytest.fixture
+def article(make_customer):
+    customer = make_customer(
+        article_id="1", article_name="2", sale_price="3", brand="ACME", store_code="S1"
+    )
+    return compile_csv_mapping(customer).materialize(["42", "Widget", "1.99"])
+
+
+def test_article_behaves_like_a_dict(article):
+    assert isinstance(article, Article)
+    assert article == {
+        "articleId": "42",
+        "articleName": "Widget",
+        "data": {"STORE_CODE": "S1", "BRAND": "ACME", "SALE_PRICE": "1.99"},
+    }
+    assert article.articleId == "42"
+    assert "nfcUrl" not in article
+    assert article.get("eans") is None
+
+    data = article["data"]
+    data["MISC_03"] = "sale"
+    data["PLUGIN_FIELD"] = "x"
+    assert data.pop("BRAND") == "ACME"
+    assert data.pop("WEIGHT_UNIT", None) is None
+    assert data.setdefault("SALE_PRICE", "0") == "1.99"
+    assert data.setdefault("WEIGHT", "1") == "1"
+    assert "BRAND" not in data
+    assert list(data) == ["STORE_CODE", "SALE_PRICE", "WEIGHT", "MISC_03", "PLUGIN_FIELD"]
+
+    article["extra"] = {"a": 1}
+    article["data"] = {"ONLY": "this"}
+    assert isinstance(article["data"], ArticleData)
+    assert article.to_dict() == {
+        "articleId": "42",
+        "articleName": "Widget",
+        "data": {"ONLY": "this"},
+        "extra": {"a": 1},
+    }
+    del article["articleName"]
+    assert list(article) == ["articleId", "data", "extra"]
+
+
+def test_article_encodes_and_hashes_like_a_dict(article):
+    plain = article.to_dict()
+
+    assert type(plain["data"]) is dict
+    for backend in ("json", "orjson"):
+        assert json.loads(get_encoder(backend)([article])) == [plain]
+    assert article_fingerprint(article) == article_fingerprint(plain)
+
+
+def test_article_copies_and_pickles(article):
+    for clone in (copy.deepcopy(article), pickle.loads(pickle.dumps(article))):
+        assert clone == article
+        clone["data"]["BRAND"] = "OTHER"
+        assert article["data"]["BRAND"] == "ACME"
@@ -0,0 +1,42 @@
+from benchmarks import feeds, run
+from benchmarks.fake_api import FakeArticlesApi
+from daemon import parse_csv_data, push_to_api
+
+
+def test_csv_feed_maps_every_field():
+    customer = feeds.csv_customer()
+    articles = parse_csv_data(feeds.generate_csv(20), customer)
+    assert len(articles) == 20
+    assert articles[0]["articleId"] == "100000"
+    assert len(articles[0]["data"]) >= 30
+    # Same seed, same feed
+    assert feeds.generate_csv(5) == feeds.generate_csv(5)
+
+
+def test_push_to_fake_api_counts_articles():
+    with FakeArticlesApi(count_articles=True) as api:
+        customer = feeds.csv_customer(
+            output_endpoint=api.url,
+            output_user="u",
+            output_pass="p",
+            store_name="S",
+            company_name="C",
+            chunk_max_articles=10,
+        )
+        articles = parse_csv_data(feeds.generate_csv(25), customer)
+        assert push_to_api(customer, articles) is True
+    assert api.articles == 25
+    assert api.requests == 3
+
+
+def test_run_suite_and_compare():
+    lines = []
+    results = run.run_suite([50], ["parse_csv", "plugin_cks"], repeat=1, report=lines.append)
+    assert [(r["name"], r["rows"]) for r in results] == [("parse_csv", 50), ("plugin_cks", 50)]
+    assert all(r["rows_per_sec"] > 0 and r["peak_bytes"] > 0 for r in results)
+    assert len(lines) == 2
+
+    baseline = {"results": [dict(results[0], rows_per_sec=results[0]["rows_per_sec"] / 2)]}
+    report = run.compare(baseline, results)
+    assert "throughput +100.0%" in report[0]
+    assert "(no baseline)" in report[1]
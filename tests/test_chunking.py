@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from chunking import ChunkSizer, iter_sized_chunks
+from encoding import join_array
+
+
+def test_chunks_respect_article_cap_and_byte_target():
+    articles = [
+        {"articleId": f"{i:03d}", "data": {"ITEM_DESCRIPTION": "x" * 100}} for i in range(50)
+    ]
+    size = len(json.dumps(articles[0], separators=(",", ":"))) + 1
+    sizer = ChunkSizer(target_bytes=size * 10 + 1, min_bytes=1)
+
+    chunks = list(iter_sized_chunks(articles, sizer, max_articles=1000))
+    assert [len(parts) for parts, _ in chunks] == [10] * 5
+    assert all(len(join_array(parts)) == nbytes for parts, nbytes in chunks)
+    assert json.loads(join_array(chunks[0][0]))[0] == articles[0]
+
+    chunks = list(iter_sized_chunks(articles, sizer, max_articles=4))
+    assert max(len(parts) for parts, _ in chunks) == 4
+
+
+def test_oversized_article_gets_its_own_chunk():
+    sizer = ChunkSizer(target_bytes=10, min_bytes=1)
+    chunks = list(iter_sized_chunks([{"articleId": "1" * 50}, {"articleId": "2"}], sizer))
+    assert [len(parts) for parts, _ in chunks] == [1, 1]
+
+
+def test_sizer_adapts_to_latency_and_errors():
+    sizer = ChunkSizer(target_bytes=1000, target_latency=2.0, min_bytes=100, max_bytes=4000)
+
+    sizer.observe(1000, 0.1, 200)
+    assert sizer.target_bytes == 1250
+    sizer.observe(1250, 10.0, 200)
+    assert sizer.target_bytes == 937
+    sizer.observe(900, status=413)
+    assert sizer.target_bytes == 450
+    sizer.observe(450, timed_out=True)
+    assert sizer.target_bytes == 225
+
+
+def test_stdlib_and_orjson_encoders_agree():
+    from encoding import get_encoder
+
+    article = {"articleId": "1", "data": {"ITEM_NAME": "Caf\u00e9", "PRICE": 1.5}}
+    assert json.loads(get_encoder("json")(article)) == article
+    assert json.loads(get_encoder("auto")(article)) == article
+
+
+def test_iter_json_array_decodes_across_chunk_boundaries():
+    from encoding import iter_json_array
+
+    items = [{"productId": i, "name": "Blüte ✓", "isActive": i % 2 == 0} for i in range(50)] + [
+        12345
+    ]
+    body = json.dumps(items, ensure_ascii=False, indent=1).encode("utf-8")
+    for size in (1, 7, 64, len(body)):
+        chunks = (body[i : i + size] for i in range(0, len(body), size))
+        assert list(iter_json_array(chunks)) == items
+    assert list(iter_json_array([b" [ ] "])) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"error": "nope"}']))
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[{"a": 1}, {"b"']))
+
+
+def test_iter_json_array_decodes_numbers_split_across_chunks():
+    from encoding import iter_json_array
+
+    body = b"[12.5,true,-3e+10,1E-2,0,[7.25],null]"
+    for size in (1, 2, 3):
+        chunks = (body[i : i + size] for i in range(0, len(body), size))
+        assert list(iter_json_array(chunks)) == [12.5, True, -3e10, 0.01, 0, [7.25], None]
@@ -0,0 +1,60 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plugins import cks
+
+
+@pytest.fixture(autouse=True)
+def clear_inventory_cache():
+    cks.reset_inventory_cache()
+    yield
+    cks.reset_inventory_cache()
+
+
+def test_prefetch_overlaps_and_is_shared_with_transform():
+    release = threading.Event()
+    calls = []
+
+    def fake_fetch(location_key):
+        calls.append(location_key)
+        release.wait(5)
+        return [{"productId": 1, "quantityAvailable": 7}]
+
+    customer = {"name": "cks1", "creds": {"location_key": "loc"}}
+    plugin = cks.CksPlugin()
+    with patch("plugins.cks.fetch_dutchie_inventory", side_effect=fake_fetch):
+        plugin.prefetch(customer)
+        # The fetch runs in the background while products are fetched
+        release.set()
+        articles = [{"articleId": "1", "data": {}}]
+        plugin.transform_articles(customer, articles, products=[{"productId": 1}])
+
+    assert calls == ["loc"]
+    assert articles[0]["data"]["INVENTORY"] == "7"
+
+
+def test_inventory_cache_ttl_and_stale_while_revalidate():
+    counts = iter(range(1, 10))
+    fetch = lambda key: [{"productId": 1, "quantityAvailable": next(counts)}]
+    with patch("plugins.cks.fetch_dutchie_inventory", side_effect=fetch) as mock_fetch, patch(
+        "plugins.cks.time.monotonic"
+    ) as clock:
+        clock.return_value = 100.0
+        assert cks.get_inventory_map("loc", ttl=30, stale_ttl=60) == {"1": "1"}
+        clock.return_value = 120.0
+        assert cks.get_inventory_map("loc", ttl=30, stale_ttl=60) == {"1": "1"}
+        assert mock_fetch.call_count == 1
+
+        # Past the TTL but within the stale window: cached map now, refresh behind
+        clock.return_value = 150.0
+        assert cks.get_inventory_map("loc", ttl=30, stale_ttl=60) == {"1": "1"}
+        refresh = cks._inventory_fetches.get("loc")
+        if refresh:
+            refresh.result()
+        assert cks.get_inventory_map("loc", ttl=30, stale_ttl=60) == {"1": "2"}
+
+        # Past the stale window: wait for a fresh map
+        clock.return_value = 500.0
+        assert cks.get_inventory_map("loc", ttl=30, stale_ttl=60) == {"1": "3"}
@@ -0,0 +1,76 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import columnar
+from daemon import apply_plugins, parse_csv_data, transform_columnar
+from plugins.norwich import NorwichPlugin
+from plugins.vessel import VesselPlugin
+
+MAPPING = {
+    "header_row": "YES",
+    "article_id": "1",
+    "article_name": "2",
+    "barcode": "3",
+    "list_price": "4",
+    "sale_price": "5",
+    "start_date": "6",
+    "end_date": "7",
+    "store_code": "S1",
+    "template_field": "MISC_03",
+}
+
+
+CSV = (
+    "id,name,barcode,list,sale,start,end\n"
+    "1,Tea ,000123,3,1.5,01/01/2000,12/31/2999\n"
+    "2,Coffee,,10.00,2.675,1/1/2000,1/1/2001\n"
+    "3,Milk,000,abc,,01/01/2000,12/31/2999\n"
+    "4,Bread,42,4.25,bad,nope,12/31/2999\n"
+    "5,Jam,7,2,0.5,,\n"
+)
+
+
+# Short rows, a blank line and a longer row
+RAGGED_CSV = CSV + "6,Salt,9\n\n7,Oil,8,4,2,,,extra\n"
+
+
+@pytest.mark.parametrize("plugin", [NorwichPlugin(), VesselPlugin()])
+@pytest.mark.parametrize(
+    "csv_data, overrides",
+    [
+        (CSV, {}),
+        (RAGGED_CSV, {}),
+        # A mapped column past the end of every row
+        (CSV, {"misc_01": "9"}),
+        ("", {}),
+    ],
+    ids=["regular", "ragged", "narrow", "empty"],
+)
+def test_columnar_matches_row_mode(plugin, csv_data, overrides, make_customer):
+    customer = make_customer(plugin.__class__.__name__.lower(), **{**MAPPING, **overrides})
+    rows = list(apply_plugins(customer, parse_csv_data(csv_data, customer), [plugin]))
+    frame_articles = list(transform_columnar(customer, csv_data, [plugin]))
+    assert frame_articles == rows
+
+
+def test_quantize_and_difference_match_decimal():
+    values = ["3", "3.5", "2.675", "-0.5", "5.", "007.5", ".5", "1e3", " 4.1", "abc", "12.345"]
+    quantized, invalid = columnar.quantize_2dp(pd.Series(values, dtype=object))
+    for value, out, bad in zip(values, quantized, invalid):
+        try:
+            expected = str(Decimal(value.strip()).quantize(Decimal("0.00"), rounding=ROUND_HALF_UP))
+        except InvalidOperation:
+            assert bad and out == value
+        else:
+            assert out == expected and not bad
+
+    left = ["3", "10.00", "1.5", "1", "0.5", "1.123456789", "5.", "x"]
+    right = ["1.5", "2.5", "1.5", "2", "1.25", "0.1", "2", "1"]
+    diffs, invalid = columnar.decimal_difference(pd.Series(left), pd.Series(right))
+    assert list(diffs) == [str(Decimal(a) - Decimal(b)) for a, b in zip(left[:-1], right[:-1])] + [
+        None
+    ]
+    assert list(invalid) == [False] * 7 + [True]
@@ -0,0 +1,86 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import connections
+from connections import ConnectionPool
+
+
+def test_lease_closes_connection_when_pooling_disabled():
+    pool = ConnectionPool()
+    conn = object()
+    close = MagicMock()
+    with pool.lease(("ftp", "host"), lambda: conn, close) as lease:
+        assert lease.conn is conn
+    close.assert_called_once_with(conn)
+
+
+def test_lease_reuses_healthy_connection():
+    pool = ConnectionPool(enabled=True)
+    connect = MagicMock(side_effect=[object(), object()])
+    is_alive = MagicMock(return_value=True)
+    close = MagicMock()
+    with pool.lease(("ftp", "host"), connect, close, is_alive=is_alive) as lease:
+        first = lease.conn
+    with pool.lease(("ftp", "host"), connect, close, is_alive=is_alive) as lease:
+        assert lease.conn is first
+    assert connect.call_count == 1
+    close.assert_not_called()
+    # Different credentials never share a connection
+    with pool.lease(("ftp", "host", "other"), connect, close) as lease:
+        assert lease.conn is not first
+
+
+def test_lease_replaces_unhealthy_or_broken_connection():
+    pool = ConnectionPool(enabled=True)
+    conns = [MagicMock(name="a"), MagicMock(name="b"), MagicMock(name="c")]
+    connect = MagicMock(side_effect=conns)
+    close = MagicMock()
+    with pool.lease(("sql", "host"), connect, close):
+        pass
+    # Health check fails: a new connection is opened and the old one closed
+    with pool.lease(
+        ("sql", "host"), connect, close, is_alive=MagicMock(side_effect=OSError)
+    ) as lease:
+        assert lease.conn is conns[1]
+    close.assert_called_once_with(conns[0])
+    # A connection error inside the block discards the connection
+    with pytest.raises(OSError):
+        with pool.lease(("sql", "host"), connect, close, is_alive=lambda c: True):
+            raise OSError("reset")
+    close.assert_called_with(conns[1])
+    # Other errors leave the connection usable
+    with pytest.raises(ValueError):
+        with pool.lease(("sql", "host"), connect, close):
+            raise ValueError("bad data")
+    with pool.lease(("sql", "host"), connect, close, is_alive=lambda c: True) as lease:
+        assert lease.conn is conns[2]
+
+
+def test_evict_idle_closes_stale_connections():
+    pool = ConnectionPool(enabled=True, max_idle=300)
+    conn = object()
+    close = MagicMock()
+    with patch("connections.time.monotonic", return_value=1000.0):
+        with pool.lease(("sftp", "host"), lambda: conn, close):
+            pass
+    with patch("connections.time.monotonic", return_value=1200.0):
+        pool.evict_idle()
+    close.assert_not_called()
+    with patch("connections.time.monotonic", return_value=1400.0):
+        pool.evict_idle()
+    close.assert_called_once_with(conn)
+
+
+@patch("daemon.pymysql.connect")
+def test_fetch_sql_reuses_pooled_connection(mock_connect):
+    from daemon import fetch_sql
+
+    connections.configure(True)
+    cursor = mock_connect.return_value.cursor.return_value
+    cursor.fetchall.return_value = [{"id": 1}]
+    assert fetch_sql("host", "user", "pass", "db", "SELECT 1")[0] == "id\r\n1\r\n"
+    assert fetch_sql("host", "user", "pass", "db", "SELECT 1")[0] == "id\r\n1\r\n"
+    mock_connect.assert_called_once()
+    mock_connect.return_value.ping.assert_called_once_with(reconnect=False)
+    mock_connect.return_value.close.assert_not_called()
@@ -1,8 +1,11 @@
 import logging
 import pytest
 import sys
-import builtins
+import ftplib
 import io
+import json
+import pymysql
+import metrics
 from unittest.mock import patch, MagicMock
 from daemon import (
     parse_csv_data,
@@ -14,7 +17,6 @@ from daemon import (
     fetch_local,
     run_daemon,
 )
-from types import SimpleNamespace
 from plugins.norwich import NorwichPlugin
 
 
@@ -142,36 +144,45 @@ def test_norwich_plugin_ignores_blank_sale_price(caplog):
 
 
 @patch("builtins.exit")
-@patch("daemon.requests.post")
-def test_push_to_api(mock_post, mock_exit):
-    mock_post.return_value.status_code = 200
-    mock_post.return_value.json.return_value = {
-        "responseMessage": {"access_token": "tok"}
-    }
-    customer = {
-        "output_endpoint": "https://example.com",
-        "output_user": "user",
-        "output_pass": "pass",
-        "store_name": "store",
-        "company_name": "company",
-        "name": "cust",
-    }
+def test_push_to_api(mock_exit, article_api, api_customer):
+    article_api.handler = lambda url, **kwargs: article_api.response(200)
     data = [{"articleId": "1"}]
-    push_to_api(customer, data)
+    push_to_api(api_customer(), data)
     # Check token request
-    mock_post.assert_any_call(
+    article_api.post.assert_any_call(
         "https://example.com/common/api/v2/token",
         timeout=30,
         json={"username": "user", "password": "pass"},
     )
     # Check article post
-    mock_post.assert_any_call(
-        "https://example.com/common/api/v2/common/articles",
-        headers={"Authorization": "Bearer tok"},
-        params={"store": "store", "company": "company"},
-        timeout=300,
-        json=data,
-    )
+    article_calls = article_api.article_calls()
+    assert len(article_calls) == 1
+    kwargs = article_calls[0][1]
+    assert kwargs["headers"] == {"Authorization": "Bearer tok", "Content-Type": "application/json"}
+    assert kwargs["params"] == {"store": "store", "company": "company"}
+    assert kwargs["timeout"] == 300
+    assert json.loads(kwargs["data"]) == data
+
+
+def test_push_to_api_reuses_cached_token(article_api, api_customer):
+    customer = api_customer()
+
+    push_to_api(customer, [{"articleId": "1"}])
+    push_to_api(customer, [{"articleId": "2"}])
+
+    token_calls = [c for c in article_api.post.call_args_list if c[0][0].endswith("/token")]
+    assert len(token_calls) == 1
+
+
+def test_push_to_api_refreshes_token_on_401(article_api, api_customer):
+    article_api.tokens = ["old", "new"]
+
+    def handler(url, headers=None, **kwargs):
+        return article_api.response(401 if headers["Authorization"] == "Bearer old" else 201)
+
+    article_api.handler = handler
+
+    assert push_to_api(api_customer(), [{"articleId": "1"}]) is True
 
 
 @patch("daemon.fetch_ftp")
@@ -187,9 +198,7 @@ def test_process_customer_ftp(mock_push, mock_parse, mock_fetch):
         "output_endpoint": "https://example.com",
     }
     process_customer(customer)
-    mock_fetch.assert_called_once_with(
-        'cust1', host="ftp.example.com", user="user", passw="pass"
-    )
+    mock_fetch.assert_called_once_with("cust1", host="ftp.example.com", user="user", passw="pass")
     mock_parse.assert_called_once_with("csv data", customer)
     mock_push.assert_called_once_with(customer, [{"data": "parsed"}])
 
@@ -213,31 +222,35 @@ def test_process_customer_sftp(mock_push, mock_parse, mock_fetch):
     }
     process_customer(customer)
     mock_fetch.assert_called_once_with(
-        'cust1', host="sftp.example.com", user="user", passw="pass", key_path=None
+        "cust1", host="sftp.example.com", user="user", passw="pass", key_path=None
     )
     mock_parse.assert_called_once_with("csv data", customer)
     mock_push.assert_called_once_with(customer, [{"data": "parsed"}])
 
 
-@patch("daemon.fetch_sql")
-@patch("daemon.parse_csv_data")
+@patch("daemon.fetch_sql_rows")
 @patch("daemon.push_to_api")
-def test_process_customer_sql(mock_push, mock_parse, mock_fetch):
-    mock_fetch.return_value = ("csv data", None)
-    mock_parse.return_value = [{"data": "parsed"}]
-    customer = {
-        "name": "cust1",
-        "input_type": "sql",
-        "creds": {
+def test_process_customer_sql(mock_push, mock_fetch, make_customer):
+    mock_fetch.return_value = iter(
+        [{"id": 7, "name": "Widget ", "price": None}, {"id": 8, "name": "Gadget", "price": 2.5}]
+    )
+    customer = make_customer(
+        name="cust1",
+        input_type="sql",
+        header_row="YES",
+        article_id="1",
+        article_name="2",
+        list_price="3",
+        creds={
             "host": "sql.example.com",
             "user": "user",
             "passw": "pass",
             "db": "db",
             "query": "SELECT *",
         },
-        "output_endpoint": "https://example.com",
-    }
-    process_customer(customer)
+        output_endpoint="https://example.com",
+    )
+    assert process_customer(customer) == "pushed"
     mock_fetch.assert_called_once_with(
         host="sql.example.com",
         user="user",
@@ -245,8 +258,39 @@ def test_process_customer_sql(mock_push, mock_parse, mock_fetch):
         db="db",
         query="SELECT *",
     )
-    mock_parse.assert_called_once_with("csv data", customer)
-    mock_push.assert_called_once_with(customer, [{"data": "parsed"}])
+    # Columns are read by name, with values rendered as the CSV export did
+    mock_push.assert_called_once_with(
+        customer,
+        [
+            {
+                "articleId": "7",
+                "articleName": "Widget",
+                "data": {"STORE_CODE": "", "LIST_PRICE": ""},
+            },
+            {
+                "articleId": "8",
+                "articleName": "Gadget",
+                "data": {"STORE_CODE": "", "LIST_PRICE": "2.5"},
+            },
+        ],
+    )
+    assert metrics.FETCH_ROWS.value(customer="cust1", source="sql") == 2
+    assert metrics.FETCH_SECONDS.count(customer="cust1", source="sql") == 1
+
+
+@patch("daemon.pymysql.connect")
+def test_fetch_sql_rows_streams_with_unbuffered_cursor(mock_connect):
+    from daemon import fetch_sql_rows
+
+    cursor = mock_connect.return_value.cursor.return_value
+    cursor.__iter__.return_value = iter([{"id": 1}, {"id": 2}])
+
+    rows = fetch_sql_rows("host", "user", "pass", "db", "SELECT id")
+    assert list(rows) == [{"id": 1}, {"id": 2}]
+    mock_connect.return_value.cursor.assert_called_once_with(pymysql.cursors.SSDictCursor)
+    cursor.execute.assert_called_with("SELECT id", None)
+    cursor.close.assert_called_once()
+    mock_connect.return_value.close.assert_called_once()
 
 
 @patch("daemon.fetch_local")
@@ -271,6 +315,8 @@ def test_process_customer_local(mock_push, mock_parse, mock_fetch):
 def test_fetch_ftp(mock_ftp):
     mock_ftp_instance = MagicMock()
     mock_ftp.return_value = mock_ftp_instance
+    # Server without MLSD support: fall back to NLST + MDTM
+    mock_ftp_instance.mlsd.side_effect = ftplib.error_perm("500 Unknown command")
     mock_ftp_instance.nlst.return_value = ["test.csv"]
     mock_ftp_instance.voidcmd.return_value = "213 20231027120000"
     mock_ftp_instance.retrbinary.return_value = None
@@ -278,7 +324,9 @@ def test_fetch_ftp(mock_ftp):
 
     # Mock the data
     data = io.BytesIO(b"test,csv\ndata")
-    mock_ftp_instance.retrbinary = MagicMock(side_effect=lambda cmd, callback: callback(data.getvalue()))
+    mock_ftp_instance.retrbinary = MagicMock(
+        side_effect=lambda cmd, callback, **kwargs: callback(data.getvalue())
+    )
 
     result = fetch_ftp("test_customer", "host", "user", "pass")
     assert result[0] == "test,csv\ndata"
@@ -288,6 +336,30 @@ def test_fetch_ftp(mock_ftp):
     mock_ftp_instance.quit.assert_called_once()
 
 
+@patch("daemon.ftplib.FTP")
+def test_fetch_ftp_uses_mlsd_listing(mock_ftp, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    mock_ftp_instance = MagicMock()
+    mock_ftp.return_value = mock_ftp_instance
+    mock_ftp_instance.mlsd.return_value = [
+        (".", {"type": "cdir", "modify": "20240101000000"}),
+        ("archive", {"type": "dir", "modify": "20250101000000"}),
+        ("old.csv", {"type": "file", "modify": "20231027120000", "size": "10"}),
+        ("new.csv", {"type": "file", "modify": "20231028120000.123", "size": "13"}),
+    ]
+    mock_ftp_instance.retrbinary = MagicMock(
+        side_effect=lambda cmd, callback, **kwargs: callback(b"new,csv\ndata")
+    )
+
+    result = fetch_ftp("test_customer", "host", "user", "pass", path="/feeds")
+
+    assert result[0] == "new,csv\ndata"
+    mock_ftp_instance.retrbinary.assert_called_once()
+    assert mock_ftp_instance.retrbinary.call_args[0][0] == "RETR /feeds/new.csv"
+    mock_ftp_instance.nlst.assert_not_called()
+    mock_ftp_instance.voidcmd.assert_not_called()
+
+
 @patch("daemon.paramiko.SSHClient")
 @patch("daemon.os.path.expanduser")
 def test_fetch_sftp(mock_expanduser, mock_ssh):
@@ -297,7 +369,7 @@ def test_fetch_sftp(mock_expanduser, mock_ssh):
     mock_sftp = MagicMock()
     mock_ssh_instance.open_sftp.return_value = mock_sftp
     mock_file = MagicMock()
-    mock_file.read.return_value = b"test,csv\ndata"
+    mock_file.read.side_effect = [b"test,csv\ndata", b""]
     mock_sftp.open.return_value.__enter__.return_value = mock_file
     mock_sftp.open.return_value.__exit__.return_value = None
     # Mock listdir_attr to return a file with mtime
@@ -312,8 +384,9 @@ def test_fetch_sftp(mock_expanduser, mock_ssh):
     mock_ssh_instance.load_host_keys.assert_called_once_with("/home/user/.ssh/known_hosts")
     mock_ssh_instance.set_missing_host_key_policy.assert_called_once()
     mock_ssh_instance.connect.assert_called_once_with("host", username="user", password="pass")
-    mock_sftp.open.assert_called_once_with("/test.csv", "r")
-    mock_file.read.assert_called_once()
+    mock_sftp.open.assert_called_once_with("/test.csv", "rb")
+    mock_file.prefetch.assert_called_once()
+    assert mock_file.read.call_count == 2
     mock_ssh_instance.close.assert_called_once()
 
 
@@ -340,32 +413,99 @@ def test_fetch_local(tmp_path):
     assert result[0] == "test,csv\ndata"
 
 
-@patch("daemon.time.sleep")
-@patch("daemon.schedule.run_pending")
-@patch("daemon.schedule.get_jobs")
 @patch("daemon.process_customer")
-def test_run_daemon(mock_process, mock_get_jobs, mock_run_pending, mock_sleep):
-    mock_get_jobs.return_value = ["job1"]
-
-    # Mock run_pending to call process_customer on first call, then raise
-    call_count = 0
-    def mock_pending():
-        nonlocal call_count
-        call_count += 1
-        if call_count == 1:
-            for customer in config.customers:
-                mock_process(customer)
-        else:
-            raise KeyboardInterrupt()
-    mock_run_pending.side_effect = mock_pending
+def test_run_daemon(mock_process):
+    import scheduler
+
+    # Run whatever is due once, then stop as if interrupted
+    def run_once(self):
+        self.run_due()
+        raise KeyboardInterrupt()
+
+    config = MagicMock()
+    config.customers = [{"name": "cust1"}, {"name": "cust2", "cron": "0 0 * * *"}]
+    config.max_workers = 2
+    config.max_per_host = 2
+    config.metrics_port = 0
+    config.metrics_json = None
+
+    with patch.object(scheduler.Scheduler, "run_forever", run_once):
+        with pytest.raises(KeyboardInterrupt):
+            run_daemon(config)
+
+    # Interval customers run at startup, cron customers wait for their slot
+    mock_process.assert_called_once_with({"name": "cust1"}, force=False)
+
+
+@patch("daemon.process_customer")
+def test_run_daemon_watched_runs_share_max_workers(mock_process, tmp_path):
+    import threading
+    import time
+
+    import scheduler
+
+    pytest.importorskip("watchdog")
+    active = {"now": 0, "peak": 0, "runs": 0}
+    lock = threading.Lock()
+
+    def process(customer, force=False):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+            active["runs"] += 1
+
+    mock_process.side_effect = process
+
+    def run_until_all_ran(self):
+        self.run_due()
+        deadline = time.monotonic() + 5
+        while active["runs"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        raise KeyboardInterrupt()
+
+    watched = [
+        {"name": name, "input_type": "local", "watch": True, "creds": {"path": str(tmp_path)}}
+        for name in ("local1", "local2")
+    ]
+    config = MagicMock()
+    config.customers = [{"name": "cust1"}] + watched
+    config.max_workers = 1
+    config.max_per_host = 3
+    config.metrics_port = 0
+    config.metrics_json = None
+    config.watch_debounce = 0.01
+
+    with patch.object(scheduler.Scheduler, "run_forever", run_until_all_ran):
+        with pytest.raises(KeyboardInterrupt):
+            run_daemon(config)
+
+    assert active["runs"] == 3
+    assert active["peak"] == 1
+
+
+@patch("daemon.process_customer")
+def test_run_daemon_force_runs_everyone_now(mock_process):
+    import scheduler
+
+    def run_once(self):
+        self.run_due()
+        raise KeyboardInterrupt()
 
     config = MagicMock()
-    config.customers = [{"name": "cust1"}]
+    config.customers = [{"name": "cust2", "cron": "0 0 * * *"}]
+    config.max_workers = 1
+    config.max_per_host = 2
+    config.metrics_port = 0
+    config.metrics_json = None
 
-    with pytest.raises(KeyboardInterrupt):
-        run_daemon(config)
+    with patch.object(scheduler.Scheduler, "run_forever", run_once):
+        with pytest.raises(KeyboardInterrupt):
+            run_daemon(config, force=True)
 
-    mock_process.assert_called_with({"name": "cust1"})
+    mock_process.assert_called_once_with({"name": "cust2", "cron": "0 0 * * *"}, force=True)
 
 
 @patch("daemon.fetch_local")
@@ -423,6 +563,40 @@ def test_process_customer_parser_error(mock_push, mock_parse, mock_fetch):
             mock_push.assert_not_called()
 
 
+@patch("daemon.sync_articles")
+def test_process_customer_in_process_parser(mock_sync, tmp_path, make_customer):
+    import os
+    from unittest.mock import patch
+
+    import parsers.xml_records  # noqa: F401 registers the xml parser
+
+    feed = tmp_path / "feed.xml"
+    feed.write_text(
+        "<items><item><sku>100</sku><name>Widget</name></item>"
+        "<item><sku>101</sku><name>Gadget</name></item></items>"
+    )
+    mock_sync.return_value = True
+    customer = make_customer(
+        name="cust1",
+        input_type="local",
+        creds={"path": str(feed)},
+        input_parser="xml",
+        article_id="1",
+        article_name="2",
+        output_endpoint="https://example.com",
+    )
+    with patch("daemon.subprocess.run") as mock_run, patch(
+        "daemon.fetch_local", return_value=("", str(feed))
+    ), patch("daemon.archive_source_file"), patch.dict(os.environ, {"CUST1_LOCAL_PATH": str(feed)}):
+        process_customer(customer)
+    mock_run.assert_not_called()
+    articles = mock_sync.call_args[0][1]
+    assert [(a["articleId"], a["articleName"]) for a in articles] == [
+        ("100", "Widget"),
+        ("101", "Gadget"),
+    ]
+
+
 @patch("daemon.parse_csv_data")
 @patch("daemon.push_to_api")
 def test_process_customer_unknown_input_type(mock_push, mock_parse):
@@ -452,76 +626,674 @@ def test_process_customer_exception(mock_push, mock_parse):
 
 
 @patch("builtins.exit")
-@patch("daemon.requests.post")
-def test_push_to_api_chunking(mock_post, mock_exit):
-    mock_post.side_effect = [
-        MagicMock(status_code=200, json=MagicMock(return_value={"responseMessage": {"access_token": "tok"}})),
-        MagicMock(status_code=201, json=MagicMock(return_value={"ok": True})),
-        MagicMock(status_code=201, json=MagicMock(return_value={"ok": True})),
-    ]
-
-    customer = {
-        "output_endpoint": "https://example.com",
-        "output_user": "user",
-        "output_pass": "pass",
-        "store_name": "store",
-        "company_name": "company",
-        "name": "cust",
-    }
+def test_push_to_api_chunking(mock_exit, article_api, api_customer):
     data = [{"articleId": str(i)} for i in range(1500)]  # More than 1000
 
-    push_to_api(customer, data)
+    push_to_api(api_customer(), data)
 
     # Should have 2 article posts (chunks of 1000, then 500)
-    article_calls = [call for call in mock_post.call_args_list if "/common/articles" in call[0][0]]
+    article_calls = article_api.article_calls()
     assert len(article_calls) == 2
-    assert len(article_calls[0][1]["json"]) == 1000
-    assert len(article_calls[1][1]["json"]) == 500
+    assert len(json.loads(article_calls[0][1]["data"])) == 1000
+    assert len(json.loads(article_calls[1][1]["data"])) == 500
 
 
-def test_push_to_api_includes_customer_params(monkeypatch):
-    monkeypatch.setattr(builtins, "exit", lambda: None)
-    import daemon
+def test_push_to_api_includes_customer_params(article_api, api_customer):
+    push_to_api(api_customer(store_name="MyStore", company_name="MyCompany"), [{"articleId": "1"}])
 
-    calls = []
+    article_calls = article_api.article_calls()
+    assert len(article_calls) == 1
+    assert article_calls[0][1]["params"] == {
+        "store": "MyStore",
+        "company": "MyCompany",
+    }
 
-    class MockResp:
-        def __init__(self, status_code, json_data):
-            self.status_code = status_code
-            self._json = json_data
 
-        def json(self):
-            return self._json
+def test_iter_chunks_consumes_generators_lazily():
+    from daemon import iter_chunks
 
-    def mock_post(url, headers=None, params=None, timeout=None, json=None):
-        calls.append(
-            {"url": url, "headers": headers, "params": params, "json": json}
-        )
-        if url.endswith("/common/api/v2/token"):
-            return MockResp(200, {"responseMessage": {"access_token": "tok"}})
-        if url.endswith("/common/api/v2/common/articles"):
-            return MockResp(201, {"ok": True})
-        return MockResp(404, {})
+    consumed = []
+
+    def gen():
+        for i in range(5):
+            consumed.append(i)
+            yield i
+
+    chunks = iter_chunks(gen(), 2)
+    assert next(chunks) == [0, 1]
+    assert consumed == [0, 1]
+    assert list(chunks) == [[2, 3], [4]]
+
+
+@patch("daemon.get_plugins_for_customer")
+@patch("daemon.push_to_api")
+def test_process_customer_streaming_local(
+    mock_push, mock_plugins, tmp_path, monkeypatch, make_customer
+):
+    monkeypatch.chdir(tmp_path)
+    mock_plugins.return_value = []
+    source = tmp_path / "feed.csv"
+    source.write_text("id,name\n1,Apple\n2,Pear\n")
+    pushed = []
+    mock_push.side_effect = lambda customer, data: pushed.extend(data)
+    customer = make_customer(
+        name="cust1",
+        input_type="local",
+        creds={"path": str(source)},
+        streaming=True,
+        header_row="YES",
+        article_id="1",
+        article_name="2",
+    )
+
+    process_customer(customer)
+
+    assert [a["articleId"] for a in pushed] == ["1", "2"]
+    assert (tmp_path / "tmp" / "cust1" / "feed.csv").exists()
 
-    monkeypatch.setattr(daemon, "requests", SimpleNamespace(post=mock_post))
 
+@patch("daemon.sync_articles")
+@patch("daemon.parse_csv_data")
+def test_process_customer_skips_unchanged_source(mock_parse, mock_sync, tmp_path):
+    import state
+
+    state.configure(str(tmp_path / "state.db"))
+    mock_parse.return_value = [{"articleId": "1"}]
+    mock_sync.return_value = True
+    source = tmp_path / "in"
+    source.mkdir()
+    (source / "feed.csv").write_text("1,Apple\n")
     customer = {
-        "output_endpoint": "https://example.com",
-        "output_user": "user",
-        "output_pass": "pass",
-        "name": "cust",
-        "store_name": "MyStore",
-        "company_name": "MyCompany",
+        "name": "cust1",
+        "input_type": "local",
+        "creds": {"path": str(source)},
+        "skip_unchanged": True,
     }
-    data = [{"articleId": "1"}]
 
-    daemon.push_to_api(customer, data)
+    try:
+        with patch("daemon.archive_source_file"):
+            process_customer(customer)
+            process_customer(customer)
+            assert mock_parse.call_count == 1
+
+            # Same content with a new timestamp is still skipped before parsing
+            import os
+
+            os.utime(source / "feed.csv", (1, 1))
+            process_customer(customer)
+            assert mock_parse.call_count == 1
+
+            process_customer(customer, force=True)
+            assert mock_parse.call_count == 2
+    finally:
+        state.configure(None)
 
-    article_calls = [
-        c for c in calls if c["url"].endswith("/common/api/v2/common/articles")
+
+@patch("daemon.sync_articles", return_value=True)
+@patch("daemon.ftplib.FTP")
+def test_process_customer_ftp_skips_unchanged_download(
+    mock_ftp, mock_sync, tmp_path, monkeypatch, make_customer
+):
+    import os
+    import state
+
+    monkeypatch.chdir(tmp_path)
+    state.configure(str(tmp_path / "state.db"))
+    mock_ftp_instance = MagicMock()
+    mock_ftp.return_value = mock_ftp_instance
+    mock_ftp_instance.mlsd.return_value = [
+        ("feed.csv", {"type": "file", "modify": "20231027120000", "size": "8"}),
     ]
-    assert len(article_calls) == 1
-    assert article_calls[0]["params"] == {
-        "store": "MyStore",
-        "company": "MyCompany",
+    mock_ftp_instance.retrbinary = MagicMock(
+        side_effect=lambda cmd, callback, **kwargs: callback(b"1,Apple\n")
+    )
+    customer = make_customer(
+        name="acme",
+        input_type="ftp",
+        creds={"host": "ftp.example.com", "user": "user", "passw": "pass"},
+        skip_unchanged=True,
+        article_id="1",
+        article_name="2",
+    )
+
+    try:
+        assert process_customer(customer) == "pushed"
+        assert os.path.exists(os.path.join("tmp", "acme", "feed.csv"))
+        assert state.get_store().get_source_watermark("acme")["name"] == "/feed.csv"
+
+        assert process_customer(customer) == "unchanged"
+        assert mock_ftp_instance.retrbinary.call_count == 1
+        assert mock_sync.call_count == 1
+    finally:
+        state.configure(None)
+
+
+@patch("daemon.get_plugins_for_customer")
+@patch("daemon.sync_articles")
+@patch("daemon.parse_csv_data")
+def test_process_customer_with_plugins_runs_unchanged_source(
+    mock_parse, mock_sync, mock_plugins, tmp_path
+):
+    import state
+
+    state.configure(str(tmp_path / "state.db"))
+    mock_plugins.return_value = [NorwichPlugin()]
+    mock_parse.return_value = []
+    mock_sync.return_value = True
+    source = tmp_path / "in"
+    source.mkdir()
+    (source / "feed.csv").write_text("1,Apple\n")
+    customer = {
+        "name": "norwich",
+        "input_type": "local",
+        "creds": {"path": str(source)},
+        "skip_unchanged": True,
     }
+
+    try:
+        with patch("daemon.archive_source_file"):
+            assert process_customer(customer) == "pushed"
+            # Sale labels depend on today's date, not just on the file
+            assert process_customer(customer) == "pushed"
+        assert mock_parse.call_count == 2
+        assert state.get_store().get_source_watermark("norwich") is None
+    finally:
+        state.configure(None)
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@patch("daemon.sync_articles")
+def test_process_customer_empty_source_is_no_data(mock_sync, streaming, tmp_path):
+    import state
+
+    state.configure(str(tmp_path / "state.db"))
+    source = tmp_path / "in"
+    source.mkdir()
+    customer = {
+        "name": "cust1",
+        "input_type": "local",
+        "creds": {"path": str(source)},
+        "skip_unchanged": True,
+        "streaming": streaming,
+    }
+
+    try:
+        assert process_customer(customer) == "no_data"
+        mock_sync.assert_not_called()
+        assert state.get_store().get_source_watermark("cust1") is None
+    finally:
+        state.configure(None)
+
+
+@patch("daemon.ftplib.FTP")
+def test_fetch_ftp_skips_download_when_unchanged(mock_ftp):
+    from daemon import SourceUnchanged
+
+    mock_ftp_instance = MagicMock()
+    mock_ftp.return_value = mock_ftp_instance
+    mock_ftp_instance.mlsd.return_value = [
+        ("test.csv", {"type": "file", "modify": "20231027120000", "size": "12"}),
+    ]
+
+    with pytest.raises(SourceUnchanged):
+        fetch_ftp("test_customer", "host", "user", "pass", is_unchanged=lambda *a: True)
+    mock_ftp_instance.retrbinary.assert_not_called()
+    mock_ftp_instance.quit.assert_called_once()
+
+
+def run_forced(customers, max_workers=4, max_per_host=2):
+    """Run every customer once through the scheduler, as a forced startup run does."""
+    from daemon import HostLimiter, customer_schedule, run_customer
+    from scheduler import Scheduler
+
+    limiter = HostLimiter(max_per_host)
+    results = {}
+
+    def run(customer, force=False):
+        results[customer["name"]] = run_customer(customer, limiter, force=force)
+
+    customer_scheduler = Scheduler(run, max_workers=max_workers)
+    for customer in customers:
+        customer_scheduler.add(customer, customer_schedule(customer), force=True)
+    customer_scheduler.run_due()
+    customer_scheduler.stop()
+    return results
+
+
+@patch("daemon.process_customer")
+def test_run_customer_isolates_failures(mock_process):
+    def fake_process(customer, force=False):
+        if customer["name"] == "bad":
+            raise RuntimeError("boom")
+        return "pushed"
+
+    mock_process.side_effect = fake_process
+    customers = [
+        {"name": "good", "input_type": "local", "creds": {}},
+        {"name": "bad", "input_type": "local", "creds": {}},
+    ]
+
+    results = run_forced(customers, max_workers=2)
+
+    assert results["good"][0] == "pushed"
+    assert results["bad"][0] == "failed"
+    assert metrics.CYCLES.value(customer="bad", status="failed") == 1
+
+
+@patch("daemon.process_customer")
+def test_run_customer_limits_per_host(mock_process):
+    import threading
+    import time
+
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_process(customer, force=False):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return "pushed"
+
+    mock_process.side_effect = fake_process
+    customers = [
+        {"name": f"c{i}", "input_type": "sftp", "creds": {"host": "sftp.example.com"}}
+        for i in range(4)
+    ]
+
+    results = run_forced(customers, max_workers=4, max_per_host=1)
+
+    assert len(results) == 4
+    assert active["peak"] == 1
+
+
+@patch("api_client.time.sleep")
+def test_push_to_api_retries_transient_errors(mock_sleep, article_api, api_customer):
+    statuses = [503, 502, 201]
+
+    def handler(url, **kwargs):
+        status = statuses.pop(0)
+        headers = {"Retry-After": "2"} if status == 503 else {}
+        return article_api.response(status, headers=headers)
+
+    article_api.handler = handler
+
+    assert push_to_api(api_customer(push_retries=3), [{"articleId": "1"}]) is True
+    assert mock_sleep.call_count == 2
+    assert mock_sleep.call_args_list[0][0][0] == 2.0
+
+
+@patch("api_client.time.sleep")
+def test_push_to_api_times_final_attempt_only(mock_sleep, article_api, api_customer):
+    import chunking
+
+    statuses = [503, 201]
+    article_api.handler = lambda url, **kwargs: article_api.response(
+        statuses.pop(0), headers={"Retry-After": "1"}, seconds=0.5
+    )
+
+    with patch.object(chunking.ChunkSizer, "observe", autospec=True) as observe:
+        assert push_to_api(api_customer(push_retries=2), [{"articleId": "1"}]) is True
+
+    observe.assert_called_once()
+    assert observe.call_args[0][2:] == (0.5, 201)
+
+
+def test_push_to_api_parallel_chunks(article_api, api_customer):
+    import threading
+    import time
+
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def handler(url, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        return article_api.response(201)
+
+    article_api.handler = handler
+    customer = api_customer(push_concurrency=3)
+
+    assert push_to_api(customer, [{"articleId": str(i)} for i in range(5000)]) is True
+    assert 1 < active["peak"] <= 3
+
+
+def test_push_to_api_splits_chunk_on_413(article_api, api_customer):
+    sizes = []
+
+    def handler(url, data=None, **kwargs):
+        articles = json.loads(data)
+        sizes.append(len(articles))
+        return article_api.response(413 if len(articles) > 250 else 201)
+
+    article_api.handler = handler
+
+    assert push_to_api(api_customer(), [{"articleId": str(i)} for i in range(1000)]) is True
+    assert sizes[:3] == [1000, 500, 250]
+    assert sum(s for s in sizes if s <= 250) == 1000
+
+
+def test_push_to_api_splits_chunk_on_first_timeout(article_api, api_customer):
+    import requests
+
+    sizes = []
+
+    def handler(url, data=None, **kwargs):
+        articles = json.loads(data)
+        sizes.append(len(articles))
+        if len(articles) > 250:
+            raise requests.Timeout("read timed out")
+        return article_api.response(201)
+
+    article_api.handler = handler
+
+    with patch("api_client.time.sleep") as mock_sleep:
+        assert push_to_api(api_customer(), [{"articleId": str(i)} for i in range(1000)]) is True
+    # Oversized chunks are halved at once instead of being retried
+    assert sizes[:3] == [1000, 500, 250]
+    assert sum(s for s in sizes if s <= 250) == 1000
+    mock_sleep.assert_not_called()
+
+
+def test_push_to_api_gzip_falls_back_on_415(article_api, api_customer):
+    import gzip
+
+    bodies = []
+
+    def handler(url, headers=None, data=None, **kwargs):
+        gzipped = headers.get("Content-Encoding") == "gzip"
+        bodies.append((gzipped, json.loads(gzip.decompress(data) if gzipped else data)))
+        return article_api.response(415 if gzipped else 201)
+
+    article_api.handler = handler
+    customer = api_customer(gzip=True)
+    articles = [{"articleId": "1"}]
+
+    assert push_to_api(customer, articles) is True
+    assert push_to_api(customer, articles) is True
+    assert bodies == [(True, articles), (False, articles), (False, articles)]
+
+
+def test_download_ftp_resumes_after_drop(tmp_path):
+    from daemon import download_ftp
+
+    payload = b"0123456789" * 10
+    calls = []
+
+    def flaky_retr(cmd, callback, blocksize=None, rest=None):
+        calls.append(rest)
+        if rest is None:
+            callback(payload[:40])
+            raise EOFError("connection dropped")
+        callback(payload[rest:])
+
+    first = MagicMock()
+    first.retrbinary.side_effect = flaky_retr
+    second = MagicMock()
+    second.retrbinary.side_effect = flaky_retr
+    local = tmp_path / "feed.csv"
+
+    ftp = download_ftp(first, lambda: second, "/feed.csv", str(local))
+
+    assert ftp is second
+    assert calls == [None, 40]
+    assert local.read_bytes() == payload
+    assert not (tmp_path / "feed.csv.part").exists()
+
+
+def test_download_sftp_resumes_with_seek(tmp_path):
+    from daemon import download_sftp
+
+    payload = b"abcdefghij" * 10
+
+    class RemoteFile:
+        def __init__(self, fail_at=None):
+            self.pos = 0
+            self.fail_at = fail_at
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def seek(self, offset):
+            self.pos = offset
+
+        def prefetch(self, size=None):
+            pass
+
+        def read(self, n):
+            if self.fail_at is not None and self.pos >= self.fail_at:
+                raise EOFError("dropped")
+            block = payload[self.pos : self.pos + min(n, 30)]
+            self.pos += len(block)
+            return block
+
+    first_sftp = MagicMock()
+    first_sftp.open.return_value = RemoteFile(fail_at=60)
+    second_sftp = MagicMock()
+    resumed = RemoteFile()
+    second_sftp.open.return_value = resumed
+    local = tmp_path / "feed.csv"
+
+    ssh, sftp = download_sftp(
+        MagicMock(), first_sftp, lambda: (MagicMock(), second_sftp), "/feed.csv", str(local), 100
+    )
+
+    assert sftp is second_sftp
+    assert local.read_bytes() == payload
+
+
+def test_download_ftp_closes_reconnects_when_it_gives_up(tmp_path):
+    from daemon import DOWNLOAD_ATTEMPTS, download_ftp
+
+    opened = [MagicMock() for _ in range(DOWNLOAD_ATTEMPTS)]
+    for ftp in opened:
+        ftp.retrbinary.side_effect = EOFError("connection dropped")
+    reconnects = iter(opened[1:])
+
+    with pytest.raises(EOFError):
+        download_ftp(opened[0], lambda: next(reconnects), "/feed.csv", str(tmp_path / "feed.csv"))
+
+    for ftp in opened:
+        ftp.close.assert_called_once()
+
+
+def test_download_sftp_closes_reconnects_when_it_gives_up(tmp_path):
+    from daemon import DOWNLOAD_ATTEMPTS, download_sftp
+
+    opened = [(MagicMock(), MagicMock()) for _ in range(DOWNLOAD_ATTEMPTS)]
+    for _, sftp in opened:
+        sftp.open.side_effect = EOFError("dropped")
+    reconnects = iter(opened[1:])
+
+    with pytest.raises(EOFError):
+        download_sftp(*opened[0], lambda: next(reconnects), "/feed.csv", str(tmp_path / "feed.csv"))
+
+    for ssh, _ in opened:
+        ssh.close.assert_called_once()
+
+
+@patch("daemon.probe_sql")
+@patch("daemon.fetch_sql_rows")
+@patch("daemon.sync_articles")
+def test_process_customer_sql_watermark_and_probe(
+    mock_sync, mock_fetch, mock_probe, tmp_path, make_customer
+):
+    import datetime
+    import state
+
+    state.configure(str(tmp_path / "state.db"))
+    mock_sync.return_value = True
+    mock_fetch.side_effect = lambda **kwargs: iter(
+        [
+            {"id": 1, "updated_at": datetime.datetime(2024, 5, 1, 12, 0)},
+            {"id": 2, "updated_at": datetime.datetime(2024, 5, 2, 8, 30)},
+        ]
+    )
+    mock_probe.return_value = "(datetime.datetime(2024, 5, 2, 8, 30), 2)"
+    customer = make_customer(
+        name="cust1",
+        input_type="sql",
+        header_row="YES",
+        article_id="1",
+        article_name="",
+        creds={"host": "db", "user": "u", "passw": "p", "db": "erp", "query": "Q"},
+        sql_watermark_column="updated_at",
+        sql_watermark_start="1970-01-01 00:00:00",
+        sql_probe_query="SELECT MAX(updated_at), COUNT(*) FROM items",
+    )
+
+    try:
+        assert process_customer(customer) == "pushed"
+        assert mock_fetch.call_args.kwargs["params"] == {"watermark": "1970-01-01 00:00:00"}
+        mock_probe.assert_called_once_with(
+            host="db",
+            user="u",
+            passw="p",
+            db="erp",
+            query="SELECT MAX(updated_at), COUNT(*) FROM items",
+        )
+
+        # Probe result unchanged: the main query is not run
+        assert process_customer(customer) == "unchanged"
+        assert mock_fetch.call_count == 1
+
+        # Probe changed: only rows past the stored watermark are requested
+        mock_probe.return_value = "(datetime.datetime(2024, 5, 3, 9, 0), 3)"
+        assert process_customer(customer) == "pushed"
+        assert mock_fetch.call_args.kwargs["params"] == {"watermark": "2024-05-02 08:30:00"}
+
+        # Forcing ignores both the probe and the watermark
+        process_customer(customer, force=True)
+        assert mock_fetch.call_args.kwargs["params"] == {"watermark": "1970-01-01 00:00:00"}
+    finally:
+        state.configure(None)
+
+
+def _dutchie_response(status, products=None, headers=None):
+    resp = MagicMock()
+    resp.status_code = status
+    resp.headers = headers or {}
+    body = json.dumps(products or []).encode("utf-8")
+    resp.iter_content.return_value = [body[i : i + 10] for i in range(0, len(body), 10)]
+    resp.__enter__.return_value = resp
+    return resp
+
+
+@patch("daemon.sync_articles")
+@patch("daemon.get_plugins_for_customer")
+@patch("daemon.requests.get")
+def test_process_dutchie_conditional_requests(
+    mock_get, mock_plugins, mock_sync, tmp_path, monkeypatch
+):
+    import state
+
+    monkeypatch.chdir(tmp_path)
+    state.configure(str(tmp_path / "state.db"))
+    mock_plugins.return_value = []
+
+    def consume(customer, articles):
+        # Plugins run lazily, as a real push reads the articles
+        list(articles)
+        return True
+
+    mock_sync.side_effect = consume
+    products = [
+        {"productId": 1, "productName": "A", "isActive": True},
+        {"productId": 2, "productName": "B", "isActive": False},
+    ]
+    mock_get.return_value = _dutchie_response(200, products, {"ETag": '"v1"'})
+    customer = {
+        "name": "cks1",
+        "input_type": "dutchie_pos",
+        "creds": {"location_key": "key"},
+        "skip_unchanged": True,
+    }
+
+    try:
+        assert process_customer(customer) == "pushed"
+        pushed = mock_sync.call_args[0][1]
+        assert [a["articleId"] for a in pushed] == ["1"]
+        assert mock_get.call_args.kwargs["stream"] is True
+        assert "If-None-Match" not in mock_get.call_args.kwargs["headers"]
+
+        # Unchanged catalogue: a 304 skips the cycle
+        mock_get.return_value = _dutchie_response(304)
+        assert process_customer(customer) == "unchanged"
+        assert mock_get.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+        assert mock_sync.call_count == 1
+
+        # With plugins the cached catalogue is transformed and pushed again
+        plugin = MagicMock(spec=["transform_articles"])
+        plugin.transform_articles.side_effect = lambda customer, articles, products=None: articles
+        mock_plugins.return_value = [plugin]
+        mock_get.return_value = _dutchie_response(200, products, {"ETag": '"v2"'})
+        assert process_customer(customer) == "pushed"
+        mock_get.return_value = _dutchie_response(304)
+        assert process_customer(customer) == "pushed"
+        assert mock_get.call_args.kwargs["headers"]["If-None-Match"] == '"v2"'
+        assert plugin.transform_articles.call_args.kwargs["products"] == products[:1]
+    finally:
+        state.configure(None)
+
+
+def test_apply_plugins_fuses_per_article_plugins_over_a_stream():
+    from daemon import apply_plugins
+    from plugins.vessel import VesselPlugin
+
+    consumed = []
+
+    def feed():
+        for i in range(3):
+            consumed.append(i)
+            yield {
+                "articleId": str(i),
+                "data": {"SALE_PRICE": "1.5", "LIST_PRICE": "3", "START_DATE": "", "END_DATE": ""},
+            }
+
+    class Broken:
+        def transform_article(self, customer, article, context):
+            raise RuntimeError("boom")
+
+    customer = {"name": "vessel", "template_field": "MISC_03"}
+    result = apply_plugins(customer, feed(), [NorwichPlugin(), Broken(), VesselPlugin()])
+
+    # Nothing runs until the stream is consumed, then one article at a time
+    assert consumed == []
+    first = next(iter(result))
+    assert consumed == [0]
+    assert first["data"]["SALE_PRICE"] == "1.50"
+    assert first["data"]["MISC_02"] == "SAVE $1.50"
+    assert len(list(result)) == 2
+
+
+def test_plugin_chains_are_resolved_once():
+    import plugins.base as base
+
+    class Counting(base.BasePlugin):
+        calls = 0
+
+        def applies_to(self, customer):
+            Counting.calls += 1
+            return True
+
+    base.register(Counting)
+    try:
+        customer = {"name": "chain-test"}
+        first = base.get_plugins_for_customer(customer)
+        assert base.get_plugins_for_customer(customer) is first
+        assert Counting.calls == 1
+        base.reset_chains()
+        base.get_plugins_for_customer(customer)
+        assert Counting.calls == 2
+    finally:
+        base._registry.remove(Counting)
+        base.reset_chains()
@@ -0,0 +1,60 @@
+import logging
+
+import pytest
+
+import logs
+from benchmarks import feeds
+from daemon import parse_csv_data
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    logs.stop()
+    logs.verbosity = logs.DEFAULT_VERBOSITY
+    logs.row_sample = logs.DEFAULT_ROW_SAMPLE
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_records_and_console_output_go_through_the_listener(tmp_path, capsys, restore_logging):
+    log_file = tmp_path / "ingest.log"
+    logs.configure(level=logging.INFO, filename=str(log_file), verbosity_level=1)
+    assert any(isinstance(h, logging.handlers.QueueHandler) for h in logging.getLogger().handlers)
+
+    logging.info("pushed %d articles", 3)
+    logging.debug("not written: %s", "debug")
+    logs.echo("Processing customer cust1")
+    logs.echo("chunk detail", 2)
+    logs.stop()
+
+    written = log_file.read_text()
+    assert "INFO - pushed 3 articles" in written
+    assert "debug" not in written
+    # Console messages go to stdout only, not to the log file
+    assert "Processing customer" not in written
+    assert capsys.readouterr().out == "Processing customer cust1\n"
+
+
+def test_rows_are_traced_by_sample_without_printing(capsys, caplog):
+    logs.row_sample = 10
+    try:
+        customer = feeds.csv_customer()
+        with caplog.at_level(logging.DEBUG):
+            articles = parse_csv_data(feeds.generate_csv(25), customer)
+    finally:
+        logs.row_sample = logs.DEFAULT_ROW_SAMPLE
+    assert len(articles) == 25
+    traced = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Processing row")]
+    assert [message.split()[2] for message in traced] == ["1", "11", "21"]
+    assert "Processing row" not in capsys.readouterr().out
+
+
+def test_should_trace_disabled():
+    logs.row_sample = 0
+    try:
+        assert not any(logs.should_trace(i) for i in range(5))
+    finally:
+        logs.row_sample = logs.DEFAULT_ROW_SAMPLE
@@ -0,0 +1,78 @@
+from daemon import dutchie_to_articles
+from mapping import compile_csv_mapping, compile_dutchie_mapping
+
+
+def test_csv_plan_columns_constants_and_short_rows(make_customer):
+    customer = make_customer(
+        article_id="1",
+        article_name="2",
+        barcode="3",
+        brand="ACME",
+        list_price="9",
+        store_code="S1",
+    )
+    plan = compile_csv_mapping(customer)
+
+    article = plan.materialize(["42", "Widget", "000123"])
+
+    assert article["articleId"] == "42"
+    assert article["articleName"] == "Widget"
+    assert article["data"] == {"STORE_CODE": "S1", "BARCODE": "123", "BRAND": "ACME"}
+
+
+def test_csv_plan_drops_blank_barcode_and_eans(make_customer):
+    customer = make_customer(article_id="1", barcode="2", ean1="3", ean2="4")
+    plan = compile_csv_mapping(customer)
+
+    article = plan.materialize(["1", "", "", "5012345678900"])
+
+    assert "BARCODE" not in article["data"]
+    assert article["eans"] == ["5012345678900"]
+
+
+def test_dutchie_plan_matches_record_keys(make_customer):
+    customer = make_customer(
+        sku="sku",
+        list_price="price",
+        barcode="upc",
+        ean1="EAN-A",
+        nfc_url="https://nfc",
+    )
+    plan = compile_dutchie_mapping(customer)
+
+    article = plan.materialize(
+        {"productId": 7, "productName": "Gummies", "sku": "G-1", "upc": "0099"}
+    )
+
+    assert article["articleId"] == "7"
+    assert article["articleName"] == "Gummies"
+    assert article["nfcUrl"] == "https://nfc"
+    assert article["eans"] == [["EAN-A"]]
+    assert article["data"] == {"STORE_CODE": "", "BARCODE": "99", "SKU": "G-1"}
+
+
+def test_dutchie_to_articles_uses_configured_id_fields(make_customer):
+    customer = make_customer(article_id="sku", article_name="")
+    products = [{"productId": 1, "productName": "A", "sku": "X1"}, {"productId": 2}]
+
+    articles = dutchie_to_articles(products, customer)
+
+    assert [a["articleId"] for a in articles] == ["X1", ""]
+    assert [a["articleName"] for a in articles] == ["A", ""]
+
+
+def test_sql_plan_resolves_column_numbers_to_names(make_customer):
+    from mapping import compile_sql_mapping
+
+    customer = make_customer(
+        article_id="2", article_name="1", list_price="3", sku="9", brand="ACME"
+    )
+    plan = compile_sql_mapping(customer, ["name", "code", "price"])
+
+    article = plan.materialize({"name": "Tea  ", "code": 12, "price": None})
+
+    assert article == {
+        "articleId": "12",
+        "articleName": "Tea",
+        "data": {"STORE_CODE": "", "LIST_PRICE": "", "BRAND": "ACME"},
+    }
@@ -0,0 +1,99 @@
+import json
+import threading
+import urllib.request
+
+import metrics
+from benchmarks import feeds
+from benchmarks.fake_api import FakeArticlesApi
+from daemon import apply_plugins, parse_csv_data, push_to_api
+
+
+def test_render_counters_and_histograms():
+    registry = metrics.Registry()
+    pushed = registry.counter("test_pushed_total", "Pushed.", ("customer",))
+    seconds = registry.histogram("test_seconds", "Time.", ("customer",), buckets=(0.1, 1))
+    pushed.inc(customer="a")
+    pushed.inc(2, customer='b"x')
+    seconds.observe(0.05, customer="a")
+    seconds.observe(0.5, customer="a")
+    seconds.observe(5, customer="a")
+
+    text = registry.render()
+    assert "# TYPE test_pushed_total counter" in text
+    assert 'test_pushed_total{customer="a"} 1' in text
+    assert 'test_pushed_total{customer="b\\"x"} 2' in text
+    assert 'test_seconds_bucket{customer="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{customer="a",le="1"} 2' in text
+    assert 'test_seconds_bucket{customer="a",le="+Inf"} 3' in text
+    assert 'test_seconds_count{customer="a"} 3' in text
+    assert registry.snapshot()["test_seconds"]["values"][0]["sum"] == 5.55
+
+
+def test_http_endpoint_and_json_dump(tmp_path):
+    metrics.CYCLES.inc(customer="cust1", status="pushed")
+    server = metrics.start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            body = resp.read().decode()
+            assert resp.headers["Content-Type"].startswith("text/plain")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 'ubi_ingest_cycles_total{customer="cust1",status="pushed"} 1' in body
+
+    path = tmp_path / "metrics.json"
+    metrics.dump_json(str(path))
+    values = json.loads(path.read_text())["metrics"]["ubi_ingest_cycles_total"]["values"]
+    assert values == [{"labels": {"customer": "cust1", "status": "pushed"}, "value": 1}]
+
+
+def test_pipeline_stages_are_recorded():
+    class Marker:
+        def transform_article(self, customer, article, context):
+            return article
+
+    with FakeArticlesApi() as api:
+        customer = feeds.csv_customer(
+            "cust1",
+            output_endpoint=api.url,
+            output_user="u",
+            output_pass="p",
+            store_name="S",
+            company_name="C",
+            chunk_max_articles=10,
+        )
+        articles = list(
+            apply_plugins(customer, parse_csv_data(feeds.generate_csv(25), customer), [Marker()])
+        )
+        assert push_to_api(customer, articles)
+
+    assert metrics.ROWS_PARSED.value(customer="cust1") == 25
+    assert metrics.PLUGIN_SECONDS.count(customer="cust1", plugin="Marker") == 1
+    assert metrics.CHUNKS_PUSHED.value(customer="cust1") == 3
+    assert metrics.ARTICLES_PUSHED.value(customer="cust1") == 25
+    assert metrics.HTTP_RESPONSES.value(customer="cust1", status=200) == 3
+    assert metrics.PUSH_SECONDS.count(customer="cust1") == 3
+
+
+def test_json_dump_from_concurrent_threads(tmp_path):
+    metrics.CYCLES.inc(customer="cust1", status="pushed")
+    path = str(tmp_path / "metrics.json")
+    errors = []
+
+    def dump():
+        try:
+            for _ in range(30):
+                metrics.dump_json(path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=dump) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with open(path) as f:
+        assert "ubi_ingest_cycles_total" in json.load(f)["metrics"]
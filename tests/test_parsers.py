@@ -0,0 +1,63 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from parsers import xml_records
+from parsers.base import BaseParser, get_parser, register
+from parsers.xml_records import XmlRecordsParser
+
+XML = """<?xml version="1.0"?>
+<catalog>
+  <meta><source>pos</source></meta>
+  <items>
+    <item><sku>100</sku><name> Widget </name><price>1.50</price></item>
+    <item><sku>101</sku><name/><price>2</price></item>
+  </items>
+</catalog>
+"""
+
+
+def test_xml_parser_reads_record_tag(tmp_path):
+    path = tmp_path / "feed.xml"
+    path.write_text(XML)
+    rows = list(XmlRecordsParser().parse(str(path), {"xml_record_tag": "item"}))
+    assert rows == [["100", "Widget", "1.50"], ["101", "", "2"]]
+
+
+def test_xml_parser_defaults_to_root_children(tmp_path):
+    path = tmp_path / "feed.xml"
+    path.write_text("<rows><row><a>1</a><b>x</b></row><row><a>2</a></row></rows>")
+    rows = list(XmlRecordsParser().parse(str(path), {}))
+    assert rows == [["1", "x"], ["2"]]
+
+
+@pytest.mark.parametrize("record_tag", ["item", None])
+def test_xml_parser_detaches_finished_elements(tmp_path, monkeypatch, record_tag):
+    path = tmp_path / "feed.xml"
+    path.write_text(XML)
+    roots = []
+    real_iterparse = ET.iterparse
+
+    def iterparse(source, events):
+        for event, elem in real_iterparse(source, events):
+            if not roots:
+                roots.append(elem)
+            yield event, elem
+
+    monkeypatch.setattr(xml_records.ET, "iterparse", iterparse)
+    list(XmlRecordsParser().parse(str(path), {"xml_record_tag": record_tag}))
+
+    assert len(roots[0]) == 0
+
+
+def test_registry_instantiates_classes_and_ignores_unknown():
+    class UpperParser(BaseParser):
+        name = "test_upper"
+
+        def parse(self, file_path, customer):
+            yield [file_path.upper()]
+
+    register(UpperParser)
+    assert isinstance(get_parser("xml"), XmlRecordsParser)
+    assert list(get_parser("test_upper").parse("a", {})) == [["A"]]
+    assert get_parser("xml_to_csv") is None
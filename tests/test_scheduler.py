@@ -0,0 +1,93 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from scheduler import CronExpression, CustomerSchedule, Scheduler
+
+
+def test_interval_runs_stay_on_grid_and_drop_missed_slots():
+    schedule = CustomerSchedule(interval=15)
+    assert schedule.first_due(100.0) == 100.0
+    # A run that started late does not shift later runs
+    assert schedule.next_due(103.0) == 115.0
+    assert schedule.next_due(115.5) == 130.0
+    # The host stalled past two slots: skip to the next one ahead
+    assert schedule.next_due(161.0) == 175.0
+
+
+def test_jitter_is_added_per_run_without_drift(monkeypatch):
+    monkeypatch.setattr("scheduler.random.uniform", lambda low, high: high)
+    schedule = CustomerSchedule(interval=60, jitter=5)
+    assert schedule.first_due(0.0) == 5.0
+    assert schedule.next_due(5.0) == 65.0
+    assert schedule.next_due(65.0) == 125.0
+
+
+def test_cron_next_after():
+    hourly = CronExpression("0 * * * *")
+    assert hourly.next_after(datetime(2024, 1, 1, 10, 0)) == datetime(2024, 1, 1, 11, 0)
+    store_hours = CronExpression("*/15 6-22 * * 1-5")
+    # Friday 22:50 -> Monday 06:00
+    assert store_hours.next_after(datetime(2024, 1, 5, 22, 50)) == datetime(2024, 1, 8, 6, 0)
+    nightly = CronExpression("30 2 1 * *")
+    assert nightly.next_after(datetime(2024, 1, 31, 3, 0)) == datetime(2024, 2, 1, 2, 30)
+    with pytest.raises(ValueError):
+        CronExpression("61 * * * *")
+
+
+def test_cron_schedule_uses_wall_clock_offset():
+    schedule = CustomerSchedule(cron="0 * * * *")
+    due = schedule.first_due(1000.0, wall_now=datetime(2024, 1, 1, 10, 59, 30))
+    assert due == 1030.0
+
+
+def make_scheduler(run, overlap):
+    clock = [0.0]
+    sched = Scheduler(run, max_workers=2, clock=lambda: clock[0])
+    sched.add({"name": "cust1"}, CustomerSchedule(interval=10, overlap=overlap))
+    return sched, clock
+
+
+@pytest.mark.parametrize("overlap, expected_runs", [("skip", 1), ("coalesce", 2)])
+def test_overlapping_runs_are_skipped_or_coalesced(overlap, expected_runs):
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def run(customer, force=False):
+        runs.append(force)
+        started.set()
+        release.wait(5)
+
+    sched, clock = make_scheduler(run, overlap)
+    sched.run_due()
+    assert started.wait(5)
+    # Two more slots come due while the first run is still going
+    clock[0] = 10.0
+    sched.run_due()
+    clock[0] = 20.0
+    sched.run_due()
+    release.set()
+    sched.stop()
+    assert len(runs) == expected_runs
+
+
+def test_forced_first_run():
+    runs = []
+    sched = Scheduler(lambda customer, force=False: runs.append(force), clock=lambda: 0.0)
+    sched.add({"name": "cust1"}, CustomerSchedule(cron="0 0 1 1 *"), force=True)
+    assert sched.run_due() > 0
+    sched.stop()
+    assert runs == [True]
+
+
+def test_run_forever_stops():
+    sched = Scheduler(lambda customer, force=False: None)
+    thread = threading.Thread(target=sched.run_forever)
+    thread.start()
+    time.sleep(0.05)
+    sched.stop()
+    thread.join(5)
+    assert not thread.is_alive()
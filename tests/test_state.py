@@ -0,0 +1,69 @@
+from unittest.mock import patch
+
+import state
+from daemon import sync_articles
+from state import StateStore, article_fingerprint
+
+
+def test_fingerprint_ignores_key_order():
+    a = {"articleId": "1", "data": {"LIST_PRICE": "1.00", "SKU": "X"}}
+    b = {"data": {"SKU": "X", "LIST_PRICE": "1.00"}, "articleId": "1"}
+    assert article_fingerprint(a) == article_fingerprint(b)
+    assert article_fingerprint(a) != article_fingerprint({"articleId": "1", "data": {}})
+
+
+def test_state_store_round_trip(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    store.save_fingerprints("cust", [("1", "aa"), ("2", "bb")])
+
+    assert store.get_fingerprints("cust", ["1", "2", "3"]) == {"1": "aa", "2": "bb"}
+    assert store.get_fingerprints("other", ["1"]) == {}
+    assert store.full_resync_due("cust", 24)
+    store.mark_full_sync("cust")
+    assert not store.full_resync_due("cust", 24)
+    assert store.full_resync_due("cust", 0)
+
+
+@patch("daemon.push_to_api")
+def test_sync_articles_pushes_only_changed(mock_push, tmp_path):
+    state.configure(str(tmp_path / "state.db"))
+    pushed = []
+
+    def fake_push(customer, data):
+        batch = list(data)
+        pushed.append([a["articleId"] for a in batch])
+        return True
+
+    mock_push.side_effect = fake_push
+    customer = {"name": "cust", "delta_sync": True, "full_resync_hours": 24}
+
+    def articles(price_2):
+        return [
+            {"articleId": "1", "data": {"LIST_PRICE": "1.00"}},
+            {"articleId": "2", "data": {"LIST_PRICE": price_2}},
+            {"articleId": "3", "data": {"LIST_PRICE": "3.00"}},
+        ]
+
+    try:
+        sync_articles(customer, articles("2.00"))
+        sync_articles(customer, articles("2.50"))
+        sync_articles(customer, articles("2.50"))
+    finally:
+        state.configure(None)
+
+    assert pushed == [["1", "2", "3"], ["2"], []]
+
+
+@patch("daemon.push_to_api")
+def test_sync_articles_keeps_fingerprints_on_failed_push(mock_push, tmp_path):
+    state.configure(str(tmp_path / "state.db"))
+    mock_push.side_effect = lambda customer, data: list(data) and False
+    customer = {"name": "cust", "delta_sync": True, "full_resync_hours": 24}
+
+    try:
+        sync_articles(customer, [{"articleId": "1", "data": {}}])
+        store = state.get_store()
+        assert store.get_fingerprints("cust", ["1"]) == {}
+        assert store.full_resync_due("cust", 24)
+    finally:
+        state.configure(None)
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import watcher
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def make_watcher(process, customers=("cust1",), debounce=0.05):
+    w = watcher.LocalWatcher(process, debounce=debounce)
+    for name in customers:
+        w._customers[name] = {"name": name}
+    return w
+
+
+def test_events_are_debounced_into_one_run():
+    runs = []
+    w = make_watcher(lambda c: runs.append(c["name"]))
+    for _ in range(5):
+        w.notify("cust1")
+        time.sleep(0.01)
+    assert wait_for(lambda: runs)
+    time.sleep(0.1)
+    assert runs == ["cust1"]
+    w.stop()
+
+
+def test_events_during_a_run_coalesce_into_one_follow_up():
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def process(customer):
+        runs.append(customer["name"])
+        started.set()
+        release.wait(5)
+
+    w = make_watcher(process, debounce=0.01)
+    w.notify("cust1")
+    assert started.wait(5)
+    for _ in range(3):
+        w.notify("cust1")
+        time.sleep(0.03)
+    release.set()
+    assert wait_for(lambda: len(runs) == 2)
+    time.sleep(0.1)
+    assert len(runs) == 2
+    w.stop()
+
+
+def test_handler_ignores_partial_files_and_other_paths(tmp_path):
+    notified = []
+    w = SimpleNamespace(notify=notified.append)
+    handler = watcher._CustomerHandler(w, "cust1", str(tmp_path), None)
+
+    def event(kind, src, dest=""):
+        return SimpleNamespace(event_type=kind, src_path=src, dest_path=dest, is_directory=False)
+
+    handler.on_any_event(event("created", str(tmp_path / "feed.csv.part")))
+    handler.on_any_event(event("modified", str(tmp_path / ".feed.csv")))
+    handler.on_any_event(event("deleted", str(tmp_path / "feed.csv")))
+    handler.on_any_event(event("closed", str(tmp_path / "sub" / "feed.csv")))
+    assert notified == []
+    handler.on_any_event(
+        event("moved", str(tmp_path / "feed.csv.part"), str(tmp_path / "feed.csv"))
+    )
+    handler.on_any_event(event("closed", str(tmp_path / "feed.csv")))
+    assert notified == ["cust1", "cust1"]
+
+
+@pytest.mark.skipif(not watcher.available(), reason="watchdog not installed")
+def test_file_written_into_watched_directory_triggers_processing(tmp_path):
+    runs = []
+    w = watcher.LocalWatcher(lambda c: runs.append(c["name"]), debounce=0.05)
+    try:
+        watched = w.watch([{"name": "cust1", "creds": {"path": str(tmp_path)}}])
+        assert watched == {"cust1"}
+        with open(os.path.join(tmp_path, "feed.csv"), "w") as f:
+            f.write("1,Widget\n")
+        assert wait_for(lambda: runs == ["cust1"])
+    finally:
+        w.stop()
@@ -0,0 +1,158 @@
+"""Event-driven processing of local input directories.
+
+Local customers with `WATCH` enabled are processed when a file is written,
+closed or moved into their `LOCAL_PATH`, instead of waiting for the next
+polling cycle. Events for a customer are debounced: processing starts once
+no new event has arrived for `debounce` seconds, so a file that is still
+being copied in is not read half-written. Events that arrive while the
+customer is being processed queue a single follow-up run.
+
+watchdog is optional; `available()` is False when it is not installed and
+those customers are polled as usual.
+"""
+
+import logging
+import os
+import threading
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # optional dependency
+    FileSystemEventHandler = object
+    Observer = None
+
+DEFAULT_DEBOUNCE = 2.0
+# Names used by uploaders for files that are still being written
+PARTIAL_SUFFIXES = (".part", ".partial", ".tmp", ".filepart", ".crdownload", "~")
+
+
+def available():
+    return Observer is not None
+
+
+def is_partial(path):
+    name = os.path.basename(path)
+    return name.startswith(".") or name.lower().endswith(PARTIAL_SUFFIXES)
+
+
+def watch_target(path):
+    """Return (directory to watch, file to match or None) for a LOCAL_PATH."""
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        return path, None
+    return os.path.dirname(path), path
+
+
+class _CustomerHandler(FileSystemEventHandler):
+    def __init__(self, watcher, name, directory, file_path):
+        self.watcher = watcher
+        self.name = name
+        self.directory = directory
+        self.file_path = file_path
+
+    def _matches(self, path):
+        path = os.path.abspath(path)
+        if self.file_path:
+            return path == self.file_path
+        return os.path.dirname(path) == self.directory and not is_partial(path)
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in (
+            "created",
+            "modified",
+            "closed",
+            "moved",
+        ):
+            return
+        # A move only matters if it lands a file here, e.g. "x.part" -> "x.csv"
+        path = event.dest_path if event.event_type == "moved" else event.src_path
+        if self._matches(path):
+            logging.debug(f"{event.event_type} event for {self.name}: {path}")
+            self.watcher.notify(self.name)
+
+
+class LocalWatcher:
+    """Runs `process(customer)` when a watched customer's input changes."""
+
+    def __init__(self, process, debounce=DEFAULT_DEBOUNCE):
+        self.process = process
+        self.debounce = debounce
+        self._customers = {}
+        self._timers = {}
+        self._running = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._observer = None
+
+    def watch(self, customers):
+        """Start watching the customers' LOCAL_PATHs; returns the names watched."""
+        if not available():
+            logging.warning("watchdog is not installed; local customers will be polled")
+            return set()
+        if self._observer is None:
+            self._observer = Observer()
+            self._observer.daemon = True
+            self._observer.start()
+        watched = set()
+        for customer in customers:
+            path = (customer.get("creds") or {}).get("path")
+            if not path:
+                logging.error(f"No LOCAL_PATH to watch for {customer['name']}")
+                continue
+            directory, file_path = watch_target(path)
+            try:
+                self._observer.schedule(
+                    _CustomerHandler(self, customer["name"], directory, file_path),
+                    directory,
+                    recursive=False,
+                )
+            except OSError as e:
+                logging.error(f"Cannot watch {directory} for {customer['name']}: {e}")
+                continue
+            self._customers[customer["name"]] = customer
+            watched.add(customer["name"])
+            logging.info(f"Watching {directory} for {customer['name']}")
+        return watched
+
+    def notify(self, name):
+        """Schedule a run for `name` once its events have settled."""
+        with self._lock:
+            if name not in self._customers:
+                return
+            timer = self._timers.get(name)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce, self._fire, args=(name,))
+            timer.daemon = True
+            self._timers[name] = timer
+            timer.start()
+
+    def _fire(self, name):
+        with self._lock:
+            self._timers.pop(name, None)
+            if name in self._running:
+                # Coalesce: one more run once the current one finishes
+                self._pending.add(name)
+                return
+            self._running.add(name)
+        while True:
+            try:
+                self.process(self._customers[name])
+            except Exception as e:
+                logging.error(f"Error processing {name} after file event: {e}")
+            with self._lock:
+                if name not in self._pending:
+                    self._running.discard(name)
+                    return
+                self._pending.discard(name)
+
+    def stop(self):
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None